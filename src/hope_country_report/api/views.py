@@ -1,18 +1,23 @@
+import csv
 import json
 from typing import TYPE_CHECKING, Any
 
-from django.core.serializers import serialize
-from django.http import JsonResponse, StreamingHttpResponse
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
 from django_filters import rest_framework as filters
 from rest_framework import permissions, serializers, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework_extensions.mixins import NestedViewSetMixin
 
-from ..apps.core.models import CountryOffice, CountryShape
+from ..apps.core import geo
+from ..apps.core.models import CountryOffice
+from ..apps.power_query.json import PQJSONEncoder
 from ..apps.power_query.models import ChartPage, Dataset, Query, ReportConfiguration, ReportDocument
+from ..apps.power_query.models.dataset import DatasetRows
+from ..utils.media import serve_file
 from .serializers import (
-    BoundarySerializer,
     ChartPageSerializer,
     CountryOfficeSerializer,
     DatasetListSerializer,
@@ -24,9 +29,34 @@ from .serializers import (
 )
 
 if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator
+
     from ..types.http import AnyRequest
 
 
+class _Echo:
+    def write(self, value: str) -> str:
+        return value
+
+
+def stream_ndjson(rows: "Iterable[dict[str, Any]]") -> "Iterator[str]":
+    for row in rows:
+        yield json.dumps(row, cls=PQJSONEncoder) + "\n"
+
+
+def stream_csv(rows: "DatasetRows") -> "Iterator[str]":
+    writer = csv.writer(_Echo())
+    yield writer.writerow(rows.columns)
+    for row in rows:
+        yield writer.writerow(row.values())
+
+
+STREAM_FORMATS = {
+    "ndjson": (stream_ndjson, "application/x-ndjson"),
+    "csv": (stream_csv, "text/csv"),
+}
+
+
 class SelectedOfficeViewSet(viewsets.ReadOnlyModelViewSet):
     def selected_office(self) -> CountryOffice:
         return CountryOffice.objects.get(id=self.kwargs["slug"])
@@ -40,24 +70,28 @@ class HCRHomeViewSet(viewsets.ReadOnlyModelViewSet):
     def list(self, request: "AnyRequest", *args: tuple[Any], **kwargs: dict[str, str]) -> Response:
         return Response({})
 
-    @action(detail=False)
-    def topology(self, request: "AnyRequest") -> JsonResponse:
-        from pytopojson import topology
-
-        topology_ = topology.Topology()
-
-        qs = CountryShape.objects.all()
-        geojson = json.loads(serialize("geojson", qs, geometry_field="mpoly", id_field="un", fields=["name", "active"]))
+    def _geo(self, request: "AnyRequest", kind: str) -> "HttpResponse|Response":
+        zoom = request.query_params.get("zoom", settings.GEO_DEFAULT_ZOOM)
+        if zoom not in settings.GEO_ZOOM_LEVELS:
+            return Response({"detail": f"Invalid zoom level: {zoom}"}, status=status.HTTP_400_BAD_REQUEST)
+        content, etag = geo.get_artefact(kind, zoom)
+        etag = f'"{etag}"'
+        response = get_conditional_response(request, etag=etag) or HttpResponse(
+            content, content_type="application/json"
+        )
+        response["ETag"] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
 
-        topojson = topology_({"countries": geojson}, quantization=0)
-
-        return JsonResponse(topojson, content_type="application/json", safe=False)
+    @action(detail=False)
+    def topology(self, request: "AnyRequest") -> "HttpResponse|Response":
+        """Country shapes as TopoJSON, simplified for `?zoom=low|medium|high`."""
+        return self._geo(request, "topology")
 
     @action(detail=False)
-    def boundaries(self, request: "AnyRequest") -> JsonResponse:
-        qs = CountryShape.objects.all()
-        ser = BoundarySerializer(qs, many=True)
-        return JsonResponse(ser.data, content_type="application/json")
+    def boundaries(self, request: "AnyRequest") -> "HttpResponse|Response":
+        """Country shapes as GeoJSON, simplified for `?zoom=low|medium|high`."""
+        return self._geo(request, "boundaries")
 
     @action(detail=False)
     def offices(self, request: "AnyRequest") -> JsonResponse:
@@ -119,7 +153,7 @@ class DatasetViewSet(NestedViewSetMixin, viewsets.ReadOnlyModelViewSet):
         if query_id:
             queryset = queryset.filter(query_id=query_id)
 
-        reserved = {"page", "page_size", "format"}
+        reserved = {"page", "page_size", "format", "fields", "filter", "ordering", "stream"}
         filters = {}
         for key, value in self.request.query_params.items():
             if key not in reserved:
@@ -147,22 +181,47 @@ class DatasetViewSet(NestedViewSetMixin, viewsets.ReadOnlyModelViewSet):
 
     @action(detail=True)
     def data(self, request, *args, **kwargs):
+        """
+        Rows of the dataset, paginated at storage level.
+
+        Supports `fields=a,b` projection, `filter=column:value` (repeatable), `ordering=a,-b`
+        and `stream=ndjson|csv` to get the whole (filtered) result as a streaming response.
+        """
         from rest_framework.pagination import PageNumberPagination
 
         dataset = self.get_object()
-        data = dataset.data
-        if hasattr(data, "dict"):
-            data = data.dict
-
-        if isinstance(data, list):
-            paginator = PageNumberPagination()
-            paginator.page_size_query_param = "page_size"
-
-            page = paginator.paginate_queryset(data, request, view=self)
-            if page is not None:
+        params = request.query_params
+        paginator = PageNumberPagination()
+        paginator.page_size_query_param = "page_size"
+        try:
+            rows = DatasetRows(
+                dataset,
+                columns=[f for f in params.get("fields", "").split(",") if f],
+                filters=[tuple(f.split(":", 1)) for f in params.getlist("filter") if ":" in f],
+                ordering=[f for f in params.get("ordering", "").split(",") if f],
+            )
+        except ValueError:
+            # not tabular (eg. a list of scalars): served as stored, lists are still paginated
+            data = dataset.data
+            data = getattr(data, "dict", data)
+            if isinstance(data, list) and (page := paginator.paginate_queryset(data, request, view=self)) is not None:
                 return paginator.get_paginated_response(page)
+            return Response(data)
+        except KeyError as e:
+            return Response({"detail": f"Unknown column(s): {e.args[0]}"}, status=status.HTTP_400_BAD_REQUEST)
+
+        if stream := params.get("stream"):
+            if stream not in STREAM_FORMATS:
+                return Response({"detail": f"Invalid stream format: {stream}"}, status=status.HTTP_400_BAD_REQUEST)
+            render, content_type = STREAM_FORMATS[stream]
+            response = StreamingHttpResponse(render(rows), content_type=content_type)
+            response["Content-Disposition"] = f'attachment; filename="dataset_{dataset.pk}.{stream}"'
+            return response
 
-        return Response(data)
+        page = paginator.paginate_queryset(rows, request, view=self)
+        if page is not None:
+            return paginator.get_paginated_response(page)
+        return Response(list(rows))
 
 
 class ReportViewSet(NestedViewSetMixin, viewsets.ReadOnlyModelViewSet):
@@ -184,7 +243,7 @@ class DocumentViewSet(NestedViewSetMixin, SelectedOfficeViewSet, viewsets.ReadOn
         parent_lookup_report__country_office__slug: str,
         parent_lookup_report__id: str,
         pk: str,
-    ) -> "Response|StreamingHttpResponse":
+    ) -> "Response|HttpResponse|StreamingHttpResponse":
         try:
             doc = ReportDocument.objects.get(
                 report__country_office__slug=parent_lookup_report__country_office__slug,
@@ -193,8 +252,13 @@ class DocumentViewSet(NestedViewSetMixin, SelectedOfficeViewSet, viewsets.ReadOn
             )
             if not doc.file.size:
                 raise FileNotFoundError
-            response = StreamingHttpResponse(doc.file, content_type="application/force-download")
-            response["Content-Disposition"] = f"attachment; filename= {doc.filename}"
-            return response
+            return serve_file(
+                request,
+                doc.file,
+                "application/force-download",
+                filename=doc.filename,
+                etag=doc.etag,
+                last_modified=doc.updated_on,
+            )
         except FileNotFoundError:
             return Response({"Error": 404}, status=404)
@@ -8,3 +8,7 @@ class Config(AppConfig):
     def ready(self) -> None:
         from ...config.celery import app  # noqa
         from ...utils import flags  # noqa
+        from . import authz, geo
+
+        authz.connect()
+        geo.connect()
@@ -0,0 +1,138 @@
+"""
+Authorization data of users, loaded in bulk and cached.
+
+`get_authz(user)` returns the roles of the user and the permissions granted by their groups in
+each Country Office, loaded with a single query. Report access restrictions (`limit_access_to`)
+are loaded once for all the users.
+
+Two cache tiers are used: the current request (nothing is queried twice while rendering a page)
+and the Django cache, shared by processes and invalidated by signals when roles, group permissions
+or restrictions change. Invalidating everything changes the version of all the cache keys.
+"""
+
+import uuid
+from typing import TYPE_CHECKING
+
+from django.conf import settings
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.utils.functional import cached_property
+
+from ...state import state
+from .models import UserRole
+
+if TYPE_CHECKING:
+    from typing import Any
+
+    from ...types.django import AnyUser
+
+VERSION_KEY = "authz:version"
+
+
+class UserAuthorization:
+    def __init__(self, user_id: int, roles: "dict[int, set[str]]") -> None:
+        self.user_id = user_id
+        self.roles = roles
+
+    @cached_property
+    def restrictions(self) -> "dict[int, set[int]]":
+        return cache.get_or_set(_restrictions_key(), load_restrictions, settings.AUTHZ_CACHE_TIMEOUT)
+
+    @property
+    def has_roles(self) -> bool:
+        return bool(self.roles)
+
+    def permissions(self, country_office_id: int) -> set[str]:
+        return self.roles.get(country_office_id, set())
+
+    def can_access_report(self, report_id: int) -> bool:
+        """False if the access to the report is limited to other users."""
+        allowed = self.restrictions.get(report_id)
+        return allowed is None or self.user_id in allowed
+
+
+def _version() -> str:
+    return cache.get_or_set(VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def _user_key(user_id: int) -> str:
+    return f"authz:{_version()}:user:{user_id}"
+
+
+def _restrictions_key() -> str:
+    return f"authz:{_version()}:restrictions"
+
+
+def load_roles(user_id: int) -> "dict[int, set[str]]":
+    roles: "dict[int, set[str]]" = {}
+    rows = UserRole.objects.filter(user_id=user_id).values_list(
+        "country_office_id", "group__permissions__content_type__app_label", "group__permissions__codename"
+    )
+    for office_id, app_label, codename in rows:
+        perms = roles.setdefault(office_id, set())
+        if codename:
+            perms.add(f"{app_label}.{codename}")
+    return roles
+
+
+def load_restrictions() -> "dict[int, set[int]]":
+    from ..power_query.models import ReportConfiguration
+
+    restrictions: "dict[int, set[int]]" = {}
+    through = ReportConfiguration.limit_access_to.through
+    for report_id, user_id in through.objects.values_list("reportconfiguration_id", "user_id"):
+        restrictions.setdefault(report_id, set()).add(user_id)
+    return restrictions
+
+
+def get_authz(user: "AnyUser") -> UserAuthorization:
+    local: "dict[int, UserAuthorization]" = {}
+    if state.request is not None:
+        local = state.request.__dict__.setdefault("_authz", {})
+        if user.pk in local:
+            return local[user.pk]
+    roles = cache.get_or_set(_user_key(user.pk), lambda: load_roles(user.pk), settings.AUTHZ_CACHE_TIMEOUT)
+    local[user.pk] = UserAuthorization(user.pk, roles)
+    return local[user.pk]
+
+
+def invalidate_user(user_id: int) -> None:
+    cache.delete(_user_key(user_id))
+    if state.request is not None:
+        state.request.__dict__.get("_authz", {}).pop(user_id, None)
+
+
+def invalidate_all() -> None:
+    cache.set(VERSION_KEY, uuid.uuid4().hex, None)
+    if state.request is not None:
+        state.request.__dict__.pop("_authz", None)
+
+
+def _role_saving(sender: "type[UserRole]", instance: UserRole, **kwargs: "Any") -> None:
+    # a role moved to another user must be invalidated for the previous one too
+    if instance.pk:
+        instance._authz_user_id = UserRole.objects.filter(pk=instance.pk).values_list("user_id", flat=True).first()
+
+
+def _role_changed(sender: "type[UserRole]", instance: UserRole, **kwargs: "Any") -> None:
+    invalidate_user(instance.user_id)
+    if (previous := getattr(instance, "_authz_user_id", None)) and previous != instance.user_id:
+        invalidate_user(previous)
+
+
+def _m2m_changed(sender: "Any", action: str, **kwargs: "Any") -> None:
+    if action in ("post_add", "post_remove", "post_clear"):
+        invalidate_all()
+
+
+def connect() -> None:
+    from ..power_query.models import ReportConfiguration
+
+    pre_save.connect(_role_saving, sender=UserRole, dispatch_uid="authz_role_saving")
+    post_save.connect(_role_changed, sender=UserRole, dispatch_uid="authz_role_saved")
+    post_delete.connect(_role_changed, sender=UserRole, dispatch_uid="authz_role_deleted")
+    m2m_changed.connect(_m2m_changed, sender=Group.permissions.through, dispatch_uid="authz_group_permissions")
+    m2m_changed.connect(
+        _m2m_changed, sender=ReportConfiguration.limit_access_to.through, dispatch_uid="authz_limit_access_to"
+    )
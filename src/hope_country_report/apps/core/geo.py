@@ -0,0 +1,100 @@
+"""
+Pre-built country boundaries served by the home page maps.
+
+Shapes are simplified one by one with the tolerance of each zoom level of `GEO_ZOOM_LEVELS`,
+coordinates are rounded and TopoJSON arcs are quantised. Each shape stays valid, but borders
+shared by neighbouring countries are simplified twice and may not match: the coarse levels can
+show small gaps or overlaps along them. The serialised
+artefacts and their ETag are kept in the Django cache under a version that changes whenever
+a CountryShape is saved or deleted, so they are built once per change instead of per request.
+"""
+
+import hashlib
+import json
+import uuid
+from typing import TYPE_CHECKING
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+
+from .models import CountryShape
+
+if TYPE_CHECKING:
+    from typing import Any
+
+VERSION_KEY = "geo:version"
+KINDS = ("topology", "boundaries")
+
+
+def _version() -> str:
+    return cache.get_or_set(VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def _key(kind: str, zoom: str) -> str:
+    return f"geo:{_version()}:{kind}:{zoom}"
+
+
+def _round(coords: "list[Any]", digits: int) -> "list[Any]":
+    if coords and isinstance(coords[0], (int, float)):
+        return [round(c, digits) for c in coords]
+    return [_round(c, digits) for c in coords]
+
+
+def features(tolerance: float, precision: int, id_field: str = "pk") -> "list[dict[str, Any]]":
+    """GeoJSON features of the country shapes, each simplified on its own (shared borders are not kept)."""
+    ret = []
+    for shape in CountryShape.objects.exclude(mpoly=None).order_by("pk"):
+        geom = shape.mpoly.simplify(tolerance, preserve_topology=True) if tolerance else shape.mpoly
+        if geom.empty:
+            continue
+        geometry = json.loads(geom.json)
+        geometry["coordinates"] = _round(geometry["coordinates"], precision)
+        ret.append(
+            {
+                "type": "Feature",
+                "id": getattr(shape, id_field),
+                "geometry": geometry,
+                "properties": {"name": shape.name, "iso2": shape.iso2, "iso3": shape.iso3, "un": shape.un},
+            }
+        )
+    return ret
+
+
+def build(kind: str, zoom: str) -> bytes:
+    level = settings.GEO_ZOOM_LEVELS[zoom]
+    if kind == "topology":
+        from pytopojson import topology
+
+        collection = {"type": "FeatureCollection", "features": features(level["tolerance"], level["precision"], "un")}
+        data = topology.Topology()({"countries": collection}, quantization=level["quantization"])
+    elif kind == "boundaries":
+        data = {"type": "FeatureCollection", "features": features(level["tolerance"], level["precision"])}
+    else:
+        raise ValueError(kind)
+    return json.dumps(data, separators=(",", ":")).encode()
+
+
+def get_artefact(kind: str, zoom: str) -> "tuple[bytes, str]":
+    """Return serialised `kind` at `zoom` and its ETag, building them if the shapes changed."""
+    key = _key(kind, zoom)
+    if (cached := cache.get(key)) is None:
+        content = build(kind, zoom)
+        cached = {"content": content, "etag": hashlib.md5(content).hexdigest()}
+        cache.set(key, cached, settings.GEO_CACHE_TIMEOUT)
+    return cached["content"], cached["etag"]
+
+
+def warm() -> None:
+    for kind in KINDS:
+        for zoom in settings.GEO_ZOOM_LEVELS:
+            get_artefact(kind, zoom)
+
+
+def invalidate(*args: "Any", **kwargs: "Any") -> None:
+    cache.set(VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def connect() -> None:
+    post_save.connect(invalidate, sender=CountryShape, dispatch_uid="geo_shape_saved")
+    post_delete.connect(invalidate, sender=CountryShape, dispatch_uid="geo_shape_deleted")
@@ -10,6 +10,7 @@ from django.core.management import BaseCommand, call_command
 from django.core.management.base import CommandError, SystemCheckError
 from django.core.validators import validate_email
 
+from hope_country_report.apps.core import geo
 from hope_country_report.apps.core.models import CountryShape
 from hope_country_report.apps.core.utils import get_or_create_reporter_group
 from hope_country_report.apps.power_query.defaults import create_defaults, create_periodic_tasks
@@ -108,6 +109,7 @@ class Command(BaseCommand):
 
     def handle(self, *args: Any, **options: Any) -> None:  # noqa
         from hope_country_report.apps.core.models import CountryOffice, User
+        from hope_country_report.apps.power_query.models import ReportDocument, ReportDocumentIndex
 
         self.get_options(options)
         if self.verbosity >= 1:
@@ -183,6 +185,8 @@ class Command(BaseCommand):
                     lm.save(strict=True)
                 except TypeError:
                     pass
+            echo("Build map boundaries")
+            geo.warm()
 
             echo("Create default group")
             get_or_create_reporter_group()
@@ -198,6 +202,9 @@ class Command(BaseCommand):
                     echo(f.name)
             echo("Create default PeriodicTask")
             create_periodic_tasks()
+            if not ReportDocumentIndex.objects.exists() and ReportDocument.objects.exists():
+                echo("Build report document index")
+                ReportDocumentIndex.rebuild()
             echo("Upgrade completed", style_func=self.style.SUCCESS)
         except ValidationError as e:
             self.halt(Exception("\n- ".join(["Wrong argument(s):", *e.messages])))
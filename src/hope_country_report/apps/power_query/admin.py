@@ -16,7 +16,7 @@ from django.contrib import admin, messages
 from django.contrib.admin import ModelAdmin
 from django.contrib.contenttypes.models import ContentType
 from django.core.exceptions import ObjectDoesNotExist
-from django.db import connections, models
+from django.db import connections, models, transaction
 from django.db.models import QuerySet
 from django.http import HttpRequest, HttpResponse, HttpResponseRedirect, StreamingHttpResponse
 from django.shortcuts import redirect, render
@@ -30,7 +30,8 @@ from ...state import state
 from ...utils.language import can_slice
 from ...utils.mail import send_document_password
 from ...utils.media import download_media
-from ...utils.perf import profile
+from ...utils.perf import profile, summarize_spans
+from .celery_tasks import plan_query
 from .forms import ExplainQueryForm, FormatterTestForm, QueryForm, SelectDatasetForm
 from .models import (
     ChartPage,
@@ -96,7 +97,16 @@ class QueryAdmin(
     )
     linked_objects_template = None
     autocomplete_fields = ("target", "owner", "target")
-    readonly_fields = ("sentry_error_id", "error_message", "info", "last_run", "version", "effective_status")
+    readonly_fields = (
+        "sentry_error_id",
+        "error_message",
+        "info",
+        "last_run",
+        "version",
+        "effective_status",
+        "estimated_rows",
+        "estimated_cost",
+    )
     change_form_template = None
     ordering = ["-last_run"]
     form = QueryForm
@@ -114,9 +124,19 @@ class QueryAdmin(
     def success(self, obj: Query) -> bool:
         return not bool(obj.error_message)
 
+    def save_model(self, request: HttpRequest, obj: Query, form: "Any", change: bool) -> None:
+        super().save_model(request, obj, form, change)
+        # the code can be slow: it is planned by a worker, warnings are shown by the change form
+        if not change or {"code", "parent", "target", "parametrizer"} & set(form.changed_data):
+            transaction.on_commit(lambda: plan_query.delay(obj.pk))
+            self.message_user(request, "Query cost estimation queued", messages.INFO)
+
     def change_view(
         self, request: "HttpRequest", object_id: str, form_url: str = "", extra_context: "dict[str, Any] | None" = None
     ) -> "HttpResponse":
+        if request.method == "GET" and (obj := self.get_object(request, object_id)):
+            for warning in (obj.plan or {}).get("warnings", []):
+                self.message_user(request, f"{warning}: consider filtering on an indexed field", messages.WARNING)
         return super().change_view(request, object_id, form_url, extra_context)
 
     @button(
@@ -249,6 +269,17 @@ class QueryAdmin(
             self.message_user(request, f"{e.__class__.__name__}: {e}", messages.ERROR)
         return HttpResponseRedirectToReferrer(request)
 
+    @button()
+    def timings(self, request: HttpRequest, pk: int) -> HttpResponse:
+        ctx = self.get_common_context(request, pk, title="Timings")
+        query = self.get_object(request, str(pk))
+        datasets = query.datasets.only("pk", "info", "last_run")
+        documents = ReportDocument.objects.filter(dataset__query=query).select_related("formatter", "report")
+        spans = [s for d in datasets for s in d.info.get("perfs", {}).get("spans", [])]
+        spans.extend(s for d in documents for s in d.info.get("perf", {}).get("spans", []))
+        ctx.update(datasets=datasets, documents=documents, summary=summarize_spans(spans))
+        return render(request, "admin/power_query/query/timings.html", ctx)
+
     @button()
     def see_children(self, request: HttpRequest, pk: int) -> "HttpResponse":
         url = reverse("admin:power_query_query_changelist")
@@ -291,6 +322,7 @@ class DatasetAdmin(
         "query",
         "last_run",
         "dataset_type",
+        "format",
         "target_type",
         "size",
         "arguments",
@@ -298,10 +330,11 @@ class DatasetAdmin(
     list_filter = (
         ("query__target", AutoCompleteFilter),
         ("query", AutoCompleteFilter),
+        "format",
         "last_run",
     )
     change_form_template = None
-    readonly_fields = ("last_run", "query", "info")
+    readonly_fields = ("last_run", "query", "format", "content_hash", "info")
     date_hierarchy = "last_run"
 
     def get_queryset(self, request):
@@ -336,7 +369,7 @@ class DatasetAdmin(
             context = self.get_common_context(request, pk, title="Results")
             data = obj.data
             with profile() as timing:
-                context["dataset"] = to_dataset(data)
+                context["dataset"] = to_dataset(data, limit=config.PQ_SAMPLE_PAGE_SIZE)
             context["timing"] = timing
             return render(request, "admin/power_query/query/preview.html", context)
         except Exception as e:
@@ -563,7 +596,16 @@ class ReportDocumentAdmin(
     search_fields = ("title",)
     filter_horizontal = ("limit_access_to",)
     date_hierarchy = "dataset__last_run"
-    readonly_fields = ("arguments", "report", "dataset", "content_type", "formatter", "info", "size")
+    readonly_fields = (
+        "arguments",
+        "report",
+        "dataset",
+        "content_type",
+        "formatter",
+        "info",
+        "size",
+        "content_hash",
+    )
 
     def get_queryset(self, request):
         qs = super().get_queryset(request).select_related("report__query", "dataset", "formatter")
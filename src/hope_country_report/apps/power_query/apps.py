@@ -6,4 +6,4 @@ class Config(AppConfig):
     verbose_name = "Power Query"
 
     def ready(self) -> None:
-        from . import checks  # noqa
+        from . import checks, handlers  # noqa
@@ -0,0 +1,193 @@
+"""
+Assets used to render PDF documents: beneficiary photos and QR codes.
+
+Photos are downloaded once from the HOPE storage, resized for the target field and
+kept both in a bounded in-memory LRU and in an on-disk cache shared by the processes
+of the same host. On-disk entries expire after `POWER_QUERY_ASSET_CACHE_TTL` seconds and
+the oldest ones are evicted above `POWER_QUERY_ASSET_CACHE_MAX_DISK_SIZE` bytes.
+"""
+
+import hashlib
+import io
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property, lru_cache
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import qrcode
+from django.conf import settings
+from PIL import Image, ImageOps
+from sentry_sdk import capture_exception
+
+from ..core.storage import get_hope_storage
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+    from django.core.files.storage import Storage
+
+logger = logging.getLogger(__name__)
+
+PHOTO_DPI = 300
+
+
+def photo_size(rect_width: float, rect_height: float, dpi: int = PHOTO_DPI) -> tuple[int, int]:
+    """Pixel size of an image filling a PDF rect (in points) at `dpi`.
+
+    The rect is rounded to a tenth of point first, so the float noise between PDF libraries
+    reading the same rect gives the same size (and cache key).
+    """
+    return round(round(rect_width, 1) / 72.0 * dpi), round(round(rect_height, 1) / 72.0 * dpi)
+
+
+class PhotoCache:
+    def __init__(
+        self,
+        maxsize: int,
+        cache_dir: "str|Path|None" = None,
+        workers: int = 1,
+        ttl: int = 0,
+        max_disk_size: int = 0,
+    ) -> None:
+        self.maxsize = maxsize
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.workers = workers
+        self.ttl = ttl
+        self.max_disk_size = max_disk_size
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @cached_property
+    def storage(self) -> "Storage":
+        return get_hope_storage()
+
+    def key(self, path: str, size: tuple[int, int], dpi: int) -> str:
+        return hashlib.sha1(f"{path}|{size[0]}x{size[1]}|{dpi}".encode()).hexdigest()
+
+    def read(self, path: str) -> bytes:
+        with self.storage.open(path, "rb") as f:
+            return f.read()
+
+    def resize(self, content: bytes, size: tuple[int, int], dpi: int) -> bytes:
+        image = Image.open(io.BytesIO(content))
+        try:
+            image = ImageOps.exif_transpose(image)
+        except Exception as e:
+            logger.warning(f"Failed to apply EXIF orientation: {e}")
+            capture_exception(e)
+        image = image.resize(size, Image.LANCZOS)
+        buffer = io.BytesIO()
+        image.save(buffer, format="PNG", dpi=(dpi, dpi))
+        return buffer.getvalue()
+
+    def _get_cached(self, key: str) -> "bytes|None":
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+        if self.cache_dir:
+            target = self.cache_dir / f"{key}.png"
+            try:
+                if self.ttl and target.stat().st_mtime < time.time() - self.ttl:
+                    return None
+                content = target.read_bytes()
+            except FileNotFoundError:
+                return None
+            self._store(key, content, persist=False)
+            return content
+        return None
+
+    def _store(self, key: str, content: bytes, persist: bool = True) -> None:
+        with self._lock:
+            self._entries[key] = content
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        if persist and self.cache_dir:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            target = self.cache_dir / f"{key}.png"
+            tmp = target.with_suffix(f".{threading.get_ident()}.tmp")
+            tmp.write_bytes(content)
+            tmp.replace(target)
+
+    def get(self, path: str, size: tuple[int, int], dpi: int = PHOTO_DPI) -> bytes:
+        """PNG of the image at `path` resized to `size` pixels."""
+        key = self.key(path, size, dpi)
+        if (content := self._get_cached(key)) is None:
+            content = self.resize(self.read(path), size, dpi)
+            self._store(key, content)
+        return content
+
+    def prefetch(self, requests: "Iterable[tuple[str, tuple[int, int]]]", dpi: int = PHOTO_DPI) -> None:
+        """Concurrently download and resize the images not cached yet. Failures are left to `get()`."""
+        missing = {
+            (path, size) for path, size in requests if path and self._get_cached(self.key(path, size, dpi)) is None
+        }
+        if not missing:
+            return
+
+        def fetch(request: tuple[str, tuple[int, int]]) -> None:
+            try:
+                self.get(*request, dpi=dpi)
+            except Exception as e:
+                logger.debug(f"Unable to prefetch {request[0]}: {e}")
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="pq-assets") as executor:
+            list(executor.map(fetch, missing))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def evict(self) -> int:
+        """Remove the on-disk entries older than `ttl`, then the oldest ones above `max_disk_size` bytes."""
+        if not self.cache_dir or not self.cache_dir.is_dir():
+            return 0
+        entries = []
+        for target in self.cache_dir.iterdir():
+            try:
+                stat = target.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, target))
+        entries.sort()
+        expired = time.time() - self.ttl if self.ttl else 0
+        total = sum(size for __, size, __ in entries)
+        removed = 0
+        for mtime, size, target in entries:
+            if mtime >= expired and (not self.max_disk_size or total <= self.max_disk_size):
+                break
+            target.unlink(missing_ok=True)
+            total -= size
+            removed += 1
+        return removed
+
+
+photos = PhotoCache(
+    maxsize=settings.POWER_QUERY_ASSET_CACHE_SIZE,
+    cache_dir=settings.POWER_QUERY_ASSET_CACHE_DIR,
+    workers=settings.POWER_QUERY_ASSET_PREFETCH_WORKERS,
+    ttl=settings.POWER_QUERY_ASSET_CACHE_TTL,
+    max_disk_size=settings.POWER_QUERY_ASSET_CACHE_MAX_DISK_SIZE,
+)
+
+
+@lru_cache(maxsize=1024)
+def qr_code_png(data: "str|int") -> bytes:
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_L,
+        box_size=10,
+        border=2,
+    )
+    qr.add_data(data)
+    qr.make(fit=True)
+
+    qr_image = qr.make_image(fill_color="black", back_color="white")
+    image_stream = io.BytesIO()
+    qr_image.save(image_stream, format="PNG")
+    return image_stream.getvalue()
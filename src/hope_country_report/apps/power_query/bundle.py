@@ -0,0 +1,196 @@
+"""
+Zip bundles of the current documents of a ReportConfiguration.
+
+Bundles are streamed while they are built: members are read from the storage by a pool of
+`POWER_QUERY_BUNDLE_PREFETCH_WORKERS` threads, ahead of the entry being written, and the zip
+is written to an unseekable sink drained after each chunk, so no temporary file is needed.
+
+A bundle is identified by the ETag of its members (document, content and packaging). The first
+request for a set of documents queues `store_report_bundle`, which saves the bundle to the storage
+under that ETag: later requests for the same documents are served from the stored copy. Stored
+bundles are found by their storage prefix (`bundles/r<report>_`): the most recent
+`POWER_QUERY_BUNDLE_KEEP` are kept and all are removed when the report is deleted.
+"""
+
+import logging
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import SpooledTemporaryFile
+from typing import TYPE_CHECKING
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import File
+from django.db.models.fields.files import FieldFile
+
+from ...utils.media import CHUNK_SIZE, iter_file
+from .models import ReportConfiguration, ReportDocument
+from .utils import dict_hash
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator
+    from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+# already compressed formats are stored as they are
+STORED_SUFFIXES = {".zip", ".xlsx", ".docx", ".pdf", ".png", ".jpg"}
+
+
+class Sink:
+    """Unseekable file-like object collecting what zipfile writes until it is drained."""
+
+    def __init__(self) -> None:
+        self.buffer: "list[bytes]" = []
+        self.position = 0
+
+    def write(self, data: bytes) -> int:
+        self.buffer.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> "Iterator[bytes]":
+        if self.buffer:
+            data, self.buffer = b"".join(self.buffer), []
+            yield data
+
+
+def get_documents(report: ReportConfiguration, arguments: "dict[str, str]|None" = None) -> "list[ReportDocument]":
+    """Documents of `report` with a file, whose arguments match all `arguments` (compared as strings).
+
+    Names that are not an argument of any document of the report (ie. cache busters) are ignored.
+    """
+    docs = list(ReportDocument._all.filter(report=report).exclude(file="").exclude(file=None).order_by("pk"))
+    names = {name for doc in docs for name in doc.arguments or {}}
+    filters = {name: str(value) for name, value in (arguments or {}).items() if name in names}
+    return [doc for doc in docs if all(str(doc.arguments.get(name)) == value for name, value in filters.items())]
+
+
+def get_etag(documents: "Iterable[ReportDocument]") -> str:
+    return dict_hash([doc.etag for doc in documents])
+
+
+def member_names(documents: "Iterable[ReportDocument]") -> "list[str]":
+    names: "list[str]" = []
+    seen: "set[str]" = set()
+    for doc in documents:
+        name = doc.filename
+        if name in seen:
+            name = f"{doc.pk}_{name}"
+        seen.add(name)
+        names.append(name)
+    return names
+
+
+def storage_name(report: ReportConfiguration, etag: str) -> str:
+    return f"bundles/r{report.pk}_{etag}.zip"
+
+
+def stored_names(report_id: int) -> "list[str]":
+    """Names of the stored bundles of the report, oldest first."""
+    storage = ReportDocument._meta.get_field("file").storage
+    try:
+        __, files = storage.listdir("bundles")
+    except FileNotFoundError:
+        return []
+    names = [f"bundles/{name}" for name in files if name.startswith(f"r{report_id}_")]
+    return sorted(names, key=storage.get_modified_time)
+
+
+def remove_stored(report_id: int, keep: "Iterable[str]" = ()) -> int:
+    """Delete the stored bundles of the report but `keep`."""
+    storage = ReportDocument._meta.get_field("file").storage
+    removed = 0
+    for name in stored_names(report_id):
+        if name not in keep:
+            storage.delete(name)
+            cache.delete(f"bundle:{name}")
+            removed += 1
+    return removed
+
+
+def get_stored(report: ReportConfiguration, etag: str) -> "FieldFile|None":
+    """The stored copy of the bundle identified by `etag`, if any."""
+    field = ReportDocument._meta.get_field("file")
+    name = storage_name(report, etag)
+    if cache.get(f"bundle:{name}") == "stored" and field.storage.exists(name):
+        return FieldFile(None, field, name)
+    return None
+
+
+def _read(doc: ReportDocument) -> bytes:
+    with doc.file.open("rb") as f:
+        return f.read()
+
+
+def stream(documents: "list[ReportDocument]") -> "Iterator[bytes]":
+    """Yield the chunks of a zip archive of `documents`. Missing files are skipped."""
+    sink = Sink()
+    names = iter(member_names(documents))
+    pending: "deque[tuple[ReportDocument, str, Future[bytes]|None]]" = deque()
+    docs = iter(documents)
+    workers = settings.POWER_QUERY_BUNDLE_PREFETCH_WORKERS
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pq-bundle") as executor:
+
+        def prefetch() -> None:
+            if (doc := next(docs, None)) is None:
+                return
+            # big members are read chunk by chunk when written instead of being held in memory
+            small = doc.info.get("size", 0) <= settings.POWER_QUERY_SPOOL_MAX_SIZE
+            pending.append((doc, next(names), executor.submit(_read, doc) if small else None))
+
+        for __ in range(workers):
+            prefetch()
+        try:
+            with zipfile.ZipFile(sink, "w", allowZip64=True) as zf:
+                while pending:
+                    doc, name, future = pending.popleft()
+                    prefetch()
+                    try:
+                        chunks = iter([future.result()]) if future else iter_file(doc.file, chunk_size=CHUNK_SIZE)
+                        first = next(chunks, b"")
+                    except Exception as e:
+                        logger.warning(f"Document {doc.pk} skipped from bundle: {e}")
+                        continue
+                    size = doc.info.get("size", 0)
+                    compress_type = zipfile.ZIP_STORED if doc.file_suffix in STORED_SUFFIXES else zipfile.ZIP_DEFLATED
+                    info = zipfile.ZipInfo(name, date_time=doc.updated_on.timetuple()[:6])
+                    info.compress_type = compress_type
+                    with zf.open(info, "w", force_zip64=not size or size * 1.05 > zipfile.ZIP64_LIMIT) as entry:
+                        entry.write(first)
+                        for chunk in chunks:
+                            entry.write(chunk)
+                            yield from sink.drain()
+                    yield from sink.drain()
+        finally:
+            for __, __, future in pending:
+                if future:
+                    future.cancel()
+    yield from sink.drain()
+
+
+def store(report: ReportConfiguration, documents: "list[ReportDocument]", etag: str) -> "str|None":
+    """Save the bundle of `documents` to the storage, unless they changed since `etag` was computed."""
+    if get_etag(documents) != etag:
+        return None
+    field = ReportDocument._meta.get_field("file")
+    name = storage_name(report, etag)
+    if not field.storage.exists(name):
+        with SpooledTemporaryFile(max_size=settings.POWER_QUERY_SPOOL_MAX_SIZE) as archive:
+            for chunk in stream(documents):
+                archive.write(chunk)
+            archive.seek(0)
+            name = field.storage.save(name, File(archive, name=name))
+    cache.set(f"bundle:{name}", "stored", settings.POWER_QUERY_BUNDLE_CACHE_TIMEOUT)
+    # keep the most recent bundles of the report only
+    names = [n for n in stored_names(report.pk) if n != name] + [name]
+    remove_stored(report.pk, keep=names[-settings.POWER_QUERY_BUNDLE_KEEP :])
+    return name
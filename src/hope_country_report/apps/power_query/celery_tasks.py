@@ -1,19 +1,23 @@
+import contextlib
 import logging
 import signal
 import uuid
+from collections import defaultdict
 from typing import TYPE_CHECKING, Any, NoReturn
 
 from billiard.einfo import ExceptionInfo
-from celery import group
+from celery import Signature, chain, group
 from celery.contrib.abortable import AbortableTask
 from celery.exceptions import Ignore, Reject, Retry
 from concurrency.exceptions import RecordModifiedError
+from constance import config
 from django.apps import apps
 from django.conf import settings
 from django.core.cache import caches
 from django.db import Error as DjangoDbError
 from django.db import connection
 from django.db.models import Model
+from django.utils import timezone
 from django.utils.functional import cached_property
 from django_celery_beat.models import PeriodicTask
 from redis import StrictRedis
@@ -21,9 +25,13 @@ from sentry_sdk import capture_exception
 
 from ...config.celery import app
 from .exceptions import QueryRunCanceled, QueryRunTerminated
+from .routing import route_query, route_report
+from .throttle import QuerySlot, backoff
 from .utils import sentry_tags
 
 if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator
+
     from .models import Query, QueryMatrixResult, ReportConfiguration, ReportResult
 
 logger = logging.getLogger(__name__)
@@ -82,6 +90,22 @@ class AbstractPowerQueryTask(AbortableTask):
         rds.eval(REMOVE_ONLY_IF_OWNER_SCRIPT, 1, self.lock_key, self.lock_signature)
         super().on_failure(exc, task_id, args, kwargs, einfo)
 
+    def on_retry(self, exc: Exception, task_id: str, args: tuple, kwargs: dict[str, str], einfo: ExceptionInfo) -> None:
+        rds.eval(REMOVE_ONLY_IF_OWNER_SCRIPT, 1, self.lock_key, self.lock_signature)
+        super().on_retry(exc, task_id, args, kwargs, einfo)
+
+    @contextlib.contextmanager
+    def throttled(self, query: "Query") -> "Iterator[None]":
+        """Hold a concurrency slot for `query` or requeue the task with backoff when none is available."""
+        slot = QuerySlot(query)
+        if not slot.acquire():
+            logger.info(f"Query {query.pk} throttled. Retry #{self.request.retries + 1}")
+            raise self.retry(countdown=backoff(self.request.retries), max_retries=config.PQ_THROTTLE_MAX_RETRIES)
+        try:
+            yield
+        finally:
+            slot.release()
+
     @property
     def lock_key(self) -> str:
         return f"PowerQueryLock_{self.__class__.__name__}_{self.request.id}_{self.request.retries}"
@@ -128,7 +152,8 @@ def run_background_query(self: PowerQueryTask, query_id: int, version: int) -> "
         for sig in ("TERM", "HUP", "INT", "USR1"):
             signal.signal(getattr(signal, "SIG" + sig), trap)
 
-        return query.execute_matrix(running_task=self)
+        with self.throttled(query):
+            return query.execute_matrix(running_task=self)
     except QueryRunTerminated as e:
         raise Reject(e, requeue=False)
     except QueryRunCanceled as e:
@@ -146,9 +171,39 @@ def run_background_query(self: PowerQueryTask, query_id: int, version: int) -> "
         raise
 
 
+@app.task(bind=True, base=AbstractPowerQueryTask)
+@sentry_tags
+def refresh_parametrizer(self: AbstractPowerQueryTask, parametrizer_id: int) -> None:
+    from hope_country_report.apps.power_query.models import Parametrizer
+
+    Parametrizer.objects.get(pk=parametrizer_id).refresh()
+
+
+@app.task(bind=True, base=PowerQueryTask)
+@sentry_tags
+def refresh_query(self: PowerQueryTask, query_id: int, scheduled_at: float | None = None) -> "QueryMatrixResult":
+    """
+    Run the Query matrix once on behalf of all the reports scheduled on it.
+
+    Runs are skipped if the Query has been refreshed after `scheduled_at` (ie. by an overlapping schedule).
+    On query errors the dependent reports are not rendered.
+    """
+    from hope_country_report.apps.power_query.models import Query
+
+    query = Query.objects.get(pk=query_id)
+    if scheduled_at and query.last_run and query.last_run.timestamp() >= scheduled_at and not query.error_message:
+        logger.info(f"Query {query_id} already refreshed after {scheduled_at}. Skipped")
+        return query.info.get("last_run_results", {})
+    with self.throttled(query):
+        result = query.execute_matrix(running_task=self)
+    if "error_message" in result:
+        raise Ignore(result["error_message"])
+    return result
+
+
 @app.task(bind=True, default_retry_delay=60, max_retries=3, base=ReportTask)
 @sentry_tags
-def refresh_report(self: PowerQueryTask, report_id: int, version: int = 0) -> "ReportResult":
+def refresh_report(self: PowerQueryTask, report_id: int, version: int = 0, run_query: bool = True) -> "ReportResult":
     from hope_country_report.apps.power_query.models import ReportConfiguration
 
     result: "ReportResult" = []
@@ -162,7 +217,7 @@ def refresh_report(self: PowerQueryTask, report_id: int, version: int = 0) -> "R
         report.sentry_error_id = None
         report.save(update_fields=["error_message", "sentry_error_id"])
 
-        result = report.execute(run_query=True)
+        result = report.execute(run_query=run_query, running_task=self)
     except RecordModifiedError as e:
         raise Reject(e, requeue=False)
     except (Ignore, Reject, Retry):
@@ -182,6 +237,54 @@ def refresh_report(self: PowerQueryTask, report_id: int, version: int = 0) -> "R
     return result
 
 
+@app.task()
+@sentry_tags
+def plan_query(query_id: int) -> "dict[str, Any]|None":
+    """Store the planner estimates of a Query (see `Query.update_plan`), ie. after it has been edited."""
+    from hope_country_report.apps.power_query.models import Query
+
+    query = Query._all.filter(pk=query_id).first()
+    if query is None:
+        return None
+    try:
+        return query.update_plan()
+    except Exception as e:
+        logger.warning(f"Unable to plan query {query_id}: {e}")
+        return None
+
+
+@app.task(autoretry_for=(OSError,), retry_backoff=True, max_retries=5)
+@sentry_tags
+def remove_report_files(names: "list[str]") -> int:
+    """Delete document files superseded by a report run."""
+    from .persistence import remove_files
+
+    return remove_files(names)
+
+
+@app.task()
+@sentry_tags
+def store_report_bundle(report_id: int, document_ids: "list[int]", etag: str) -> "str|None":
+    """Save to the storage the bundle of `document_ids` built on the fly for a download."""
+    from hope_country_report.apps.power_query.models import ReportConfiguration, ReportDocument
+
+    from .bundle import store
+
+    report = ReportConfiguration._all.filter(pk=report_id).first()
+    if report is None:
+        return None
+    return store(report, list(ReportDocument._all.filter(pk__in=document_ids).order_by("pk")), etag)
+
+
+@app.task(autoretry_for=(OSError,), retry_backoff=True, max_retries=5)
+@sentry_tags
+def remove_report_bundles(report_id: int) -> int:
+    """Delete the stored bundles of a deleted report."""
+    from .bundle import remove_stored
+
+    return remove_stored(report_id)
+
+
 @app.task(bind=True, default_retry_delay=60, max_retries=3, base=ReportTask)
 @sentry_tags
 def reports_refresh(self: AbortableTask, **kwargs: dict[str, Any]) -> Any:
@@ -194,12 +297,65 @@ def reports_refresh(self: AbortableTask, **kwargs: dict[str, Any]) -> Any:
             logger.error(f"PeriodicTask with name '{periodic_task_name}' not found for task {self.request.id}.")
             return result
 
-        grp = [
-            refresh_report.subtask((report.pk, report.version)) for report in periodic_task.reports.filter(active=True)
-        ]
-
-        if grp:
-            job = group(grp)
-            result = job.apply_async()
+        reports = periodic_task.reports.filter(active=True).select_related(
+            "query__parametrizer", "query__parent__parametrizer"
+        )
+        if reports:
+            result = build_refresh_workflow(reports).apply_async()
 
     return result
+
+
+def build_refresh_workflow(reports: "Iterable[ReportConfiguration]") -> Signature:
+    """
+    Celery canvas refreshing `reports` with each distinct query executed once.
+
+    Every query runs followed, in parallel, by the reports that depend on it. Queries whose
+    parametrizer is fed by a source query wait for it: the source query runs first (once, even
+    if it is scheduled too), then the parametrizers are refreshed from its fresh dataset and only
+    then the dependent queries run. Only one level of sources is resolved.
+    """
+    scheduled_at = timezone.now().timestamp()
+    by_query: "dict[int, list[ReportConfiguration]]" = defaultdict(list)
+    for report in reports:
+        by_query[report.query_id].append(report)
+
+    sources: "dict[int, Query]" = {}
+    parametrizers: "dict[int, set[int]]" = defaultdict(set)
+    dependents: "dict[int, list[int]]" = defaultdict(list)
+    for query_id, query_reports in by_query.items():
+        query = query_reports[0].query
+        parametrizer = query.parametrizer or (query.parent.parametrizer if query.parent else None)
+        if parametrizer and parametrizer.source_id and parametrizer.source_id != query_id:
+            sources[parametrizer.source_id] = parametrizer.source
+            parametrizers[parametrizer.source_id].add(parametrizer.pk)
+            dependents[parametrizer.source_id].append(query_id)
+    waiting = {query_id for ids in dependents.values() for query_id in ids} - set(sources)
+
+    def run(query_id: int, query: "Query") -> Signature:
+        return refresh_query.si(query_id, scheduled_at).set(**route_query(query).options())
+
+    def render(query_id: int) -> "list[Signature]":
+        return [
+            refresh_report.si(r.pk, r.version, run_query=False).set(**route_report(r, run_query=False).options())
+            for r in by_query.get(query_id, [])
+        ]
+
+    def refresh(query_id: int) -> Signature:
+        return chain(run(query_id, by_query[query_id][0].query), group(render(query_id)))
+
+    stages = [
+        chain(
+            run(source_id, source),
+            group(
+                *render(source_id),
+                chain(
+                    group(refresh_parametrizer.si(pk) for pk in sorted(parametrizers[source_id])),
+                    group(refresh(query_id) for query_id in dependents[source_id] if query_id in waiting),
+                ),
+            ),
+        )
+        for source_id, source in sources.items()
+    ]
+    stages.extend(refresh(query_id) for query_id in by_query if query_id not in sources and query_id not in waiting)
+    return group(stages)
@@ -0,0 +1,267 @@
+"""
+Columnar on-disk format for Dataset results.
+
+A columnar file is a zip archive with a ``manifest.json`` describing the
+schema (column names and inferred types) and the row groups, plus one member
+per column per row group. Readers can load only the columns and the row
+groups they need instead of unpickling the whole result.
+"""
+
+import datetime
+import decimal
+import json
+import pickle
+import uuid
+import zipfile
+from typing import TYPE_CHECKING
+
+import tablib
+from django.conf import settings
+from django.db.models import QuerySet
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator, Sequence
+    from typing import IO, Any
+
+FORMAT_PICKLE = "pickle"
+FORMAT_COLUMNAR = "columnar"
+FORMATS = (
+    (FORMAT_PICKLE, "Pickle"),
+    (FORMAT_COLUMNAR, "Columnar"),
+)
+
+VERSION = 1
+MANIFEST = "manifest.json"
+DEFAULT_ROW_GROUP_SIZE = 10_000
+
+TYPE_NULL = "null"
+TYPE_OBJECT = "object"
+
+_TYPES: "list[tuple[type, str]]" = [
+    (bool, "bool"),
+    (int, "int"),
+    (float, "float"),
+    (decimal.Decimal, "decimal"),
+    (str, "str"),
+    (datetime.datetime, "datetime"),
+    (datetime.date, "date"),
+    (datetime.time, "time"),
+    (uuid.UUID, "uuid"),
+    (dict, "json"),
+    (list, "json"),
+]
+
+
+def column_type(value: "Any") -> str:
+    if value is None:
+        return TYPE_NULL
+    for klass, name in _TYPES:
+        if isinstance(value, klass):
+            return name
+    return TYPE_OBJECT
+
+
+def is_tabular(result: "Any") -> bool:
+    if isinstance(result, QuerySet | tablib.Dataset):
+        return True
+    if isinstance(result, list | tuple):
+        return all(isinstance(e, dict) for e in result)
+    return False
+
+
+def queryset_fields(result: "QuerySet[Any]") -> "list[str]":
+    """Column names of `result`, in the order Django returns them (see `ValuesIterable`)."""
+    query = result.query
+    if selected := getattr(query, "selected", None):
+        return list(selected)
+    fields = query.values_select or [field.name for field in result.model._meta.concrete_fields]
+    # extra(select=...) columns come first, annotations last
+    return [*query.extra_select, *fields, *query.annotation_select]
+
+
+def _cached_row(obj: "Any", fields: "Sequence[str]") -> "Sequence[Any]":
+    if isinstance(obj, tuple):
+        return obj
+    if isinstance(obj, dict):
+        return [obj[f] for f in fields]
+    return [obj.serializable_value(f) for f in fields]
+
+
+def iter_tabular(result: "Any", chunk_size: "int|None" = None) -> "tuple[list[str], Iterable[Sequence[Any]]]":
+    """Return headers and an iterable of rows for any tabular query result.
+
+    Unevaluated QuerySets are streamed from the PowerQuery database through a
+    server-side cursor, ``chunk_size`` rows at a time. Raise ValueError if the
+    result is not tabular (eg. a list of scalars or tuples).
+    """
+    if isinstance(result, QuerySet):
+        fields = queryset_fields(result)
+        if result._result_cache is not None:
+            return fields, (_cached_row(obj, fields) for obj in result)
+        qs = result.using(settings.POWER_QUERY_DB_ALIAS).values_list(*fields)
+        return fields, qs.iterator(chunk_size=chunk_size or settings.POWER_QUERY_CURSOR_CHUNK_SIZE)
+    if isinstance(result, tablib.Dataset):
+        return list(result.headers or []), iter(result)
+    if isinstance(result, list | tuple) and is_tabular(result):
+        fields = list({k: None for d in result for k in d.keys()}.keys())
+        return fields, ([obj.get(f) for f in fields] for obj in result)
+    raise ValueError(f"{type(result)} is not a tabular result")
+
+
+class ColumnarWriter:
+    def __init__(self, fp: "IO[bytes]", headers: "Sequence[str]", row_group_size: int = DEFAULT_ROW_GROUP_SIZE) -> None:
+        self.headers = list(headers)
+        self.types = [TYPE_NULL] * len(self.headers)
+        self.row_group_size = row_group_size
+        self.row_groups: "list[int]" = []
+        self._columns: "list[list[Any]]" = [[] for __ in self.headers]
+        self._pending = 0
+        self._zip = zipfile.ZipFile(fp, "w", compression=zipfile.ZIP_DEFLATED, allowZip64=True)
+
+    def __enter__(self) -> "ColumnarWriter":
+        return self
+
+    def __exit__(self, *args: "Any") -> None:
+        self.close()
+
+    @property
+    def rows(self) -> int:
+        return sum(self.row_groups) + self._pending
+
+    def write(self, row: "Sequence[Any]") -> None:
+        for i, value in enumerate(row):
+            self._columns[i].append(value)
+            if value is not None and self.types[i] != TYPE_OBJECT:
+                value_type = column_type(value)
+                if self.types[i] == TYPE_NULL:
+                    self.types[i] = value_type
+                elif self.types[i] != value_type:
+                    self.types[i] = TYPE_OBJECT
+        self._pending += 1
+        if self._pending >= self.row_group_size:
+            self.flush()
+
+    def write_rows(self, rows: "Iterable[Sequence[Any]]") -> None:
+        for row in rows:
+            self.write(row)
+
+    def flush(self) -> None:
+        if not self._pending:
+            return
+        group = len(self.row_groups)
+        for i, values in enumerate(self._columns):
+            self._zip.writestr(f"rg{group:05d}/c{i:04d}", pickle.dumps(values, protocol=pickle.HIGHEST_PROTOCOL))
+        self.row_groups.append(self._pending)
+        self._columns = [[] for __ in self.headers]
+        self._pending = 0
+
+    def close(self) -> None:
+        if self._zip.fp is None:
+            return
+        self.flush()
+        manifest = {
+            "version": VERSION,
+            "headers": self.headers,
+            "types": self.types,
+            "row_groups": self.row_groups,
+            "rows": sum(self.row_groups),
+        }
+        self._zip.writestr(MANIFEST, json.dumps(manifest))
+        self._zip.close()
+
+
+class ColumnarReader:
+    def __init__(self, fp: "IO[bytes]") -> None:
+        self._zip = zipfile.ZipFile(fp, "r")
+        self.manifest = json.loads(self._zip.read(MANIFEST))
+        self.headers: "list[str]" = self.manifest["headers"]
+        self.types: "list[str]" = self.manifest["types"]
+        self.row_groups: "list[int]" = self.manifest["row_groups"]
+
+    def __len__(self) -> int:
+        return self.manifest["rows"]
+
+    def __enter__(self) -> "ColumnarReader":
+        return self
+
+    def __exit__(self, *args: "Any") -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._zip.close()
+
+    @property
+    def schema(self) -> "dict[str, str]":
+        return dict(zip(self.headers, self.types, strict=True))
+
+    def read_column(self, name: str, group: int) -> "list[Any]":
+        index = self.headers.index(name)
+        return pickle.loads(self._zip.read(f"rg{group:05d}/c{index:04d}"))
+
+    def iter_rows(
+        self, columns: "Sequence[str]|None" = None, start: int = 0, stop: "int|None" = None
+    ) -> "Iterator[tuple[Any, ...]]":
+        """Yield rows as tuples, reading only the row groups that overlap [start, stop)."""
+        columns = list(columns or self.headers)
+        for name in columns:
+            if name not in self.headers:
+                raise KeyError(name)
+        stop = len(self) if stop is None else min(stop, len(self))
+        offset = 0
+        for group, count in enumerate(self.row_groups):
+            group_start, group_stop = offset, offset + count
+            offset = group_stop
+            if group_stop <= start:
+                continue
+            if group_start >= stop:
+                break
+            values = [self.read_column(name, group) for name in columns]
+            first = max(start - group_start, 0)
+            last = min(stop - group_start, count)
+            yield from zip(*(v[first:last] for v in values), strict=True)
+
+    def iter_dicts(
+        self, columns: "Sequence[str]|None" = None, start: int = 0, stop: "int|None" = None
+    ) -> "Iterator[dict[str, Any]]":
+        columns = list(columns or self.headers)
+        for row in self.iter_rows(columns, start, stop):
+            yield dict(zip(columns, row, strict=True))
+
+    def to_dicts(
+        self, columns: "Sequence[str]|None" = None, start: int = 0, stop: "int|None" = None
+    ) -> "list[dict[str, Any]]":
+        return list(self.iter_dicts(columns, start, stop))
+
+    def to_dataset(
+        self, columns: "Sequence[str]|None" = None, start: int = 0, stop: "int|None" = None
+    ) -> tablib.Dataset:
+        data = tablib.Dataset()
+        data.headers = list(columns or self.headers)
+        for row in self.iter_rows(columns, start, stop):
+            data.append(row)
+        return data
+
+
+def merge_columnar(
+    fp: "IO[bytes]",
+    previous: ColumnarReader,
+    rows: "Iterable[Sequence[Any]]",
+    key: str,
+    replaced: "set[Any]",
+    row_group_size: int = DEFAULT_ROW_GROUP_SIZE,
+) -> int:
+    """Write ``previous`` without the rows whose ``key`` is in ``replaced``, followed by ``rows``."""
+    index = previous.headers.index(key)
+    with ColumnarWriter(fp, previous.headers, row_group_size=row_group_size) as writer:
+        writer.write_rows(row for row in previous.iter_rows() if row[index] not in replaced)
+        writer.write_rows(rows)
+    return writer.rows
+
+
+def write_columnar(
+    fp: "IO[bytes]", result: "Any", row_group_size: int = DEFAULT_ROW_GROUP_SIZE, chunk_size: "int|None" = None
+) -> int:
+    headers, rows = iter_tabular(result, chunk_size=chunk_size)
+    with ColumnarWriter(fp, headers, row_group_size=row_group_size) as writer:
+        writer.write_rows(rows)
+    return writer.rows
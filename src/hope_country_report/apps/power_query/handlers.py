@@ -0,0 +1,53 @@
+"""
+Keep `ReportDocumentIndex` in sync with documents, reports, tags and datasets, and remove the
+stored bundles of deleted reports.
+"""
+
+from typing import TYPE_CHECKING
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .celery_tasks import remove_report_bundles
+from .models import Dataset, ReportConfiguration, ReportDocument
+from .models.document_index import ReportDocumentIndex
+
+if TYPE_CHECKING:
+    from typing import Any
+
+INDEXED_REPORT_FIELDS = {"country_office", "name", "owner", "active", "visible"}
+
+
+@receiver(post_save, sender=ReportDocument)
+@receiver(post_delete, sender=ReportDocument)
+def on_document_change(sender: type[ReportDocument], instance: ReportDocument, **kwargs: "Any") -> None:
+    ReportDocumentIndex.refresh(instance.report_id, instance.dataset_id)
+
+
+@receiver(post_save, sender=ReportConfiguration)
+def on_report_save(sender: type[ReportConfiguration], instance: ReportConfiguration, **kwargs: "Any") -> None:
+    update_fields = kwargs.get("update_fields")
+    if update_fields and not INDEXED_REPORT_FIELDS.intersection(update_fields):
+        return
+    ReportDocumentIndex.refresh_report(instance)
+
+
+@receiver(post_delete, sender=ReportConfiguration)
+def on_report_delete(sender: type[ReportConfiguration], instance: ReportConfiguration, **kwargs: "Any") -> None:
+    report_id = instance.pk
+    transaction.on_commit(lambda: remove_report_bundles.delay(report_id), robust=True)
+
+
+@receiver(m2m_changed, sender=ReportConfiguration.tags.through)
+def on_report_tags_change(sender: "Any", instance: "Any", action: str, **kwargs: "Any") -> None:
+    if isinstance(instance, ReportConfiguration) and action in ("post_add", "post_remove", "post_clear"):
+        ReportDocumentIndex.refresh_report(instance)
+
+
+@receiver(post_delete, sender=Dataset)
+def on_dataset_delete(sender: type[Dataset], instance: Dataset, **kwargs: "Any") -> None:
+    # documents are kept (dataset=NULL) without signals: move their entries
+    for report_id in ReportDocumentIndex._all.filter(dataset_ref=instance.pk).values_list("report_id", flat=True):
+        ReportDocumentIndex.refresh(report_id, instance.pk)
+        ReportDocumentIndex.refresh(report_id, None)
@@ -37,6 +37,11 @@ class Command(BaseCommand):
 
         subparsers.add_parser("list")
 
+        plan = subparsers.add_parser("plan")
+        plan.add_argument("--sql", action="store_true", default=False)
+
+        subparsers.add_parser("reindex")
+
     def _list(self, *args: Any, **options: Any) -> None:
         from hope_country_report.apps.power_query.models import Query as PowerQuery
 
@@ -45,6 +50,31 @@ class Command(BaseCommand):
         for q in PowerQuery.objects.all():
             self.stdout.write(line.format(id=q.id, name=q.name[:30], status=q.task_status, last_run=q.last_run))
 
+    def _plan(self, *args: Any, **options: Any) -> None:
+        line = "#{id:>5}   {name:<32} {rows:>12} {cost:>14}   {warnings}"
+        self.stdout.write(line.format(id="id", name="name", rows="est. rows", cost="est. cost", warnings="warnings"))
+        for q in PowerQuery.objects.filter(active=True).select_related("parent", "target"):
+            try:
+                plan = q.update_plan()
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f"#{q.id:>5}   {q.name[:30]:<32} {e.__class__.__name__}: {e}"))
+                continue
+            if plan["cost"] is None:
+                rows = cost = "-"
+            else:
+                rows, cost = plan["rows"], f"{plan['cost']:.2f}"
+            warnings = ", ".join(plan["warnings"])
+            msg = line.format(id=q.id, name=q.name[:30], rows=rows, cost=cost, warnings=warnings)
+            self.stdout.write(self.style.WARNING(msg) if warnings else msg)
+            if options["sql"] and plan.get("sql"):
+                self.stdout.write(f"         {plan['sql']}")
+
+    def _reindex(self, *args: Any, **options: Any) -> None:
+        from hope_country_report.apps.power_query.models import ReportDocumentIndex
+
+        count = ReportDocumentIndex.rebuild()
+        self.stdout.write(f"{count} document index entries")
+
     def _test(self, *args: Any, **options: Any) -> None:
         code = Path(options["filename"]).read_text()
         target = options["target"]
@@ -115,5 +145,9 @@ class Command(BaseCommand):
             self._queue(*args, **options)
         elif cmd == "check":
             self._check(*args, **options)
+        elif cmd == "plan":
+            self._plan(*args, **options)
+        elif cmd == "reindex":
+            self._reindex(*args, **options)
         else:
             raise CommandError(cmd)
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.15 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("power_query", "0012_alter_formatter_file_suffix"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="dataset",
+            name="format",
+            field=models.CharField(
+                choices=[("pickle", "Pickle"), ("columnar", "Columnar")],
+                default="pickle",
+                editable=False,
+                max_length=20,
+            ),
+        ),
+        migrations.AddField(
+            model_name="query",
+            name="dataset_format",
+            field=models.CharField(
+                choices=[("pickle", "Pickle"), ("columnar", "Columnar")],
+                default="pickle",
+                help_text="Storage format of the datasets. Non tabular results are always pickled",
+                max_length=20,
+            ),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.15 on 2026-10-18 10:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("power_query", "0013_query_dataset_format_dataset_format"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="query",
+            name="matrix_workers",
+            field=models.PositiveSmallIntegerField(
+                default=1,
+                help_text="Number of argument-matrix cells executed concurrently (capped by PQ_MATRIX_MAX_WORKERS). "
+                "1 runs them serially",
+            ),
+        ),
+    ]
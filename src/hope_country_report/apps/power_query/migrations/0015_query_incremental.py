@@ -0,0 +1,30 @@
+# Generated by Django 5.2.15 on 2026-10-18 10:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("power_query", "0014_query_matrix_workers"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="query",
+            name="incremental",
+            field=models.BooleanField(
+                default=False,
+                help_text="Only fetch rows changed since the previous run and merge them into the stored dataset by "
+                "primary key. Requires columnar format and a QuerySet result including the primary key",
+            ),
+        ),
+        migrations.AddField(
+            model_name="query",
+            name="incremental_field",
+            field=models.CharField(
+                default="updated_at",
+                help_text="Field used as high-water mark by incremental refresh",
+                max_length=100,
+            ),
+        ),
+    ]
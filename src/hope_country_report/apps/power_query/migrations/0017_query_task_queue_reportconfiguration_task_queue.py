@@ -0,0 +1,22 @@
+# Generated by Django 5.2.15 on 2026-10-18 12:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("power_query", "0016_dataset_content_hash_reportdocument_content_hash"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="query",
+            name="task_queue",
+            field=models.CharField(blank=True, default="", editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name="reportconfiguration",
+            name="task_queue",
+            field=models.CharField(blank=True, default="", editable=False, max_length=100),
+        ),
+    ]
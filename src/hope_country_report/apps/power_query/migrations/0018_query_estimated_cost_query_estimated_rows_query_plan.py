@@ -0,0 +1,34 @@
+# Generated by Django 5.2.15 on 2026-10-18 13:10
+
+from django.db import migrations, models
+
+import hope_country_report.apps.power_query.json
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("power_query", "0017_query_task_queue_reportconfiguration_task_queue"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="query",
+            name="estimated_cost",
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="query",
+            name="estimated_rows",
+            field=models.BigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="query",
+            name="plan",
+            field=models.JSONField(
+                blank=True,
+                default=dict,
+                editable=False,
+                encoder=hope_country_report.apps.power_query.json.PQJSONEncoder,
+            ),
+        ),
+    ]
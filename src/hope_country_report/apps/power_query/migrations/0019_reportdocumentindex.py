@@ -0,0 +1,65 @@
+# Generated by Django 5.2.15 on 2026-10-18 15:20
+
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0002_alter_user_time_format"),
+        ("power_query", "0018_query_estimated_cost_query_estimated_rows_query_plan"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ReportDocumentIndex",
+            fields=[
+                ("id", models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("dataset_ref", models.IntegerField(blank=True, null=True)),
+                ("title", models.CharField(max_length=300)),
+                ("report_name", models.CharField(blank=True, default="", max_length=255)),
+                ("owner", models.CharField(blank=True, default="", max_length=255)),
+                ("active", models.BooleanField(default=True)),
+                ("visible", models.BooleanField(default=True)),
+                (
+                    "tags",
+                    django.contrib.postgres.fields.ArrayField(
+                        base_field=models.CharField(max_length=100), blank=True, default=list, size=None
+                    ),
+                ),
+                ("formats", models.JSONField(blank=True, default=list)),
+                ("size", models.BigIntegerField(default=0)),
+                ("updated_on", models.DateTimeField(blank=True, null=True)),
+                (
+                    "country_office",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, related_name="+", to="core.countryoffice"
+                    ),
+                ),
+                (
+                    "document",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, related_name="+", to="power_query.reportdocument"
+                    ),
+                ),
+                (
+                    "report",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="power_query.reportconfiguration",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(fields=["country_office", "-updated_on"], name="pq_docindex_office_updated"),
+                    models.Index(fields=["country_office", "report_name"], name="pq_docindex_office_report"),
+                    django.contrib.postgres.indexes.GinIndex(fields=["tags"], name="pq_docindex_tags"),
+                ],
+                "unique_together": {("report", "dataset_ref")},
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.15 on 2026-10-18 17:30
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("power_query", "0020_reportrununit"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="reportconfiguration",
+            name="compression",
+            field=models.CharField(
+                choices=[
+                    ("stored", "Stored (no compression)"),
+                    ("deflated", "Deflated"),
+                    ("bzip2", "BZIP2"),
+                    ("lzma", "LZMA"),
+                ],
+                default="deflated",
+                help_text="Zip compression method",
+                max_length=10,
+            ),
+        ),
+        migrations.AddField(
+            model_name="reportconfiguration",
+            name="compression_level",
+            field=models.PositiveSmallIntegerField(
+                blank=True,
+                help_text="Zip compression level (0-9). Leave empty to use the default of the method",
+                null=True,
+                validators=[django.core.validators.MaxValueValidator(9)],
+            ),
+        ),
+    ]
@@ -1,8 +1,10 @@
 from .arguments import Parametrizer  # noqa
 from .chart import ChartPage  # noqa
 from .dataset import Dataset  # noqa
+from .document_index import ReportDocumentIndex  # noqa
 from .formatter import Formatter  # noqa
 from .query import Query  # noqa
 from .report import ReportConfiguration  # noqa
 from .report_document import ReportDocument  # noqa
+from .report_run import ReportRunUnit  # noqa
 from .report_template import ReportTemplate  # noqa
@@ -1,20 +1,28 @@
+import json
 import logging
 import os
 import pickle
 from typing import TYPE_CHECKING
 
 from concurrency.fields import AutoIncVersionField
+from django.conf import settings
 from django.contrib.admin.templatetags.admin_urls import admin_urlname
 from django.db import models
 from django.urls import reverse
+from django_celery_boost.signals import task_terminated
 
 from ...core.utils import SmartManager
+from .. import routing
 from ..manager import PowerQueryManager
 from ..processors import mimetype_map
 
 if TYPE_CHECKING:
     from typing import Any
 
+    from kombu.connection import Connection
+
+    from ..routing import Route
+
 
 logger = logging.getLogger(__name__)
 
@@ -26,11 +34,92 @@ class PowerQueryCeleryFields(models.Model):
     sentry_error_id = models.CharField(max_length=512, blank=True, null=True)
     error_message = models.TextField(blank=True, null=True)
     last_run = models.DateTimeField(null=True, blank=True)
+    task_queue = models.CharField(max_length=100, blank=True, default="", editable=False)
 
     class Meta:
         abstract = True
 
 
+class RoutedQueue:
+    """`celery_task_queue` of records routed by cost: the queue their current task has been sent to."""
+
+    def __get__(self, instance: "RoutedTaskMixin|None", owner: type) -> str:
+        if instance is not None and instance.task_queue:
+            return instance.task_queue
+        return settings.CELERY_TASK_DEFAULT_QUEUE
+
+
+class RoutedTaskMixin:
+    """Queue the record task on the queue and with the priority selected by `get_route()`.
+
+    The Redis transport keeps the messages of each priority step in its own list
+    (`<queue>\\x06\\x16<priority>`): the queue lookups look at all of them, in the order they are consumed.
+    """
+
+    celery_task_queue = RoutedQueue()
+
+    def get_route(self, interactive: bool = False) -> "Route":
+        """Route of the record task. Records without a cost estimate are sent to the fast route."""
+        return routing.get_route(routing.FAST, interactive)
+
+    def queue(self, use_version: bool = True, interactive: bool = False) -> str | None:
+        if self.task_status not in self.ACTIVE_STATUSES:
+            route = self.get_route(interactive)
+            res = self.task_handler.apply_async((self.pk, self.version if use_version else None), **route.options())
+            self.set_queued(res)
+            self.task_queue = route.queue
+            type(self).objects.filter(pk=self.pk).update(task_queue=route.queue)
+            return self.curr_async_result_id
+        return None
+
+    def _queued_entries(self, conn: "Connection") -> "list[tuple[str, bytes]]":
+        """`(list, message)` waiting in `celery_task_queue`, the next to be consumed first."""
+        channel = conn.default_channel
+        entries = []
+        for priority in channel.priority_steps:
+            key = channel._q_for_pri(self.celery_task_queue, priority)
+            entries.extend((key, task) for task in reversed(channel.client.lrange(key, 0, -1)))
+        return entries
+
+    def _find_queued(self, conn: "Connection") -> "tuple[int, str, bytes]|None":
+        for position, (key, task) in enumerate(self._queued_entries(conn), 1):
+            if json.loads(task)["headers"]["id"] == self.curr_async_result_id:
+                return position, key, task
+        return None
+
+    def is_queued(self) -> bool:
+        try:
+            with self.celery_app.pool.acquire(block=True) as conn:
+                return self._find_queued(conn) is not None
+        except Exception as e:
+            logger.exception(e)
+        return False
+
+    @property
+    def queue_position(self) -> int:
+        if self.is_terminated():
+            return 0
+        with self.celery_app.pool.acquire(block=True) as conn:
+            found = self._find_queued(conn)
+        return found[0] if found else 0
+
+    def terminate(self, wait: bool = False, timeout: "float|None" = None) -> str:
+        if self.task_status not in [self.QUEUED, self.PENDING]:
+            return super().terminate(wait=wait, timeout=timeout)
+        with self.celery_app.pool.acquire(block=True) as conn:
+            client = conn.default_channel.client
+            client.sadd(self.celery_task_revoked_queue, self.curr_async_result_id, self.curr_async_result_id)
+            if found := self._find_queued(conn):
+                __, key, task = found
+                client.lrem(key, 1, task)
+            client.delete(f"celery-task-meta-{self.curr_async_result_id}")
+        self.curr_async_result_id = None
+        self.local_status = self.CANCELED
+        self.save(update_fields=["local_status", "curr_async_result_id"])
+        task_terminated.send(sender=self.__class__, task=self)
+        return self.CANCELED
+
+
 class AdminReversable(models.Model):
     class Meta:
         abstract = True
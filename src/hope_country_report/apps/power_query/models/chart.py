@@ -1,3 +1,5 @@
+from typing import TYPE_CHECKING
+
 from django.core.exceptions import ValidationError
 from django.db import models
 from django.urls import reverse
@@ -7,6 +9,9 @@ from hope_country_report.apps.core.models import CountryOffice
 from .query import Query
 from .report_template import ReportTemplate
 
+if TYPE_CHECKING:
+    from typing import Any
+
 
 class ChartPage(models.Model):
     country_office = models.ForeignKey(CountryOffice, on_delete=models.CASCADE)
@@ -21,6 +26,18 @@ class ChartPage(models.Model):
     class Tenant:
         tenant_filter_field = "country_office"
 
+    def clean(self) -> None:
+        from ..aggregation import parse
+
+        parse(self.params)
+
+    @property
+    def aggregation(self) -> "dict[str, Any]|None":
+        """Dimensions, measures and filters declared in `params`, None if the chart pivots the raw data."""
+        from ..aggregation import parse
+
+        return parse(self.params)
+
     def save(self, *args, **kwargs) -> None:
         if not self.country_office_id:
             self.country_office = self.query.country_office
@@ -34,3 +51,6 @@ class ChartPage(models.Model):
 
     def get_absolute_url(self):
         return reverse("office-chart", args=[self.country_office.slug, self.pk])
+
+    def get_data_url(self) -> str:
+        return reverse("office-chart-data", args=[self.country_office.slug, self.pk])
@@ -1,4 +1,6 @@
+import contextlib
 import logging
+from itertools import islice
 from typing import TYPE_CHECKING
 
 from django.db import models
@@ -6,10 +8,14 @@ from django.db.models import JSONField
 from django.utils.functional import cached_property
 from django_cleanup import cleanup
 
+from ..columnar import FORMAT_COLUMNAR, FORMAT_PICKLE, FORMATS, ColumnarReader, is_tabular, iter_tabular
 from ._base import FileProviderMixin, PowerQueryModel, TimeStampMixin
 from .query import Query
 
 if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator, Sequence
+    from typing import Any
+
     from ...core.models import CountryOffice
 
 
@@ -22,6 +28,8 @@ class Dataset(PowerQueryModel, FileProviderMixin, TimeStampMixin, models.Model):
     last_run = models.DateTimeField(null=True, blank=True)
     description = models.CharField(max_length=100)
     query = models.ForeignKey(Query, on_delete=models.CASCADE, related_name="datasets")
+    format = models.CharField(max_length=20, choices=FORMATS, default=FORMAT_PICKLE, editable=False)
+    content_hash = models.CharField(max_length=64, blank=True, default="", editable=False)
 
     info = JSONField(default=dict, blank=True)
 
@@ -42,3 +50,148 @@ class Dataset(PowerQueryModel, FileProviderMixin, TimeStampMixin, models.Model):
     @cached_property
     def extra(self) -> "dict[str, int|str]":
         return self.info.get("extra", {}) or {}
+
+    @property
+    def is_columnar(self) -> bool:
+        return self.format == FORMAT_COLUMNAR
+
+    @property
+    def data(self) -> "Any":
+        if self.file and self.is_columnar:
+            with self.open_columnar() as reader:
+                return reader.to_dicts()
+        return super().data
+
+    @contextlib.contextmanager
+    def open_columnar(self) -> "Iterator[ColumnarReader]":
+        with self.file.open("rb") as f, ColumnarReader(f) as reader:
+            yield reader
+
+    @cached_property
+    def headers(self) -> "list[str]":
+        if not self.file:
+            return []
+        if self.is_columnar:
+            with self.open_columnar() as reader:
+                return reader.headers
+        headers, __ = iter_tabular(self.data)
+        return headers
+
+    @cached_property
+    def row_count(self) -> int:
+        if not self.file:
+            return 0
+        if self.is_columnar:
+            with self.open_columnar() as reader:
+                return len(reader)
+        __, rows = iter_tabular(self.data)
+        return sum(1 for __ in rows)
+
+    def read(
+        self, columns: "Sequence[str]|None" = None, start: int = 0, stop: "int|None" = None
+    ) -> "Iterator[dict[str, Any]]":
+        """Yield rows as dictionaries, loading only the requested columns and rows when the format allows it."""
+        if not self.file:
+            return
+        if self.is_columnar:
+            with self.open_columnar() as reader:
+                yield from reader.iter_dicts(columns, start, stop)
+        else:
+            headers, rows = iter_tabular(self.data)
+            columns = list(columns or headers)
+            indexes = [headers.index(c) for c in columns]
+            for row in islice(rows, start, stop):
+                yield {c: row[i] for c, i in zip(columns, indexes, strict=True)}
+
+
+class DatasetRows:
+    """
+    Lazy, sliceable sequence of the rows of a Dataset, usable with Django/DRF paginators.
+
+    Only the accessed slices of a columnar dataset are read from storage, so a page costs the size
+    of the page. Pickled datasets are loaded once. Filtering needs a scan of the involved columns
+    and ordering loads them in memory.
+    Raise ValueError if the dataset is not tabular and KeyError on unknown columns.
+    """
+
+    def __init__(
+        self,
+        dataset: Dataset,
+        columns: "Sequence[str]|None" = None,
+        filters: "Sequence[tuple[str, str]]|None" = None,
+        ordering: "Sequence[str]|None" = None,
+    ) -> None:
+        self.dataset = dataset
+        self._rows: "list[Sequence[Any]]|None" = None
+        if dataset.is_columnar:
+            headers = dataset.headers
+        else:
+            data = dataset.data
+            if hasattr(data, "dict") and not is_tabular(data):
+                data = data.dict
+            headers, rows = iter_tabular(data)
+            self._rows = list(rows)
+        self.headers = headers
+        self.columns = list(columns or headers)
+        self.filters = list(filters or [])
+        self.ordering = list(ordering or [])
+        requested = [*self.columns, *(name for name, __ in self.filters), *(o.lstrip("-") for o in self.ordering)]
+        if unknown := sorted({name for name in requested if name not in headers}):
+            raise KeyError(", ".join(unknown))
+        self._needed = list(dict.fromkeys(requested))
+
+    def _read(self, columns: "Sequence[str]", start: int = 0, stop: "int|None" = None) -> "Iterator[dict[str, Any]]":
+        if self._rows is None:
+            return self.dataset.read(columns, start, stop)
+        indexes = [self.headers.index(c) for c in columns]
+        return ({c: row[i] for c, i in zip(columns, indexes, strict=True)} for row in islice(self._rows, start, stop))
+
+    def _matches(self, row: "dict[str, Any]") -> bool:
+        return all(str(row[name]) == value for name, value in self.filters)
+
+    def _project(self, rows: "Iterable[dict[str, Any]]") -> "Iterator[dict[str, Any]]":
+        for row in rows:
+            yield {name: row[name] for name in self.columns}
+
+    def _scan(self) -> "Iterator[dict[str, Any]]":
+        return (row for row in self._read(self._needed) if self._matches(row))
+
+    @cached_property
+    def _ordered(self) -> "list[dict[str, Any]]":
+        rows = list(self._scan())
+        for order in reversed(self.ordering):
+            name = order.lstrip("-")
+            rows.sort(key=lambda row: (row[name] is not None, row[name]), reverse=order.startswith("-"))
+        return list(self._project(rows))
+
+    @cached_property
+    def _count(self) -> int:
+        if self.ordering:
+            return len(self._ordered)
+        if self.filters:
+            return sum(1 for __ in self._scan())
+        if self._rows is not None:
+            return len(self._rows)
+        return self.dataset.row_count
+
+    def count(self) -> int:
+        return self._count
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self) -> "Iterator[dict[str, Any]]":
+        if self.ordering:
+            return iter(self._ordered)
+        if self.filters:
+            return self._project(self._scan())
+        return self._read(self.columns)
+
+    def __getitem__(self, item: slice) -> "list[dict[str, Any]]":
+        if not isinstance(item, slice) or (item.step or 1) != 1:
+            raise TypeError("DatasetRows only supports contiguous slices")
+        if self.ordering:
+            return self._ordered[item]
+        if self.filters:
+            return list(islice(self._project(self._scan()), item.start, item.stop))
+        return list(self._read(self.columns, item.start or 0, item.stop))
@@ -0,0 +1,114 @@
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
+from django.db import models
+
+from ...core.models import CountryOffice
+from ._base import PowerQueryModel
+from .report import ReportConfiguration
+from .report_document import ReportDocument
+
+if TYPE_CHECKING:
+    from typing import Any
+
+
+class ReportDocumentIndex(PowerQueryModel, models.Model):
+    """
+    Denormalised listing of the documents of each (report, dataset) pair.
+
+    Rows are maintained by the signal handlers in `power_query.handlers` so that the office
+    document list is a single indexed query, without joins on reports, tags and formatters.
+    `dataset_ref` is not a foreign key: documents survive the deletion of their dataset.
+    """
+
+    country_office = models.ForeignKey(CountryOffice, on_delete=models.CASCADE, related_name="+")
+    report = models.ForeignKey(ReportConfiguration, on_delete=models.CASCADE, related_name="+")
+    dataset_ref = models.IntegerField(blank=True, null=True)
+    document = models.ForeignKey(ReportDocument, on_delete=models.CASCADE, related_name="+")
+
+    title = models.CharField(max_length=300)
+    report_name = models.CharField(max_length=255, blank=True, default="")
+    owner = models.CharField(max_length=255, blank=True, default="")
+    active = models.BooleanField(default=True)
+    visible = models.BooleanField(default=True)
+    tags = ArrayField(models.CharField(max_length=100), default=list, blank=True)
+    formats = models.JSONField(default=list, blank=True)
+    size = models.BigIntegerField(default=0)
+    updated_on = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        unique_together = ("report", "dataset_ref")
+        indexes = [
+            models.Index(fields=["country_office", "-updated_on"], name="pq_docindex_office_updated"),
+            models.Index(fields=["country_office", "report_name"], name="pq_docindex_office_report"),
+            GinIndex(fields=["tags"], name="pq_docindex_tags"),
+        ]
+
+    class Tenant:
+        tenant_filter_field = "country_office"
+
+    def __str__(self) -> str:
+        return self.title
+
+    @staticmethod
+    def report_values(report: ReportConfiguration) -> "dict[str, Any]":
+        return {
+            "country_office_id": report.country_office_id,
+            "report_name": report.name or "",
+            "owner": str(report.owner) if report.owner_id else "",
+            "active": report.active,
+            "visible": report.visible,
+            "tags": sorted(report.tags.names()),
+        }
+
+    @classmethod
+    def refresh(cls, report_id: int, dataset_id: "int|None") -> None:
+        """Rebuild the entry of the documents of `report_id` produced from `dataset_id`."""
+        docs = list(
+            ReportDocument._all.filter(report_id=report_id, dataset_id=dataset_id)
+            .select_related("formatter")
+            .order_by("pk")
+        )
+        if not docs:
+            cls._all.filter(report_id=report_id, dataset_ref=dataset_id).delete()
+            return
+        report = ReportConfiguration._all.select_related("owner").filter(pk=report_id).first()
+        if report is None or report.country_office_id is None:
+            return
+        formats = [
+            {
+                "pk": doc.pk,
+                "suffix": doc.formatter.file_suffix if doc.formatter else Path(doc.file.name).suffix,
+                "size": doc.info.get("size", 0),
+            }
+            for doc in docs
+        ]
+        cls._all.update_or_create(
+            report_id=report_id,
+            dataset_ref=dataset_id,
+            defaults={
+                "document": docs[0],
+                "title": docs[0].title,
+                "formats": formats,
+                "size": sum(f["size"] or 0 for f in formats),
+                "updated_on": max(doc.updated_on for doc in docs),
+                **cls.report_values(report),
+            },
+        )
+
+    @classmethod
+    def refresh_report(cls, report: ReportConfiguration) -> None:
+        """Propagate name, owner, flags and tags of `report` to its entries."""
+        if report.country_office_id is None:
+            return
+        cls._all.filter(report=report).update(**cls.report_values(report))
+
+    @classmethod
+    def rebuild(cls) -> int:
+        cls._all.all().delete()
+        pairs = ReportDocument._all.values_list("report_id", "dataset_id").distinct().order_by()
+        for report_id, dataset_id in pairs:
+            cls.refresh(report_id, dataset_id)
+        return cls._all.count()
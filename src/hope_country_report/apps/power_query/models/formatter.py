@@ -1,4 +1,5 @@
 import logging
+from io import BytesIO
 from itertools import islice
 from typing import TYPE_CHECKING
 
@@ -8,12 +9,13 @@ from strategy_field.fields import StrategyField
 from strategy_field.utils import fqn
 from ...core.models import CountryOffice
 from ..processors import TYPE_DETAIL, TYPE_LIST, TYPES, ToHTML, mimetype_map, registry
+from ..utils import dict_hash
 from ._base import MIMETYPES
 from .report_template import ReportTemplate
 
 if TYPE_CHECKING:
     from collections.abc import Iterable
-    from typing import Any
+    from typing import IO, Any
 
 logger = logging.getLogger(__name__)
 
@@ -52,29 +54,48 @@ class Formatter(models.Model):
     def content_type(self):
         return mimetype_map[self.file_suffix]
 
+    @property
+    def fingerprint(self) -> str:
+        """Hash of everything that affects the rendered output."""
+        return dict_hash(
+            {
+                "processor": fqn(self.processor),
+                "code": self.code,
+                "template": [self.template.doc.name, self.template.content_hash] if self.template else None,
+                "file_suffix": self.file_suffix,
+                "type": self.type,
+                "compress": self.compress,
+                "item_per_page": self.item_per_page,
+            }
+        )
+
     def clean(self) -> None:
         if self.code and self.template:
             raise ValidationError("You cannot set both 'template' and 'code'")
         self.processor.validate()
 
     def render(self, context: "dict[str, Any]") -> bytearray:
-        ret = bytearray()
+        buffer = BytesIO()
+        self.render_to(context, buffer)
+        return bytearray(buffer.getbuffer())
+
+    def render_to(self, context: "dict[str, Any]", sink: "IO[bytes]") -> None:
+        """Render `context` writing the output to `sink` as the processor produces it."""
         if self.type == TYPE_LIST:
-            ret.extend(self.processor.process(context))
+            self.processor.write(context, sink)
         elif self.type == TYPE_DETAIL:
             ds = context.pop("dataset")
             if self.item_per_page > 1:
                 for dataset in batched(ds.data, self.item_per_page):
                     context["records"] = dataset
-                    ret.extend(self.processor.process(context))
+                    self.processor.write(context, sink)
             else:
                 for page, entry in enumerate(ds.data, 1):
                     context["page"] = page
                     context["record"] = entry
-                    ret.extend(self.processor.process(context))
+                    self.processor.write(context, sink)
         else:
             raise ValueError("Invalid type")
-        return ret
 
     def save(
         self,
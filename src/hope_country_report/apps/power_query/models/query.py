@@ -1,44 +1,62 @@
+import copy
 import hashlib
 import logging
+import pickle
 import tempfile
 import types
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from functools import partial
 from typing import TYPE_CHECKING, Iterable
 
+from constance import config
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.contenttypes.models import ContentType
-from django.core.files.base import ContentFile
+from django.core.files.base import ContentFile, File
+from django.db import connections as db_connections
 from django.db import models
-from django.db.models import JSONField, Q
+from django.db.models import JSONField, Max, Q, QuerySet
 from django.utils import timezone
 from django_celery_boost.models import CeleryTaskModel
 from sentry_sdk import capture_exception, configure_scope
 
 from hope_country_report.apps.core.models import CountryOffice
 from hope_country_report.state import state
-from hope_country_report.utils.perf import profile
-
+from hope_country_report.utils.perf import profile, span
+
+from ..columnar import (
+    FORMAT_COLUMNAR,
+    FORMAT_PICKLE,
+    FORMATS,
+    is_tabular,
+    iter_tabular,
+    merge_columnar,
+    queryset_fields,
+    write_columnar,
+)
 from ..exceptions import QueryRunCanceled, QueryRunTerminated
 from ..json import PQJSONEncoder
-from ..utils import dict_hash, to_dataset
-from ._base import AdminReversable, PowerQueryCeleryFields, PowerQueryModel
+from ..plan import explain
+from ..utils import dict_hash, file_hash, to_dataset
+from ..routing import route_query
+from ._base import AdminReversable, PowerQueryCeleryFields, PowerQueryModel, RoutedTaskMixin
 from .arguments import Parametrizer
 
 if TYPE_CHECKING:
+    from collections.abc import Iterator
     from typing import Any
 
-    from django.db.models import QuerySet
-
     from hope_country_report.types.django import AnyModel
     from hope_country_report.types.pq import QueryMatrixResult
 
     from ..celery_tasks import PowerQueryTask
+    from ..routing import Route
     from .dataset import Dataset
 
 logger = logging.getLogger(__name__)
 
 
-class Query(CeleryTaskModel, PowerQueryCeleryFields, PowerQueryModel, AdminReversable, models.Model):
+class Query(RoutedTaskMixin, CeleryTaskModel, PowerQueryCeleryFields, PowerQueryModel, AdminReversable, models.Model):
     country_office = models.ForeignKey(CountryOffice, on_delete=models.CASCADE, blank=True, null=True)
 
     datasets: "QuerySet[Dataset]"
@@ -51,9 +69,36 @@ class Query(CeleryTaskModel, PowerQueryCeleryFields, PowerQueryModel, AdminRever
     info = JSONField(default=dict, blank=True, encoder=PQJSONEncoder)
     parametrizer = models.ForeignKey(Parametrizer, on_delete=models.CASCADE, blank=True, null=True)
     active = models.BooleanField(default=True)
+    dataset_format = models.CharField(
+        max_length=20,
+        choices=FORMATS,
+        default=FORMAT_PICKLE,
+        help_text="Storage format of the datasets. Non tabular results are always pickled",
+    )
+    matrix_workers = models.PositiveSmallIntegerField(
+        default=1,
+        help_text="Number of argument-matrix cells executed concurrently (capped by PQ_MATRIX_MAX_WORKERS). "
+        "1 runs them serially",
+    )
+    incremental = models.BooleanField(
+        default=False,
+        help_text="Only fetch rows changed since the previous run and merge them into the stored dataset by "
+        "primary key. Requires columnar format and a QuerySet result including the primary key",
+    )
+    incremental_field = models.CharField(
+        max_length=100,
+        default="updated_at",
+        help_text="Field used as high-water mark by incremental refresh",
+    )
+    estimated_rows = models.BigIntegerField(null=True, blank=True, editable=False)
+    estimated_cost = models.FloatField(null=True, blank=True, editable=False)
+    plan = JSONField(default=dict, blank=True, editable=False, encoder=PQJSONEncoder)
 
     celery_task_name = "hope_country_report.apps.power_query.celery_tasks.run_background_query"
 
+    def get_route(self, interactive: bool = False) -> "Route":
+        return route_query(self, interactive)
+
     @property
     def effective_status(self) -> str:
         if self.error_message:
@@ -101,6 +146,17 @@ class Query(CeleryTaskModel, PowerQueryCeleryFields, PowerQueryModel, AdminRever
         query = Query.objects.get(id=query_id)
         return query.run(persist=False, arguments=arguments, use_existing=True)
 
+    def save_debug_info(self) -> None:
+        """Store `info` of a failed run without bumping the version.
+
+        Matrix cells run concurrently on copies of the same row: a versioned save of a cell
+        would make the other cells and the final `update_results()` fail with RecordModifiedError.
+        """
+        if self.pk:
+            Query._all.filter(pk=self.pk).update(info=self.info)
+        else:
+            self.save()
+
     def update_results(self, results: "QueryMatrixResult") -> None:
         self.info["last_run_results"] = results
         self.error_message = results.get("error_message", "")
@@ -118,14 +174,12 @@ class Query(CeleryTaskModel, PowerQueryCeleryFields, PowerQueryModel, AdminRever
         with configure_scope() as scope:
             scope.set_tag("power_query", True)
             scope.set_tag("power_query.name", self.name)
-            for a in args:
-                try:
-                    dataset, info = self.run(persist, a, running_task=running_task)
-                    results[str(a)] = dataset.pk
-                except (QueryRunCanceled, QueryRunTerminated):
-                    raise
-                except Exception as e:
-                    logger.exception(e)
+            for a, outcome in self._iter_matrix(args, persist, running_task):
+                if not isinstance(outcome, Exception):
+                    results[str(a)] = outcome
+                else:
+                    e = outcome
+                    logger.exception(e, exc_info=e)
                     err = capture_exception(e)
                     results[f"error_{str(a)}"] = str(e)
                     results[f"sentry_{str(a)}"] = str(err)
@@ -138,6 +192,71 @@ class Query(CeleryTaskModel, PowerQueryCeleryFields, PowerQueryModel, AdminRever
             self.datasets.exclude(pk__in=[dpk for dpk in results.values() if isinstance(dpk, int)]).delete()
         return results
 
+    def _iter_matrix(
+        self, args: "list[dict[str, Any]]", persist: bool, running_task: "PowerQueryTask|None"
+    ) -> "Iterator[tuple[dict[str, Any], int|Exception]]":
+        """Run each matrix cell and yield `(arguments, dataset pk or raised exception)`.
+
+        Cells run in a bounded thread pool when more than one worker is allowed. Abort is
+        checked before every submission; on cancel/terminate pending cells are dropped and
+        the running ones are flagged as aborted and waited for.
+        """
+        workers = self.get_matrix_workers(len(args))
+        if workers <= 1:
+            for a in args:
+                try:
+                    dataset, __ = self.run(persist, a, running_task=running_task)
+                    yield a, dataset.pk
+                except (QueryRunCanceled, QueryRunTerminated):
+                    raise
+                except Exception as e:
+                    yield a, e
+            return
+
+        snapshot = dict(state.__dict__)
+        cells = iter(args)
+        pending: "dict[Future[int], tuple[dict[str, Any], Query]]" = {}
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"pq-{self.pk}")
+        try:
+            while True:
+                while len(pending) < workers and (a := next(cells, None)) is not None:
+                    if running_task and running_task.is_aborted():
+                        raise QueryRunCanceled
+                    cell = copy.copy(self)
+                    pending[executor.submit(cell._run_matrix_cell, persist, a, running_task, snapshot)] = a, cell
+                if not pending:
+                    break
+                done, __ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    a, __ = pending.pop(future)
+                    try:
+                        yield a, future.result()
+                    except (QueryRunCanceled, QueryRunTerminated):
+                        raise
+                    except Exception as e:
+                        yield a, e
+        except BaseException:
+            for __, cell in pending.values():
+                cell.aborted = True
+            # running cells stop at their next abort check: wait for them to release their connections
+            executor.shutdown(wait=True, cancel_futures=True)
+            raise
+        executor.shutdown()
+
+    def _run_matrix_cell(
+        self,
+        persist: bool,
+        arguments: "dict[str, Any]",
+        running_task: "PowerQueryTask|None",
+        snapshot: "dict[str, Any]",
+    ) -> int:
+        try:
+            with state.set(**snapshot):
+                dataset, __ = self.run(persist, arguments, running_task=running_task)
+            return dataset.pk
+        finally:
+            db_connections.close_all()
+
     def run(
         self,
         persist: bool = False,
@@ -149,14 +268,9 @@ class Query(CeleryTaskModel, PowerQueryCeleryFields, PowerQueryModel, AdminRever
     ) -> "tuple[Dataset, dict[str,Any]]":
         from .dataset import Dataset
 
-        model = self.parent.target.model_class() if self.parent else self.target.model_class()
-        connections: "dict[str, QuerySet[AnyModel]]" = {}
         return_value: "tuple[Dataset, dict[str, Any]]"
-        if state.tenant:
-            connections["QueryManager"] = Query.objects.filter(country_office=state.tenant)
-        else:
-            connections["QueryManager"] = Query.objects.filter()
-        debug = []
+        debug: "list[tuple[Any, ...]]" = []
+        stored: "Dataset|None" = None
         try:
             self.aborted = False
 
@@ -164,21 +278,8 @@ class Query(CeleryTaskModel, PowerQueryCeleryFields, PowerQueryModel, AdminRever
                 return self.aborted or running_task.is_aborted()
 
             self.is_aborted = types.MethodType(is_aborted, self)
-            with profile() as perfs:
-                fp = tempfile.TemporaryFile()
-                locals_ = {
-                    "conn": model._default_manager.using(settings.POWER_QUERY_DB_ALIAS),
-                    "self": self,
-                    "args": arguments,
-                    "arguments": arguments,
-                    "to_dataset": to_dataset,
-                    "invoke": self._invoke,
-                    "debug": lambda *a: debug.append((timezone.now().strftime("%H:%M:%S"), *a)),
-                    "task": running_task,
-                    "fp": fp,
-                    **kwargs,
-                    **connections,
-                }
+            with profile() as perfs, span("query.cell", query=self.pk, arguments=arguments):
+                locals_ = self.get_locals(arguments, preview, running_task, debug, **kwargs)
                 signature = dict_hash({"query": self.pk, **(arguments or {})})
                 if not preview and use_existing and (ds := Dataset.objects.filter(query=self, hash=signature).first()):
                     return_value = ds, ds.extra
@@ -186,14 +287,15 @@ class Query(CeleryTaskModel, PowerQueryCeleryFields, PowerQueryModel, AdminRever
                     with state.set(preview=preview, tenant=self.country_office):
                         try:
                             code = self.get_code()
-                            exec(code, globals(), locals_)
+                            with span("query.exec", query=self.pk):
+                                exec(code, globals(), locals_)
                             result = locals_.get("result")
                             extra = locals_.get("extra")
                         except Exception:
                             self.info = {
                                 "debug": debug,
                             }
-                            self.save()
+                            self.save_debug_info()
                             raise
                         info = {
                             "type": type(result).__name__,
@@ -204,27 +306,193 @@ class Query(CeleryTaskModel, PowerQueryCeleryFields, PowerQueryModel, AdminRever
                         }
                         h = hashlib.md5(str(arguments).encode()).hexdigest()
 
+                        # QuerySets are fetched while they are marshalled: DB time is reported in perfs["db"]
+                        with span("query.marshall", query=self.pk):
+                            if persist and self.can_refresh_incrementally(result):
+                                marshalled, info["incremental"] = self.marshall_incremental(
+                                    result, signature, f"{self.pk}_{h}"
+                                )
+                            else:
+                                marshalled = self.marshall_result(result, f"{self.pk}_{h}", persist)
                         defaults = {
-                            "size": len(result) if result else 0,
                             "info": info,
                             "last_run": timezone.now(),
-                            "file": ContentFile(Dataset.marshall(result), name=f"{self.pk}_{h}.pkl"),
+                            "content_hash": file_hash(marshalled["file"]),
+                            **marshalled,
                         }
                         if persist:
-                            dataset, __ = Dataset.objects.update_or_create(
-                                query=self, hash=signature, defaults=defaults
-                            )
+                            with span("storage.write", query=self.pk):
+                                dataset, __ = Dataset.objects.update_or_create(
+                                    query=self, hash=signature, defaults=defaults
+                                )
+                                defaults["file"].close()
+                            stored = dataset
                         else:
                             dataset = Dataset(query=self, hash=signature, **defaults)
 
                         return_value = dataset, extra
+            if stored:
+                # timings are complete only once the profile is closed
+                Dataset.objects.filter(pk=stored.pk).update(info=stored.info)
         except Exception:
             raise
         return return_value
 
+    def get_locals(
+        self,
+        arguments: "dict[str,Any]|None",
+        preview: bool,
+        running_task: "PowerQueryTask|None",
+        debug: "list[tuple[Any, ...]]",
+        **kwargs: "Any",
+    ) -> "dict[str, Any]":
+        """Namespace the query code is executed in."""
+        model = self.parent.target.model_class() if self.parent else self.target.model_class()
+        connections: "dict[str, QuerySet[AnyModel]]" = {}
+        if state.tenant:
+            connections["QueryManager"] = Query.objects.filter(country_office=state.tenant)
+        else:
+            connections["QueryManager"] = Query.objects.filter()
+        return {
+            "conn": model._default_manager.using(settings.POWER_QUERY_DB_ALIAS),
+            "self": self,
+            "args": arguments,
+            "arguments": arguments,
+            "to_dataset": partial(to_dataset, limit=config.PQ_SAMPLE_PAGE_SIZE) if preview else to_dataset,
+            "invoke": self._invoke,
+            "debug": lambda *a: debug.append((timezone.now().strftime("%H:%M:%S"), *a)),
+            "task": running_task,
+            "fp": tempfile.TemporaryFile(),
+            **kwargs,
+            **connections,
+        }
+
+    def update_plan(self, arguments: "dict[str,Any]|None" = None) -> "dict[str, Any]":
+        """Dry run the code and store the planner estimates of its `result` QuerySet.
+
+        The code runs in preview mode with the first cell of the argument matrix; the
+        resulting SQL is explained (FORMAT JSON, not ANALYZE) but never executed.
+        Non-QuerySet results cannot be explained: their estimates are cleared.
+        """
+        if arguments is None:
+            arguments = self.get_args()[0]
+        locals_ = self.get_locals(arguments, True, None, [])
+        try:
+            with state.set(preview=True, tenant=self.country_office):
+                exec(self.get_code(), globals(), locals_)
+        finally:
+            locals_["fp"].close()
+        result = locals_.get("result")
+        if isinstance(result, QuerySet):
+            plan = explain(result)
+        else:
+            plan = {"type": type(result).__name__, "rows": None, "cost": None, "seq_scans": [], "warnings": []}
+        plan["planned_at"] = timezone.now().isoformat()
+        self.estimated_rows = plan["rows"]
+        self.estimated_cost = plan["cost"]
+        self.plan = plan
+        Query.objects.filter(pk=self.pk).update(
+            estimated_rows=self.estimated_rows, estimated_cost=self.estimated_cost, plan=plan
+        )
+        return plan
+
+    def marshall_result(self, result: "Any", name: str, persist: bool) -> "dict[str, Any]":
+        """Serialise `result` in the dataset format of the Query.
+
+        Columnar datasets stream QuerySets through a server-side cursor. Pickled QuerySets are
+        loaded in full (they unpickle to a QuerySet holding its rows): only the pickle itself is
+        written to a temporary file instead of memory. Use the columnar format for large results.
+        """
+        if self.get_dataset_format() == FORMAT_COLUMNAR and is_tabular(result):
+            fp = tempfile.TemporaryFile()
+            size = write_columnar(fp, result)
+            suffix, fmt = "zip", FORMAT_COLUMNAR
+        else:
+            fp = tempfile.TemporaryFile()
+            pickle.dump(result, fp)
+            size = len(result) if result else 0
+            suffix, fmt = "pkl", FORMAT_PICKLE
+        fp.seek(0)
+        if persist:
+            content = File(fp, name=f"{name}.{suffix}")
+        else:
+            content = ContentFile(fp.read(), name=f"{name}.{suffix}")
+            fp.close()
+        return {"format": fmt, "size": size, "file": content}
+
+    def can_refresh_incrementally(self, result: "Any") -> bool:
+        return (
+            bool(self.get_incremental_field())
+            and self.get_dataset_format() == FORMAT_COLUMNAR
+            and isinstance(result, QuerySet)
+            and not result.query.is_sliced
+            # union/intersection/difference querysets cannot be filtered by primary key
+            and not result.query.combinator
+        )
+
+    def marshall_incremental(
+        self, result: "QuerySet[AnyModel]", signature: str, name: str
+    ) -> "tuple[dict[str, Any], dict[str, Any]]":
+        """Merge the rows changed since the previous run into the stored columnar dataset.
+
+        Only the changed rows selected by `result` are merged: changes elsewhere in the table do
+        not touch the dataset. Falls back to a full refresh when there is no usable previous
+        high-water mark, the shape of the result changed or the merged dataset has not as many
+        rows as `result` (rows deleted or no longer selected by the query).
+        The ordering of the query is not kept: the changed rows are appended after the unchanged ones.
+        """
+        from .dataset import Dataset
+
+        field = self.get_incremental_field()
+        key = result.model._meta.pk.name
+        headers = queryset_fields(result)
+        table = result.model._default_manager.using(settings.POWER_QUERY_DB_ALIAS)
+        previous = Dataset.objects.filter(query=self, hash=signature, format=FORMAT_COLUMNAR).first()
+        last = previous.info.get("incremental", {}) if previous else {}
+        last_mark = last.get("high_water_mark")
+
+        marshalled = None
+        if last_mark is not None and last.get("field") == field and key in headers and previous.headers == headers:
+            changed_qs = table.filter(**{f"{field}__gt": last_mark})
+            mark = changed_qs.aggregate(mark=Max(field))["mark"] or last_mark
+            changed = set(
+                changed_qs.filter(**{f"{key}__in": result.values(key)})
+                .values_list(key, flat=True)
+                .iterator(chunk_size=settings.POWER_QUERY_CURSOR_CHUNK_SIZE)
+            )
+            fp = tempfile.TemporaryFile()
+            with previous.open_columnar() as reader:
+                # the rows replaced must be the ones removed: a row changing now is merged next time
+                __, rows = iter_tabular(result.filter(pk__in=changed))
+                size = merge_columnar(fp, reader, rows, key, changed)
+            if size == result.count():
+                fp.seek(0)
+                info = {"field": field, "high_water_mark": mark, "mode": "delta", "changed": len(changed)}
+                marshalled = {"format": FORMAT_COLUMNAR, "size": size, "file": File(fp, name=f"{name}.zip")}
+            else:
+                fp.close()
+        if marshalled is None:
+            mark = table.aggregate(mark=Max(field))["mark"]
+            info = {"field": field, "high_water_mark": mark, "mode": "full"}
+            marshalled = self.marshall_result(result, name, True)
+        if hasattr(info["high_water_mark"], "isoformat"):
+            info["high_water_mark"] = info["high_water_mark"].isoformat()
+        return marshalled, info
+
     def get_code(self):
         return self.parent.code if self.parent else self.code
 
+    def get_dataset_format(self) -> str:
+        return self.parent.dataset_format if self.parent else self.dataset_format
+
+    def get_incremental_field(self) -> "str|None":
+        query = self.parent or self
+        return query.incremental_field if query.incremental else None
+
+    def get_matrix_workers(self, cells: int) -> int:
+        workers = self.parent.matrix_workers if self.parent else self.matrix_workers
+        return max(1, min(workers, config.PQ_MATRIX_MAX_WORKERS, cells))
+
     def get_args(self):
         args = [{}]
         if self.parametrizer:
@@ -1,8 +1,11 @@
+import contextlib
 import logging
+import uuid
 from typing import TYPE_CHECKING
 
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
+from django.core.validators import MaxValueValidator
 from django.db import models
 from django.urls import reverse
 from django.utils import timezone
@@ -15,7 +18,15 @@ from taggit.managers import TaggableManager
 from ....utils.mail import notify_report_completion, send_document_password
 from ...core.models import CountryOffice
 from ..json import PQJSONEncoder
-from ._base import AdminReversable, ManageableObject, PowerQueryCeleryFields, PowerQueryModel, TimeStampMixin
+from ..routing import route_report
+from ._base import (
+    AdminReversable,
+    ManageableObject,
+    PowerQueryCeleryFields,
+    PowerQueryModel,
+    RoutedTaskMixin,
+    TimeStampMixin,
+)
 from .formatter import Formatter
 from .query import Query
 
@@ -23,12 +34,26 @@ if TYPE_CHECKING:
     from typing import Any
 
     from ....types.pq import ReportResult
-    from .dataset import Dataset
+    from ..celery_tasks import PowerQueryTask
+    from ..routing import Route
 
 logger = logging.getLogger(__name__)
 
 
+COMPRESSION_STORED = "stored"
+COMPRESSION_DEFLATED = "deflated"
+COMPRESSION_BZIP2 = "bzip2"
+COMPRESSION_LZMA = "lzma"
+COMPRESSIONS = (
+    (COMPRESSION_STORED, "Stored (no compression)"),
+    (COMPRESSION_DEFLATED, "Deflated"),
+    (COMPRESSION_BZIP2, "BZIP2"),
+    (COMPRESSION_LZMA, "LZMA"),
+)
+
+
 class ReportConfiguration(
+    RoutedTaskMixin,
     CeleryTaskModel,
     PowerQueryCeleryFields,
     PowerQueryModel,
@@ -73,6 +98,18 @@ class ReportConfiguration(
     )
 
     compress = models.BooleanField(default=False, blank=True, help_text=_("Compress reports with Zip"))
+    compression = models.CharField(
+        max_length=10,
+        choices=COMPRESSIONS,
+        default=COMPRESSION_DEFLATED,
+        help_text=_("Zip compression method"),
+    )
+    compression_level = models.PositiveSmallIntegerField(
+        null=True,
+        blank=True,
+        validators=[MaxValueValidator(9)],
+        help_text=_("Zip compression level (0-9). Leave empty to use the default of the method"),
+    )
     protect = models.BooleanField(
         default=False, blank=True, help_text=_("Protect zip file with system generated password")
     )
@@ -87,6 +124,9 @@ class ReportConfiguration(
     tags = TaggableManager(blank=True)
     celery_task_name = "hope_country_report.apps.power_query.celery_tasks.refresh_report"
 
+    def get_route(self, interactive: bool = False) -> "Route":
+        return route_report(self, run_query=True, interactive=interactive)
+
     @property
     def effective_status(self) -> str:
         if self.error_message:
@@ -124,6 +164,8 @@ class ReportConfiguration(
                 for field in [
                     "active",
                     "compress",
+                    "compression",
+                    "compression_level",
                     "description",
                     "context",
                     "owner",
@@ -145,19 +187,34 @@ class ReportConfiguration(
     def clean(self) -> None:
         if self.protect and not self.owner:
             raise ValidationError("Cannot protect document without owner")
+        if self.compression == COMPRESSION_BZIP2 and self.compression_level == 0:
+            raise ValidationError({"compression_level": _("BZIP2 compression level must be between 1 and 9")})
+
+    def execute(
+        self, run_query: bool = False, notify: bool = True, running_task: "PowerQueryTask|None" = None
+    ) -> "ReportResult":
+        """
+        Render a document for each dataset of the query and formatter.
 
-    def execute(self, run_query: bool = False, notify: bool = True) -> "ReportResult":
+        Documents are rendered as checkpointed units (see `ReportRunUnit`): if the previous run
+        has been interrupted (ie. the worker died) it is resumed, without running the query again,
+        and only the missing or failed documents are rendered. A run still being processed by
+        another worker is not resumed.
+        """
         import secrets
         import string
 
-        from .report_document import ReportDocument
+        from .report_run import ReportRunUnit
 
         alphabet = string.ascii_letters + string.digits + string.punctuation
         query: Query = self.query
-        dataset: "Dataset"
         result: "ReportResult" = []
-        if run_query:
-            query_result = query.execute_matrix()
+        owner = running_task.request.id if running_task and running_task.request.id else uuid.uuid4().hex
+        resume = ReportRunUnit.is_interrupted(self, owner)
+        if run_query and not resume:
+            # the concurrency slot of the query is held while it runs, not while documents are rendered
+            with running_task.throttled(query) if running_task else contextlib.nullcontext():
+                query_result = query.execute_matrix()
             if "error_message" in query_result:
                 return [(BaseException("Query Error"), query_result["error_message"])]
         if not self.formatters.exists():
@@ -165,14 +222,13 @@ class ReportConfiguration(
         elif not query.datasets.exists():
             result = [(None, _("No Dataset available"))]
         else:
-            if self.protect:
+            # documents already rendered by an interrupted run are protected with its password
+            if self.protect and not (resume and self.pwd):
                 self.pwd = "".join(secrets.choice(alphabet) for i in range(12))
                 self.save(update_fields=["pwd"])
             self.refresh_from_db()
-            for dataset in query.datasets.all():
-                for formatter in self.formatters.all():
-                    res = ReportDocument.process(self, dataset, formatter, notify=notify)
-                    result.append(res)
+            ReportRunUnit.plan(self, resume=resume)
+            result = self.process_units(owner)
             self.last_run = timezone.now()
             self.save()
         if notify and self.documents.exists():
@@ -184,6 +240,33 @@ class ReportConfiguration(
                 notify_report_completion(fresh_self)
         return result
 
+    def process_units(self, owner: str) -> "ReportResult":
+        """Render the open units of the current run that can be claimed by `owner`.
+
+        Units are not fanned out: they are all processed by the worker running the report, claims
+        only prevent a resumed run from rendering the units of a run still alive. Notifications
+        are sent by `execute()` once all the units are processed.
+        """
+        from ..persistence import DocumentWriter
+        from .report_run import ReportRunUnit
+
+        units = (
+            ReportRunUnit._all.filter(report=self, status__in=ReportRunUnit.OPEN_STATUSES)
+            .select_related("dataset", "formatter")
+            .order_by("pk")
+        )
+        writer = DocumentWriter(self)
+        for unit in units:
+            if unit.claim(owner):
+                writer.add(unit.dataset, unit.formatter, unit)
+        return [res for __, res in writer.close()]
+
+    @property
+    def progress(self) -> "dict[str, int]":
+        from .report_run import ReportRunUnit
+
+        return ReportRunUnit.progress(self)
+
     def __str__(self) -> str:
         return self.name or ""
 
@@ -196,6 +279,9 @@ class ReportConfiguration(
     def get_run_url(self):
         return reverse("office-config-run", args=[self.country_office.slug, self.pk])
 
+    def get_bundle_url(self) -> str:
+        return reverse("office-config-bundle", args=[self.country_office.slug, self.pk])
+
     def get_documents_url(self) -> str:
         base = reverse("office-doc-list", args=[self.country_office.slug])
         return f"{base}?report={self.name}"
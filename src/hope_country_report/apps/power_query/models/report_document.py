@@ -1,36 +1,52 @@
 import logging
-from io import BytesIO
+import os
+import shutil
+import zipfile
 from pathlib import Path
-from tempfile import TemporaryDirectory
+from tempfile import SpooledTemporaryFile
 from typing import TYPE_CHECKING
 
 import pyzipper
-from django.core.files.base import ContentFile
+from django.conf import settings
+from django.core.files.base import File
 from django.db import models
 from django.urls import reverse
 from django.utils import timezone, translation
 from django.utils.functional import cached_property
 from pathvalidate import sanitize_filename
-from sentry_sdk import capture_exception
 
 from ....state import state
-from ....utils.os import pushd
-from ....utils.perf import profile
+from ....utils.perf import profile, span
 from ..json import PQJSONEncoder
 from ..processors import mimetype_map
+from ..utils import dict_hash, file_hash
 from ._base import FileProviderMixin, PowerQueryModel, TimeStampMixin
 from .dataset import Dataset
 from .formatter import Formatter
-from .report import ReportConfiguration
+from .report import (
+    COMPRESSION_BZIP2,
+    COMPRESSION_DEFLATED,
+    COMPRESSION_LZMA,
+    COMPRESSION_STORED,
+    ReportConfiguration,
+)
 
 if TYPE_CHECKING:
-    from typing import Tuple
+    from typing import IO, Tuple
 
     from ...core.models import CountryOffice
 
 
 logger = logging.getLogger(__name__)
 
+ZIP_CODECS = {
+    COMPRESSION_STORED: pyzipper.ZIP_STORED,
+    COMPRESSION_DEFLATED: pyzipper.ZIP_DEFLATED,
+    COMPRESSION_BZIP2: pyzipper.ZIP_BZIP2,
+    COMPRESSION_LZMA: pyzipper.ZIP_LZMA,
+}
+ZIP_CHUNK_SIZE = 1024 * 1024
+
 
 # @cleanup.select
 class ReportDocument(PowerQueryModel, FileProviderMixin, TimeStampMixin, models.Model):
@@ -42,6 +58,7 @@ class ReportDocument(PowerQueryModel, FileProviderMixin, TimeStampMixin, models.
     arguments = models.JSONField(default=dict, encoder=PQJSONEncoder)
     # limit_access_to = models.ManyToManyField(get_user_model(), blank=True, related_name="+")
     info = models.JSONField(default=dict, blank=True, null=False)
+    content_hash = models.CharField(max_length=64, blank=True, default="", editable=False)
 
     class Meta:
         unique_together = ("report", "dataset", "formatter")
@@ -65,89 +82,137 @@ class ReportDocument(PowerQueryModel, FileProviderMixin, TimeStampMixin, models.
     def process(
         cls, report: "ReportConfiguration", dataset: "Dataset", formatter: "Formatter", notify: bool = True
     ) -> "Tuple[int|None, Exception|str]":  # noqa
+        """Render and store a single document. See `DocumentWriter` to process documents in batches."""
+        from ..persistence import DocumentWriter
+
+        writer = DocumentWriter(report)
+        writer.add(dataset, formatter)
+        return writer.close()[0][1]
+
+    @classmethod
+    def render(
+        cls, report: "ReportConfiguration", dataset: "Dataset", formatter: "Formatter", doc: "ReportDocument|None"
+    ) -> "tuple[ReportDocument, File|None]|None":
+        """
+        Render the document of `dataset` with `formatter` and update (or create) `doc` without saving it.
+
+        Return None if `doc` is up to date, otherwise the document and the content to upload,
+        None if the stored file has the same content. Nothing is written to the database or the storage.
+        """
+        args_desc = "_".join([str(value) for value in dataset.arguments.values()])
+        context = {
+            **dataset.arguments,
+            **dataset.extra,
+            **report.context,
+        }
         try:
-            args_desc = "_".join([str(value) for value in dataset.arguments.values()])
-            context = {
-                **dataset.arguments,
-                **dataset.extra,
-                **report.context,
+            title = f"{report.title.format(**context)}{args_desc}".title()
+        except KeyError:
+            title = report.title
+        source = dict_hash(
+            {
+                "dataset": dataset.content_hash,
+                "formatter": formatter.fingerprint,
+                "title": title,
+                "context": context,
+                "timezone": str(report.country_office.timezone),
+                "locale": report.country_office.locale,
             }
-            try:
-                title = f"{report.title.format(**context)}{args_desc}".title()
-            except KeyError:
-                title = report.title
-            key = {"report": report, "dataset": dataset, "formatter": formatter}
-            try:
-                with timezone.override(report.country_office.timezone):
-                    with translation.override(report.country_office.locale):
-                        with state.set(tenant=report.country_office):
-                            with profile() as perfs:
-                                output = formatter.render(
-                                    {
-                                        "dataset": dataset,
-                                        "report": report,
-                                        "title": title,
-                                        "context": context,
-                                    }
-                                )
-                filename = f"r{report.pk}_ds{dataset.pk}_fmt{formatter.pk}{formatter.file_suffix}"
-                values = {
-                    "title": title,
-                    "info": {"perf": perfs},
-                    "arguments": dataset.arguments,
+        )
+        packaging = {
+            "compress": report.compress,
+            "protect": report.protect,
+            "pwd": report.pwd,
+            "file_suffix": formatter.file_suffix,
+        }
+        if report.compress and (report.compression != COMPRESSION_DEFLATED or report.compression_level is not None):
+            packaging["compression"] = [report.compression, report.compression_level]
+        package = dict_hash(packaging)
+        if (
+            doc
+            and doc.file
+            and dataset.content_hash
+            and doc.info.get("source") == source
+            and doc.info.get("package") == package
+        ):
+            return None
+        output = SpooledTemporaryFile(max_size=settings.POWER_QUERY_SPOOL_MAX_SIZE)
+        content: "File|None" = None
+        try:
+            with timezone.override(report.country_office.timezone):
+                with translation.override(report.country_office.locale):
+                    with state.set(tenant=report.country_office):
+                        with profile() as perfs, span("report.render", formatter=formatter.pk):
+                            formatter.render_to(
+                                {
+                                    "dataset": dataset,
+                                    "report": report,
+                                    "title": title,
+                                    "context": context,
+                                },
+                                output,
+                            )
+            filename = f"r{report.pk}_ds{dataset.pk}_fmt{formatter.pk}{formatter.file_suffix}"
+            values = {
+                "title": title,
+                "info": {"perf": perfs, "source": source, "package": package},
+                "arguments": dataset.arguments,
+                "content_hash": file_hash(File(output)),
+            }
+            if report.compress:
+                values["info"]["zip"] = {
+                    "content_type": formatter.content_type,
+                    "file_suffix": formatter.file_suffix,
                 }
-                if report.compress:
-                    values["info"]["zip"] = {
-                        "content_type": formatter.content_type,
-                        "file_suffix": formatter.file_suffix,
-                    }
-                    if report.protect:
-                        with TemporaryDirectory(prefix="___") as tdir, pushd(tdir):
-                            source_file = Path(filename)
-                            source_file.write_bytes(output)
-
-                            destination_file = Path(f"{source_file}.zip")
-                            password = report.pwd
-
-                            with pyzipper.AESZipFile(
-                                destination_file,
-                                "w",
-                                compression=pyzipper.ZIP_DEFLATED,
-                                encryption=pyzipper.WZ_AES,
-                            ) as zf:
-                                zf.setpassword(password.encode("utf-8"))
-                                zf.writestr(filename, output)
-
-                            content = ContentFile(destination_file.read_bytes(), destination_file.name)
-                    else:
-                        mf = BytesIO()
-                        with pyzipper.AESZipFile(mf, mode="w", compression=pyzipper.ZIP_DEFLATED) as zf:
-                            zf.writestr(filename, output)
-                        content = ContentFile(mf.getvalue(), name=f"{filename}.zip")
-                else:
-                    content = ContentFile(output, name=filename)
-
-                if doc := ReportDocument.objects.filter(**key).first():
-                    if doc.file:
-                        doc.file.delete()
-                    doc.file = content
-                    for k, v in values.items():
-                        setattr(doc, k, v)
-                    doc.save()
-                else:
-                    doc = ReportDocument.objects.create(**key, file=content, **values)
-                result = doc.pk, doc.file.name
-
-            except Exception as exc:
-                sid = capture_exception(exc)
-                logger.exception(exc)
-                if doc := ReportDocument.objects.filter(**key).first():
-                    doc.delete()
-                result = sid, type(exc)
-        except Exception as exc:
-            logger.exception(exc)
+            if doc and doc.file and doc.content_hash == values["content_hash"] and doc.info.get("package") == package:
+                # same output already stored: no need to zip and upload it again
+                content = None
+                values["info"]["size"] = doc.info.get("size", 0)
+            elif report.compress:
+                with span("report.zip", protect=bool(report.protect)):
+                    content = cls._compress(report, filename, output)
+                values["info"]["size"] = content.size
+            else:
+                content = File(output, name=filename)
+                values["info"]["size"] = content.size
+        finally:
+            # the spooled output is uploaded as is only when not zipped
+            if not (content and content.file is output):
+                output.close()
+        doc = doc or ReportDocument(report=report, dataset=dataset, formatter=formatter)
+        for k, v in values.items():
+            setattr(doc, k, v)
+        return doc, content
+
+    @staticmethod
+    def _compress(report: "ReportConfiguration", filename: str, output: "IO[bytes]") -> File:
+        """
+        Zip `output` chunk by chunk into a spooled file, encrypted with AES if the report is protected.
+
+        The archive stays in memory up to `POWER_QUERY_SPOOL_MAX_SIZE` and is then spooled to disk.
+        Outputs that may exceed the zip limits are written with ZIP64 extensions.
+        """
+        size = output.seek(0, os.SEEK_END)
+        output.seek(0)
+        archive = SpooledTemporaryFile(max_size=settings.POWER_QUERY_SPOOL_MAX_SIZE)
+        try:
+            with pyzipper.AESZipFile(
+                archive,
+                "w",
+                compression=ZIP_CODECS[report.compression],
+                compresslevel=report.compression_level,
+                allowZip64=True,
+            ) as zf:
+                if report.protect:
+                    zf.setpassword(report.pwd.encode("utf-8"))
+                    zf.setencryption(pyzipper.WZ_AES)
+                with zf.open(filename, "w", force_zip64=size * 1.05 > zipfile.ZIP64_LIMIT) as entry:
+                    shutil.copyfileobj(output, entry, ZIP_CHUNK_SIZE)
+        except BaseException:
+            archive.close()
             raise
-        return result
+        archive.seek(0)
+        return File(archive, name=f"{filename}.zip")
 
     @cached_property
     def country_office(self) -> "CountryOffice":
@@ -169,5 +234,16 @@ class ReportDocument(PowerQueryModel, FileProviderMixin, TimeStampMixin, models.
     def content_type(self) -> str:
         return mimetype_map[self.file_suffix]
 
+    @property
+    def etag(self) -> str:
+        """Validator of the stored file: changes whenever its content or its packaging (zip, password) changes."""
+        return dict_hash(
+            {
+                "file": self.file.name,
+                "content": self.content_hash or self.updated_on,
+                "package": self.info.get("package"),
+            }
+        )
+
     def get_absolute_url(self) -> str:
         return reverse("office-doc", args=[self.country_office.slug, self.pk])
@@ -0,0 +1,163 @@
+from datetime import timedelta
+from typing import TYPE_CHECKING
+
+from django.conf import settings
+from django.db import models
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from ._base import PowerQueryModel, TimeStampMixin
+from .dataset import Dataset
+from .formatter import Formatter
+from .report import ReportConfiguration
+from .report_document import ReportDocument
+
+if TYPE_CHECKING:
+    from typing import Any
+
+
+class ReportRunUnit(PowerQueryModel, TimeStampMixin, models.Model):
+    """
+    Checkpoint of the rendering of one (dataset, formatter) document of a ReportConfiguration run.
+
+    Units are claimed with a conditional update, so the same run can be processed by several
+    workers and a redelivered task only renders the documents that are missing or failed.
+    """
+
+    PENDING = "PENDING"
+    STARTED = "STARTED"
+    SUCCESS = "SUCCESS"
+    FAILURE = "FAILURE"
+    STATUSES = (
+        (PENDING, "Pending"),
+        (STARTED, "Started"),
+        (SUCCESS, "Success"),
+        (FAILURE, "Failure"),
+    )
+    OPEN_STATUSES = (PENDING, STARTED)
+    RESULT_FIELDS = ["status", "document", "error", "finished_on", "updated_on"]
+
+    report = models.ForeignKey(ReportConfiguration, on_delete=models.CASCADE, related_name="units")
+    dataset = models.ForeignKey(Dataset, on_delete=models.CASCADE, related_name="+")
+    formatter = models.ForeignKey(Formatter, on_delete=models.CASCADE, related_name="+")
+    document = models.ForeignKey(ReportDocument, on_delete=models.SET_NULL, blank=True, null=True, related_name="+")
+
+    status = models.CharField(max_length=10, choices=STATUSES, default=PENDING)
+    owner = models.CharField(max_length=64, blank=True, default="", help_text="Id of the task processing the unit")
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True, default="")
+    started_on = models.DateTimeField(blank=True, null=True)
+    finished_on = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        unique_together = ("report", "dataset", "formatter")
+        indexes = [models.Index(fields=["report", "status"], name="pq_rununit_report_status")]
+
+    class Tenant:
+        tenant_filter_field = "report__country_office"
+
+    def __str__(self) -> str:
+        return f"{self.report_id}/{self.dataset_id}/{self.formatter_id}: {self.status}"
+
+    @classmethod
+    def is_interrupted(cls, report: ReportConfiguration, owner: str) -> bool:
+        """
+        True if the last run of `report` did not complete and can be resumed by `owner`.
+
+        The run must be recent enough and not being processed by another worker: units STARTED
+        by another owner must not have been updated for `POWER_QUERY_REPORT_UNIT_TIMEOUT` seconds.
+        """
+        now = timezone.now()
+        since = now - timedelta(seconds=settings.POWER_QUERY_REPORT_RESUME_WINDOW)
+        expired = now - timedelta(seconds=settings.POWER_QUERY_REPORT_UNIT_TIMEOUT)
+        units = cls._all.filter(report=report, status__in=cls.OPEN_STATUSES, updated_on__gte=since)
+        if not units.exists():
+            return False
+        return not units.filter(status=cls.STARTED, updated_on__gte=expired).exclude(owner=owner).exists()
+
+    @classmethod
+    def plan(cls, report: ReportConfiguration, resume: bool) -> None:
+        """
+        Create the units of a run of `report`, one per dataset of its query and formatter.
+
+        A new run resets every unit to PENDING; a resumed run keeps the successful ones.
+        """
+        formatters = list(report.formatters.values_list("pk", flat=True))
+        wanted = {(ds, fmt) for ds in report.query.datasets.values_list("pk", flat=True) for fmt in formatters}
+        existing = {(u.dataset_id, u.formatter_id): u.pk for u in cls._all.filter(report=report)}
+        if stale := [pk for key, pk in existing.items() if key not in wanted]:
+            cls._all.filter(pk__in=stale).delete()
+        units = cls._all.filter(report=report)
+        now = timezone.now()
+        if resume:
+            units.filter(status=cls.FAILURE).update(status=cls.PENDING, updated_on=now)
+        else:
+            units.update(
+                status=cls.PENDING,
+                owner="",
+                attempts=0,
+                error="",
+                document=None,
+                started_on=None,
+                finished_on=None,
+                updated_on=now,
+            )
+        cls._all.bulk_create(
+            [cls(report=report, dataset_id=ds, formatter_id=fmt) for ds, fmt in sorted(wanted - existing.keys())],
+            ignore_conflicts=True,
+        )
+
+    def claim(self, owner: str) -> bool:
+        """
+        Mark the unit as STARTED by `owner`. Return False if another worker is processing it.
+
+        STARTED units can be claimed again by the same owner (ie. a redelivered task) or once
+        they have not been updated for `POWER_QUERY_REPORT_UNIT_TIMEOUT` seconds.
+        """
+        now = timezone.now()
+        expired = now - timedelta(seconds=settings.POWER_QUERY_REPORT_UNIT_TIMEOUT)
+        claimable = (
+            Q(status=self.PENDING)
+            | Q(status=self.STARTED, owner=owner)
+            | Q(status=self.STARTED, updated_on__lt=expired)
+        )
+        claimed = (
+            type(self)
+            ._all.filter(claimable, pk=self.pk)
+            .update(status=self.STARTED, owner=owner, attempts=F("attempts") + 1, started_on=now, updated_on=now)
+        )
+        return bool(claimed)
+
+    @classmethod
+    def renew(cls, units: "list[ReportRunUnit]") -> int:
+        """Touch the STARTED `units`, so they are not taken over while they are processed."""
+        if not units:
+            return 0
+        return cls._all.filter(pk__in=[u.pk for u in units], status=cls.STARTED).update(updated_on=timezone.now())
+
+    def record(self, result: "tuple[Any, Any]") -> "ReportRunUnit":
+        """
+        Set the outcome of the rendering: `(pk, filename)` or `(sentry_id, exception class)`.
+
+        The unit is not saved: units are updated in bulk with `RESULT_FIELDS`.
+        """
+        self.finished_on = self.updated_on = timezone.now()
+        if isinstance(result[1], type):
+            self.status = self.FAILURE
+            self.error = f"{result[1].__name__} ({result[0]})"
+        else:
+            self.status = self.SUCCESS
+            self.document_id = result[0]
+            self.error = ""
+        return self
+
+    @classmethod
+    def progress(cls, report: ReportConfiguration) -> "dict[str, int]":
+        """Number of units of the current (or last) run of `report` per status."""
+        counters = cls._all.filter(report=report).aggregate(
+            total=Count("pk"),
+            **{status.lower(): Count("pk", filter=Q(status=status)) for status, __ in cls.STATUSES},
+        )
+        done = counters["success"] + counters["failure"]
+        counters["percent"] = round(done * 100 / counters["total"]) if counters["total"] else 0
+        return counters
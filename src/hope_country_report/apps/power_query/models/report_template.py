@@ -11,7 +11,7 @@ from django.utils.text import slugify
 from django_cleanup import cleanup
 
 from hope_country_report.apps.core.models import CountryOffice
-from hope_country_report.apps.power_query.utils import is_valid_template
+from hope_country_report.apps.power_query.utils import file_hash, is_valid_template
 
 if TYPE_CHECKING:
     from collections.abc import Iterable
@@ -33,6 +33,12 @@ class ReportTemplate(models.Model):
     def content_type(self) -> tuple[str | None, str | None]:
         return mimetypes.guess_type(self.doc.name)
 
+    @cached_property
+    def content_hash(self) -> str:
+        """SHA256 of the template file, so edits of the file are detected even if its name is kept."""
+        with self.doc.open("rb") as f:
+            return file_hash(f)
+
     @classmethod
     def load(cls) -> None:
         template_dir = Path(settings.PACKAGE_DIR) / "apps" / "power_query" / "doc_templates"
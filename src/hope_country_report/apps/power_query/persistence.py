@@ -0,0 +1,158 @@
+"""
+Batched persistence of the documents rendered by a report run.
+
+`DocumentWriter` collects the rendered outputs and every `POWER_QUERY_DOCUMENT_BATCH_SIZE`
+documents, or as soon as they hold `POWER_QUERY_DOCUMENT_BATCH_MAX_SIZE` bytes, it:
+
+1. uploads the new files to the storage concurrently (`POWER_QUERY_UPLOAD_WORKERS` threads)
+2. upserts all the ReportDocument rows with a single `bulk_create(update_conflicts=True)`
+3. records the outcome of the run units of the batch with a single `bulk_update`
+4. refreshes the ReportDocumentIndex entries (bulk operations do not send signals)
+5. deletes the superseded files in a celery task, once the transaction is committed
+
+The run units of a batch are checkpointed only once the batch is stored: if the worker dies,
+the documents of the pending batch are rendered again when the run is resumed. Until then their
+claims are renewed before each render and flush, so other workers do not take them over.
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
+
+from django.conf import settings
+from django.db import transaction
+from sentry_sdk import capture_exception
+
+from ...utils.perf import span, trace
+from .celery_tasks import remove_report_files
+from .models import ReportDocument, ReportDocumentIndex, ReportRunUnit
+
+if TYPE_CHECKING:
+    from typing import Any
+
+    from django.core.files import File
+
+    from .models import Dataset, Formatter, ReportConfiguration
+
+logger = logging.getLogger(__name__)
+
+UPSERT_FIELDS = ["title", "info", "arguments", "content_hash", "file", "updated_on"]
+
+
+class DocumentWriter:
+    def __init__(self, report: "ReportConfiguration", batch_size: int = 0) -> None:
+        self.report = report
+        self.batch_size = batch_size or settings.POWER_QUERY_DOCUMENT_BATCH_SIZE
+        self.max_size = settings.POWER_QUERY_DOCUMENT_BATCH_MAX_SIZE
+        self.pending_size = 0
+        self.existing = {(d.dataset_id, d.formatter_id): d for d in ReportDocument._all.filter(report=report)}
+        self.pending: "list[tuple[ReportRunUnit|None, ReportDocument, File|None, str|None]]" = []
+        self.done: "list[tuple[ReportRunUnit|None, Any]]" = []
+        self.results: "list[tuple[ReportRunUnit|None, Any]]" = []
+
+    def add(self, dataset: "Dataset", formatter: "Formatter", unit: "ReportRunUnit|None" = None) -> None:
+        """Render the document of `dataset` with `formatter`. The batch is stored when full."""
+        doc = self.existing.get((dataset.pk, formatter.pk))
+        previous = doc.file.name if doc and doc.file else None
+        self.renew()
+        try:
+            with (
+                span("report.document", report=self.report.pk, dataset=dataset.pk, formatter=formatter.pk),
+                trace(),
+            ):
+                rendered = ReportDocument.render(self.report, dataset, formatter, doc)
+        except Exception as exc:
+            sid = capture_exception(exc)
+            logger.exception(exc)
+            if doc:
+                doc.delete()
+                del self.existing[(dataset.pk, formatter.pk)]
+            self.done.append((unit, (sid, type(exc))))
+            return
+        if rendered is None:
+            self.done.append((unit, (doc.pk, doc.file.name)))
+            return
+        doc, content = rendered
+        self.pending.append((unit, doc, content, previous))
+        self.pending_size += content.size if content else 0
+        if len(self.pending) >= self.batch_size or self.pending_size >= self.max_size:
+            self.flush()
+
+    def renew(self) -> None:
+        """Renew the claims of the units rendered but not stored yet."""
+        ReportRunUnit.renew([unit for unit, *__ in [*self.pending, *self.done] if unit])
+
+    def flush(self) -> None:
+        self.renew()
+        batch, self.pending, self.pending_size = self.pending, [], 0
+        try:
+            if batch:
+                self._store(batch)
+        finally:
+            for __, __, content, __ in batch:
+                if content:
+                    content.close()
+        done, self.done = self.done, []
+        if units := [unit.record(result) for unit, result in done if unit]:
+            ReportRunUnit._all.bulk_update(units, ReportRunUnit.RESULT_FIELDS)
+        self.results.extend(done)
+
+    def close(self) -> "list[tuple[ReportRunUnit|None, Any]]":
+        """Store the pending documents and return the `(unit, (pk, filename) or (sentry_id, exception))` of all."""
+        self.flush()
+        return self.results
+
+    def _store(self, batch: "list[tuple[ReportRunUnit|None, ReportDocument, File|None, str|None]]") -> None:
+        uploads = [(unit, doc, content) for unit, doc, content, __ in batch if content]
+        failed: set[int] = set()
+        if uploads:
+            with ThreadPoolExecutor(
+                max_workers=min(settings.POWER_QUERY_UPLOAD_WORKERS, len(uploads)), thread_name_prefix="pq-upload"
+            ) as executor:
+                futures = [executor.submit(self._upload, doc, content) for __, doc, content in uploads]
+            for (unit, doc, __), future in zip(uploads, futures, strict=True):
+                if exc := future.exception():
+                    logger.exception(exc)
+                    failed.add(id(doc))
+                    self.done.append((unit, (capture_exception(exc), type(exc))))
+
+        stored = [(unit, doc, previous) for unit, doc, __, previous in batch if id(doc) not in failed]
+        new_files = [doc.file.name for __, doc, previous in stored if doc.file.name != previous]
+        try:
+            with span("storage.upsert", report=self.report.pk, documents=len(stored)):
+                ReportDocument._all.bulk_create(
+                    [doc for __, doc, __ in stored],
+                    update_conflicts=True,
+                    unique_fields=["report", "dataset", "formatter"],
+                    update_fields=UPSERT_FIELDS,
+                )
+        except BaseException:
+            remove_files(new_files)
+            raise
+        for unit, doc, __ in stored:
+            self.existing[(doc.dataset_id, doc.formatter_id)] = doc
+            self.done.append((unit, (doc.pk, doc.file.name)))
+        for dataset_id in {doc.dataset_id for __, doc, __ in stored}:
+            ReportDocumentIndex.refresh(self.report.pk, dataset_id)
+        if superseded := [previous for __, doc, previous in stored if previous and previous != doc.file.name]:
+            transaction.on_commit(lambda: remove_report_files.delay(superseded), robust=True)
+
+    @staticmethod
+    def _upload(doc: ReportDocument, content: "File") -> None:
+        field = doc.file.field
+        with span("storage.write", report=doc.report_id):
+            doc.file.name = field.storage.save(
+                field.generate_filename(doc, content.name), content, max_length=field.max_length
+            )
+
+
+def remove_files(names: "list[str]") -> int:
+    storage = ReportDocument._meta.get_field("file").storage
+    removed = 0
+    for name in names:
+        try:
+            storage.delete(name)
+            removed += 1
+        except Exception as exc:
+            logger.warning(f"Unable to delete {name}: {exc}")
+    return removed
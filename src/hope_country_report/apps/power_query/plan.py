@@ -0,0 +1,47 @@
+"""
+Planner estimates of the QuerySets produced by Query code.
+
+`explain()` asks the database for the plan of a QuerySet with `EXPLAIN (FORMAT JSON)`:
+the statement is planned but not executed, so it is cheap even for huge tables.
+Sequential scans on the tables listed in `POWER_QUERY_PLAN_LARGE_TABLES` are reported
+as warnings.
+"""
+
+import json
+from typing import TYPE_CHECKING
+
+from django.conf import settings
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+    from typing import Any
+
+    from django.db.models import QuerySet
+
+
+def iter_nodes(node: "dict[str, Any]") -> "Iterator[dict[str, Any]]":
+    yield node
+    for child in node.get("Plans", []):
+        yield from iter_nodes(child)
+
+
+def summarize(plan: "dict[str, Any]") -> "dict[str, Any]":
+    """Extract estimated rows, cost and sequential scans from a PostgreSQL JSON plan."""
+    root = plan["Plan"]
+    large = set(settings.POWER_QUERY_PLAN_LARGE_TABLES)
+    seq_scans = sorted(
+        {n["Relation Name"] for n in iter_nodes(root) if n["Node Type"] == "Seq Scan" and "Relation Name" in n}
+    )
+    return {
+        "rows": int(root["Plan Rows"]),
+        "cost": float(root["Total Cost"]),
+        "seq_scans": seq_scans,
+        "warnings": [f"Sequential scan on {table}" for table in seq_scans if table in large],
+        "plan": plan,
+    }
+
+
+def explain(queryset: "QuerySet[Any]") -> "dict[str, Any]":
+    raw = queryset.explain(format="json")
+    data = json.loads(raw) if isinstance(raw, str) else raw
+    return {"sql": str(queryset.query), **summarize(data[0])}
@@ -1,16 +1,31 @@
+import csv
+import datetime
+import hashlib
 import io
+import json
 import logging
 import mimetypes
+import multiprocessing
 import re
+import threading
+from collections import OrderedDict
 from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from io import BytesIO
 from typing import TYPE_CHECKING, Any
 
 import pymupdf as fitz
+import django
 import pdfkit
-from django.core.files.temp import NamedTemporaryFile
+import yaml
+from constance import config
+from django.conf import settings
 from django.template import Context, Template
-from django.utils.functional import classproperty
+from django.utils.functional import cached_property, classproperty
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
 from PIL import Image
 from pypdf import PdfReader, PdfWriter
 from pypdf.constants import AnnotationDictionaryAttributes, FieldDictionaryAttributes, FieldFlag
@@ -18,20 +33,25 @@ from pypdf.generic import ArrayObject
 from sentry_sdk import capture_exception
 from strategy_field.registry import Registry
 from strategy_field.utils import fqn
+from tablib.formats._json import serialize_objects_handler
 
 from hope_country_report.apps.power_query.utils import (
-    apply_exif_orientation,
     convert_pdf_to_image_pdf,
     get_field_rect,
     insert_qr_code,
     insert_special_image,
+    iter_dataset,
+    make_naive,
     to_dataset,
 )
 
-from ..core.storage import get_hope_storage
+from .assets import photo_size, photos
 
 logger = logging.getLogger(__name__)
 if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator, Sequence
+    from typing import IO
+
     from .models import Dataset, Formatter, ReportTemplate
 
     ProcessorResult = bytes | BytesIO
@@ -80,6 +100,37 @@ class ProcessorStrategy:
     def process(self, context: "dict[str, Any]") -> "ProcessorResult":
         raise NotImplementedError
 
+    def write(self, context: "dict[str, Any]", sink: "IO[bytes]") -> None:
+        """Write the processed output to `sink`. Processors able to produce it incrementally override this."""
+        sink.write(self.process(context))
+
+
+def dataset_rows(dataset: "Dataset") -> "tuple[list[str], Iterable[Sequence[Any]]]":
+    """Headers and rows of a Dataset, read lazily when the storage format allows it."""
+    if dataset.is_columnar:
+        return dataset.headers, (
+            [make_naive(v) if isinstance(v, datetime.datetime) else v for v in row.values()] for row in dataset.read()
+        )
+    return iter_dataset(dataset.data)
+
+
+class StreamingProcessor(ProcessorStrategy):
+    """Processor that writes the rows of the dataset one at a time instead of building the whole export in memory."""
+
+    chunk_size = 1000
+
+    def process(self, context: "dict[str, Any]") -> bytes:
+        buffer = BytesIO()
+        self.write(context, buffer)
+        return buffer.getvalue()
+
+    def write(self, context: "dict[str, Any]", sink: "IO[bytes]") -> None:
+        headers, rows = dataset_rows(context["dataset"])
+        self.write_rows(headers, rows, sink)
+
+    def write_rows(self, headers: "list[str]", rows: "Iterable[Sequence[Any]]", sink: "IO[bytes]") -> None:
+        raise NotImplementedError
+
 
 class ToXLS(ProcessorStrategy):
     file_suffix = ".xls"
@@ -91,45 +142,84 @@ class ToXLS(ProcessorStrategy):
         return dt.export("xls")
 
 
-class ToXLSX(ProcessorStrategy):
+class ToXLSX(StreamingProcessor):
     file_suffix = ".xlsx"
     format = TYPE_LIST
     verbose_name = "Dataset to XLSX"
 
-    def process(self, context: "dict[str, Any]") -> bytes:
-        dt = to_dataset(context["dataset"].data)
-        return dt.export("xlsx")
+    def write_rows(self, headers: "list[str]", rows: "Iterable[Sequence[Any]]", sink: "IO[bytes]") -> None:
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet("Tablib Dataset")
+        ws.freeze_panes = "A2"
+        bold = Font(bold=True)
+        header = []
+        for title in headers:
+            cell = WriteOnlyCell(ws, value=title)
+            cell.font = bold
+            header.append(cell)
+        ws.append(header)
+        for row in rows:
+            ws.append([self.cell(ws, value) for value in row])
+        wb.save(sink)
+
+    @staticmethod
+    def cell(ws: "Any", value: "Any") -> WriteOnlyCell:
+        try:
+            return WriteOnlyCell(ws, value=value)
+        except ValueError:
+            return WriteOnlyCell(ws, value=str(value))
 
 
-class ToJSON(ProcessorStrategy):
+class ToJSON(StreamingProcessor):
     file_suffix = ".json"
     format = TYPE_LIST
     verbose_name = "Dataset to JSON"
 
-    def process(self, context: "dict[str, Any]") -> "ProcessorResult":
-        dt = to_dataset(context["dataset"].data)
-        return dt.export("json").encode()
+    def write_rows(self, headers: "list[str]", rows: "Iterable[Sequence[Any]]", sink: "IO[bytes]") -> None:
+        # same output of `tablib.Dataset.export("json")`, one record at a time
+        sink.write(b"[")
+        separator = b""
+        for row in rows:
+            record = json.dumps(dict(zip(headers, row)), default=serialize_objects_handler, ensure_ascii=False)
+            sink.write(separator + record.encode())
+            separator = b", "
+        sink.write(b"]")
 
 
-class ToCSV(ProcessorStrategy):
+class ToCSV(StreamingProcessor):
     file_suffix = ".csv"
     format = TYPE_LIST
     verbose_name = "Dataset to CSV"
 
-    def process(self, context: "dict[str, Any]") -> "ProcessorResult":
-        dt = to_dataset(context["dataset"].data)
-        return dt.export("csv").encode()
+    def write_rows(self, headers: "list[str]", rows: "Iterable[Sequence[Any]]", sink: "IO[bytes]") -> None:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(headers)
+        for i, row in enumerate(rows, 1):
+            writer.writerow(row)
+            if i % self.chunk_size == 0:
+                sink.write(buffer.getvalue().encode())
+                buffer.seek(0)
+                buffer.truncate()
+        sink.write(buffer.getvalue().encode())
 
 
-class ToYAML(ProcessorStrategy):
+class ToYAML(StreamingProcessor):
     file_suffix = ".yaml"
     format = TYPE_LIST
     verbose_name = "Dataset to YAML"
 
-    def process(self, context: "dict[str, Any]") -> "ProcessorResult":
-        ds: "Dataset" = context["dataset"]
-        dt = to_dataset(ds.data)
-        return dt.export("yaml").encode()
+    def write_rows(self, headers: "list[str]", rows: "Iterable[Sequence[Any]]", sink: "IO[bytes]") -> None:
+        # a YAML block sequence is the concatenation of its single-item dumps
+        empty = True
+        for row in rows:
+            item = yaml.safe_dump(
+                [dict(zip(headers, row))], default_flow_style=None, allow_unicode=True, sort_keys=False
+            )
+            sink.write(item.encode())
+            empty = False
+        if empty:
+            sink.write(b"[]\n")
 
 
 class ToHTML(ProcessorStrategy):
@@ -186,6 +276,68 @@ class ToPDF(ProcessorStrategy):
         return pdfkit.from_string(out)
 
 
+class FormTemplate:
+    """PDF form template with its field metadata, parsed once and reused for every record."""
+
+    QR = "qr"
+    IMAGE = "image"
+    SPECIAL = "special"
+    TEXT = "text"
+
+    def __init__(self, content: bytes, processor: "ToFormPDF") -> None:
+        self.content = content
+        self.fields: "dict[str, tuple[str, str | None]]" = {}
+        self.image_sizes: "dict[str, tuple[int, int]]" = {}
+        for page in self.reader.pages:
+            for annot in page.annotations or []:
+                annot = annot.get_object()
+                field_name = annot.get(FieldDictionaryAttributes.T)
+                if field_name is None:
+                    continue
+                language = processor.is_special_language_field(field_name)
+                if field_name.endswith("_qr"):
+                    self.fields[field_name] = (self.QR, None)
+                elif processor.is_image_field(annot):
+                    self.fields[field_name] = (self.IMAGE, None)
+                    x0, y0, x1, y1 = (float(v) for v in annot[AnnotationDictionaryAttributes.Rect])
+                    self.image_sizes[field_name] = photo_size(abs(x1 - x0), abs(y1 - y0))
+                elif language:
+                    self.fields[field_name] = (self.SPECIAL, language)
+                else:
+                    self.fields[field_name] = (self.TEXT, None)
+
+    def __getstate__(self) -> dict[str, Any]:
+        return {"content": self.content, "fields": self.fields, "image_sizes": self.image_sizes}
+
+    @cached_property
+    def reader(self) -> PdfReader:
+        return PdfReader(io.BytesIO(self.content))
+
+    def photos(self, entries: "Iterable[dict[str, Any]]") -> "Iterator[tuple[str, tuple[int, int]]]":
+        """Storage path and pixel size of the photos the `entries` place in the template image fields."""
+        for entry in entries:
+            for field_name, size in self.image_sizes.items():
+                if entry.get(field_name):
+                    yield entry[field_name], size
+
+
+# parsed templates by content hash, least recently used first
+_form_templates: "OrderedDict[str, FormTemplate]" = OrderedDict()
+_form_templates_lock = threading.Lock()
+_worker_template: "FormTemplate | None" = None
+
+
+def _init_form_worker(template: FormTemplate) -> None:
+    global _worker_template
+
+    django.setup()
+    _worker_template = template
+
+
+def _render_form_record(processor: "type[ToFormPDF]", entry: dict[str, Any], font_size: int, font_color: str) -> bytes:
+    return processor(None).render_record(_worker_template, entry, font_size, font_color)
+
+
 class ToFormPDF(ProcessorStrategy):
     """
     Produce reports in PDF form or cards.
@@ -195,85 +347,130 @@ class ToFormPDF(ProcessorStrategy):
     file_suffix = ".pdf"
     format = TYPE_DETAIL
     needs_file = True
+    chunk_size = 16
 
     def process(self, context: dict[str, Any]) -> bytes:
-        tpl = self.formatter.template
-        reader = PdfReader(tpl.doc)
+        template = self.get_form_template(self.formatter.template)
         font_size = int(context.get("context", {}).get("font_size", 10))
         font_color = context.get("context", {}).get("font_color", "black")
         ds = to_dataset(context["dataset"].data).dict
-        output_pdf = PdfWriter()
-        for _index, entry in enumerate(ds, start=1):
-            with NamedTemporaryFile(suffix=".pdf", delete=True) as temp_pdf_file:
-                writer = PdfWriter()
-                text_values = {}
-                special_values = {}
-                images = {}
-                qr_codes = {}
-
-                for page in reader.pages:
-                    for annot in page.annotations:
-                        annot = annot.get_object()
-                        field_name = annot[FieldDictionaryAttributes.T]
-                        if field_name in entry:
-                            value = entry[field_name]
-                            language = self.is_special_language_field(field_name)
-                            if field_name.endswith("_qr"):
-                                qr_codes[field_name] = value
-                            elif self.is_image_field(annot):
-                                rect = annot[AnnotationDictionaryAttributes.Rect]
-                                images[field_name] = (rect, value)
-                            elif language:
-                                special_values[field_name] = {"value": value, "language": language}
-                            else:
-                                text_values[field_name] = value
-
-                writer.append(reader)
-                writer.update_page_form_field_values(writer.pages[-1], text_values, flags=FieldFlag.READ_ONLY)
-                output_stream = io.BytesIO()
-                writer.write(output_stream)
-                output_stream.seek(0)
-                temp_pdf_file.write(output_stream.read())
-
-                # Open processed document for image and QR code insertion
-                document = fitz.open(stream=output_stream.getvalue(), filetype="pdf")
-                if images or special_values or qr_codes:
-                    self.insert_images_and_qr_codes(document, images, qr_codes, special_values, font_size, font_color)
-                document.save(temp_pdf_file.name)
-                output_stream.seek(0)
-                output_pdf.append_pages_from_reader(PdfReader(temp_pdf_file.name))
-
+        workers = min(config.PQ_PDF_WORKERS, len(ds))
+        output_pdf = fitz.open()
+        if workers > 1:
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_form_worker,
+                initargs=(template,),
+            ) as pool:
+                render = partial(_render_form_record, type(self), font_size=font_size, font_color=font_color)
+                for batch in self.prefetched(template, ds, self.chunk_size * workers):
+                    self.merge_pages(output_pdf, pool.map(render, batch, chunksize=self.chunk_size))
+        else:
+            for batch in self.prefetched(template, ds, self.chunk_size):
+                self.merge_pages(
+                    output_pdf,
+                    (self.render_record(template, entry, font_size, font_color) for entry in batch),
+                )
         output_stream = io.BytesIO()
-        output_pdf.write(output_stream)
-        output_stream.seek(0)
+        output_pdf.save(output_stream, deflate_fonts=1, deflate_images=1, deflate=1)
+        photos.evict()
+        return output_stream.getvalue()
+
+    def prefetched(
+        self, template: "FormTemplate", entries: "Sequence[dict[str, Any]]", batch_size: int
+    ) -> "Iterator[Sequence[dict[str, Any]]]":
+        """Split `entries` in batches, downloading the photos of each batch to the shared cache before rendering."""
+        for start in range(0, len(entries), batch_size):
+            batch = entries[start : start + batch_size]
+            photos.prefetch(template.photos(batch))
+            yield batch
+
+    def merge_pages(self, output_pdf: fitz.Document, pages: "Iterable[bytes]") -> None:
+        for page in pages:
+            with fitz.open("pdf", page) as document:
+                output_pdf.insert_pdf(document)
+
+    def get_form_template(self, tpl: "ReportTemplate") -> "FormTemplate":
+        """Parsed `tpl`, kept in a LRU of `POWER_QUERY_FORM_TEMPLATE_CACHE_SIZE` templates keyed by content."""
+        with tpl.doc.open("rb") as f:
+            content = f.read()
+        key = hashlib.sha256(content).hexdigest()
+        with _form_templates_lock:
+            if (template := _form_templates.get(key)) is not None:
+                _form_templates.move_to_end(key)
+                return template
+        template = FormTemplate(content, self)
+        with _form_templates_lock:
+            _form_templates[key] = template
+            while len(_form_templates) > settings.POWER_QUERY_FORM_TEMPLATE_CACHE_SIZE:
+                _form_templates.popitem(last=False)
+        return template
+
+    def render_record(self, template: "FormTemplate", entry: dict[str, Any], font_size: int, font_color: str) -> bytes:
+        """Fill the template with `entry` and return it as an image-only PDF."""
+        text_values = {}
+        special_values = {}
+        images = {}
+        qr_codes = {}
+        for field_name, (kind, language) in template.fields.items():
+            if field_name not in entry:
+                continue
+            value = entry[field_name]
+            if kind == FormTemplate.QR:
+                qr_codes[field_name] = value
+            elif kind == FormTemplate.IMAGE:
+                images[field_name] = (None, value)
+            elif kind == FormTemplate.SPECIAL:
+                special_values[field_name] = {"value": value, "language": language}
+            else:
+                text_values[field_name] = value
+
+        writer = PdfWriter()
+        writer.append(template.reader)
+        writer.update_page_form_field_values(writer.pages[-1], text_values, flags=FieldFlag.READ_ONLY)
+        output_stream = io.BytesIO()
+        writer.write(output_stream)
 
-        fitz_pdf_document = fitz.open("pdf", output_stream.read())
-        return convert_pdf_to_image_pdf(fitz_pdf_document, dpi=300)
+        with fitz.open(stream=output_stream.getvalue(), filetype="pdf") as document:
+            if images or special_values or qr_codes:
+                self.insert_images_and_qr_codes(
+                    document, images, qr_codes, special_values, font_size, font_color, template.image_sizes
+                )
+            return convert_pdf_to_image_pdf(document, dpi=300)
 
     def insert_images_and_qr_codes(
         self,
         document: fitz.Document,
-        images: dict[str, tuple[fitz.Rect, str]],
+        images: dict[str, tuple[fitz.Rect | None, str]],
         qr_codes: dict[str, str],
         special_values: dict[str, dict[str, str]],
         font_size: int,
         font_color: str,
+        image_sizes: "dict[str, tuple[int, int]]|None" = None,
     ) -> None:
         """Inserts images and QR codes into the specified fields."""
         for field_name, text in special_values.items():
             insert_special_image(document, field_name, text, int(font_size), font_color)
-        for field_name, (rect, image_path) in images.items():
-            self.insert_external_image(document, field_name, image_path, rect)
+        for field_name, (__, image_path) in images.items():
+            size = (image_sizes or {}).get(field_name)
+            self.insert_external_image(document, field_name, image_path, font_size, size)
         for field_name, data in qr_codes.items():
             rect, page_index = get_field_rect(document, field_name)
             insert_qr_code(document, field_name, data, rect, page_index)
 
     def insert_external_image(
-        self, document: fitz.Document, field_name: str, image_path: str, font_size: int = 10
+        self,
+        document: fitz.Document,
+        field_name: str,
+        image_path: str,
+        font_size: int = 10,
+        size: "tuple[int, int]|None" = None,
     ) -> None:
         """
         Loads, resizes, adjusts DPI, and inserts an external image into the specified field.
         Automatically detects orientation using EXIF metadata and adjusts rotation.
+        `size` is the pixel size the photos have been prefetched with (see `FormTemplate.image_sizes`).
         """
         rect: fitz.Rect | None
         page_index: int | None
@@ -285,19 +482,7 @@ class ToFormPDF(ProcessorStrategy):
 
         page = document[page_index]
         try:
-            image_stream = self.load_image_from_blob_storage(image_path)
-            image = Image.open(image_stream)
-            image = apply_exif_orientation(image)
-            pdf_width_in_inches = rect.width / 72.0
-            pdf_height_in_inches = rect.height / 72.0
-            target_dpi = 300
-            image = image.resize(
-                (int(pdf_width_in_inches * target_dpi), int(pdf_height_in_inches * target_dpi)),
-                Image.LANCZOS,
-            )
-            output_stream = io.BytesIO()
-            image.save(output_stream, format="PNG", dpi=(target_dpi, target_dpi))
-            output_stream.seek(0)
+            output_stream = io.BytesIO(photos.get(image_path, size or photo_size(rect.width, rect.height)))
             for widget in page.widgets():
                 if widget.field_name == field_name:
                     page.delete_widget(widget)
@@ -338,8 +523,7 @@ class ToFormPDF(ProcessorStrategy):
         return None
 
     def load_image_from_blob_storage(self, image_path: str) -> BytesIO:
-        with get_hope_storage().open(image_path, "rb") as img_file:
-            return BytesIO(img_file.read())
+        return BytesIO(photos.read(image_path))
 
 
 class ProcessorRegistry(Registry):
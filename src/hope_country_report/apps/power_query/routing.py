@@ -0,0 +1,77 @@
+"""
+Cost based routing of Query and Report tasks.
+
+The cost of a task is estimated from the timings (`perfs`) recorded by the previous
+runs in `Dataset.info` and `ReportDocument.info`. Reports rendering PDFs go to the
+"pdf" queue, tasks expected to last less than `POWER_QUERY_FAST_TASK_SECONDS` to the
+"fast" one and everything else to "heavy". Records never run are considered fast.
+
+Priorities follow the Redis transport, which consumes the lowest value first: the interactive
+boost is subtracted from the priority of the route.
+"""
+
+from typing import TYPE_CHECKING, NamedTuple
+
+from django.conf import settings
+
+from .processors import ToFormPDF, ToPDF
+
+if TYPE_CHECKING:
+    from .models import Query, ReportConfiguration
+
+FAST = "fast"
+HEAVY = "heavy"
+PDF = "pdf"
+
+PDF_PROCESSORS = (ToFormPDF, ToPDF)
+
+
+class Route(NamedTuple):
+    name: str
+    queue: str
+    priority: int
+
+    def options(self) -> "dict[str, str|int]":
+        return {"queue": self.queue, "priority": self.priority}
+
+
+def _elapsed(infos: "list[dict]", key: str) -> float:
+    return sum(float((info.get(key) or {}).get("time_elapsed") or 0) for info in infos)
+
+
+def estimate_query(query: "Query") -> "float|None":
+    """Seconds the last run of the Query matrix took, None if it never ran."""
+    infos = list(query.datasets.values_list("info", flat=True))
+    if not infos:
+        return None
+    return _elapsed(infos, "perfs") / query.get_matrix_workers(len(infos))
+
+
+def estimate_report(report: "ReportConfiguration", run_query: bool = True) -> "float|None":
+    """Seconds the last execution of the Report took, None if it never ran."""
+    infos = list(report.documents.values_list("info", flat=True))
+    query_cost = estimate_query(report.query) if run_query else 0
+    if not infos and query_cost is None:
+        return None
+    return _elapsed(infos, "perf") + (query_cost or 0)
+
+
+def get_route(name: str, interactive: bool = False) -> Route:
+    priority = settings.POWER_QUERY_TASK_PRIORITIES[name]
+    if interactive:
+        priority = max(priority - settings.POWER_QUERY_INTERACTIVE_PRIORITY_BOOST, 0)
+    return Route(name, settings.POWER_QUERY_TASK_QUEUES[name], priority)
+
+
+def _by_cost(cost: "float|None") -> str:
+    return HEAVY if cost is not None and cost > settings.POWER_QUERY_FAST_TASK_SECONDS else FAST
+
+
+def route_query(query: "Query", interactive: bool = False) -> Route:
+    return get_route(_by_cost(estimate_query(query)), interactive)
+
+
+def route_report(report: "ReportConfiguration", run_query: bool = True, interactive: bool = False) -> Route:
+    if any(isinstance(f.processor, PDF_PROCESSORS) for f in report.formatters.all()):
+        return get_route(PDF, interactive)
+    return get_route(_by_cost(estimate_report(report, run_query)), interactive)
@@ -0,0 +1,141 @@
+"""
+Distributed concurrency limits for tasks that query the HOPE database.
+
+Each running Query holds a slot in three Redis semaphores: its country office (if any), its
+target model and the database alias it reads from. Limits are read from constance
+(0 disables a limit). A Query running its argument matrix with `matrix_workers`
+threads takes one slot per worker (up to the limit of each semaphore).
+
+Slots are leases renewed by a heartbeat thread every third of `PQ_THROTTLE_LEASE`
+seconds while they are held: if a worker dies without releasing them they expire.
+"""
+
+import logging
+import random
+import threading
+import time
+import uuid
+from typing import TYPE_CHECKING
+
+from constance import config
+from django.conf import settings
+from redis import StrictRedis
+
+if TYPE_CHECKING:
+    from .models import Query
+
+logger = logging.getLogger(__name__)
+
+# KEYS: semaphores, ARGV: now, lease expiration, token, weight, limits (one per key)
+# a slot of weight N is made of the members token:1..N, capped to the limit of each key
+ACQUIRE_SCRIPT = """
+local weight = tonumber(ARGV[4])
+for i, key in ipairs(KEYS) do
+    redis.call("zremrangebyscore", key, "-inf", ARGV[1])
+    local limit = tonumber(ARGV[4 + i])
+    if limit > 0 and redis.call("zcard", key) + math.min(weight, limit) > limit then
+        return 0
+    end
+end
+for i, key in ipairs(KEYS) do
+    local limit = tonumber(ARGV[4 + i])
+    for n = 1, math.min(weight, limit) do
+        redis.call("zadd", key, ARGV[2], ARGV[3] .. ":" .. n)
+    end
+    redis.call("expireat", key, math.ceil(tonumber(ARGV[2])))
+end
+return 1
+"""
+
+# KEYS: semaphores, ARGV: lease expiration, token, weight. Members already expired are not renewed
+RENEW_SCRIPT = """
+local renewed = 0
+for i, key in ipairs(KEYS) do
+    for n = 1, tonumber(ARGV[3]) do
+        local member = ARGV[2] .. ":" .. n
+        if redis.call("zscore", key, member) then
+            redis.call("zadd", key, ARGV[1], member)
+            renewed = renewed + 1
+        end
+    end
+    redis.call("expireat", key, math.ceil(tonumber(ARGV[1])))
+end
+return renewed
+"""
+
+rds = StrictRedis(settings.REDIS_URL, decode_responses=True)
+_acquire = rds.register_script(ACQUIRE_SCRIPT)
+_renew = rds.register_script(RENEW_SCRIPT)
+
+
+def get_limits(query: "Query") -> "dict[str, int]":
+    target = query.parent.target if query.parent else query.target
+    limits = {
+        f"pq:throttle:model:{target.app_label}.{target.model}": config.PQ_THROTTLE_MODEL_LIMIT,
+        f"pq:throttle:db:{settings.POWER_QUERY_DB_ALIAS}": config.PQ_THROTTLE_DB_LIMIT,
+    }
+    # queries without a country office (ie. abstract ones) are not limited per office
+    if query.country_office_id:
+        limits[f"pq:throttle:office:{query.country_office_id}"] = config.PQ_THROTTLE_OFFICE_LIMIT
+    return limits
+
+
+class QuerySlot:
+    def __init__(self, query: "Query") -> None:
+        self.limits = {key: limit for key, limit in get_limits(query).items() if limit > 0}
+        self.weight = query.get_matrix_workers(len(query.get_args())) if self.limits else 1
+        self.token = uuid.uuid4().hex
+        self.acquired = False
+        self.lease = 0
+        self._stop = threading.Event()
+        self._heartbeat: "threading.Thread|None" = None
+
+    @property
+    def members(self) -> "list[str]":
+        return [f"{self.token}:{n}" for n in range(1, self.weight + 1)]
+
+    def acquire(self) -> bool:
+        if self.limits:
+            self.lease = config.PQ_THROTTLE_LEASE
+            now = time.time()
+            keys = list(self.limits)
+            args = [now, now + self.lease, self.token, self.weight, *self.limits.values()]
+            self.acquired = bool(_acquire(keys=keys, args=args))
+            if self.acquired and self.lease > 0:
+                self._stop.clear()
+                self._heartbeat = threading.Thread(target=self._beat, name=f"pq-slot-{self.token[:8]}", daemon=True)
+                self._heartbeat.start()
+        else:
+            self.acquired = True
+        return self.acquired
+
+    def renew(self) -> bool:
+        """Extend the lease of the slot. Return False if it expired in the meantime."""
+        return bool(_renew(keys=list(self.limits), args=[time.time() + self.lease, self.token, self.weight]))
+
+    def _beat(self) -> None:
+        while not self._stop.wait(max(self.lease / 3, 1)):
+            try:
+                if not self.renew():
+                    logger.warning(f"Throttle slot {self.token} expired while held")
+                    return
+            except Exception as e:
+                logger.warning(f"Unable to renew throttle slot {self.token}: {e}")
+
+    def release(self) -> None:
+        self._stop.set()
+        if self._heartbeat:
+            self._heartbeat.join()
+            self._heartbeat = None
+        if self.acquired and self.limits:
+            with rds.pipeline() as pipe:
+                for key in self.limits:
+                    pipe.zrem(key, *self.members)
+                pipe.execute()
+        self.acquired = False
+
+
+def backoff(retries: int) -> int:
+    """Exponential delay, with jitter, before a throttled task is attempted again."""
+    delay = min(config.PQ_THROTTLE_BACKOFF * 2**retries, 600)
+    return int(delay + random.uniform(0, delay / 2))
@@ -6,20 +6,19 @@ import io
 import json
 import logging
 import sys
-from collections.abc import Callable, Container, Iterable
+from collections.abc import Callable, Container, Iterable, Iterator, Sequence
 from functools import lru_cache, wraps
 from io import BytesIO
 from pathlib import Path
-from typing import TYPE_CHECKING, Any, Dict
+from typing import TYPE_CHECKING, Any
 from urllib.parse import urljoin
 
 import pymupdf as fitz
-import qrcode
 import requests
 import tablib
-from constance import config
 from django.conf import settings
 from django.contrib.auth import authenticate
+from django.contrib.staticfiles import finders
 from django.contrib.staticfiles.storage import staticfiles_storage
 from django.db.models import QuerySet
 from django.http import HttpRequest, HttpResponse
@@ -27,7 +26,12 @@ from django.utils.safestring import mark_safe
 from PIL import Image, ImageDraw, ImageFont, ImageOps
 from sentry_sdk import capture_exception, configure_scope
 
+from .assets import qr_code_png
+from .json import PQJSONEncoder
+
 if TYPE_CHECKING:
+    from django.core.files import File
+
     from hope_country_report.types.django import AnyModel
 
 
@@ -74,41 +78,62 @@ def make_naive(value: datetime.datetime) -> datetime.datetime:
     return value
 
 
-def to_dataset(result: "QuerySet[AnyModel]|Iterable[Any]|tablib.Dataset|Dict[str,Any]") -> tablib.Dataset:  # noqa
+def _queryset_rows(qs: "QuerySet[AnyModel]", fields: "list[str]") -> "Iterator[list[Any]]":
+    try:
+        for obj in qs.iterator(chunk_size=settings.POWER_QUERY_CURSOR_CHUNK_SIZE):
+            line = []
+            for f in fields:
+                if isinstance(obj, tuple):
+                    line.append(str(obj))
+                elif isinstance(obj, datetime.datetime):
+                    line.append(make_naive(obj))
+                else:
+                    line.append(str(getattr(obj, f)))
+            yield line
+    except Exception as e:
+        logger.exception(e)
+        raise
+        # raise ValueError(f"Results can't be rendered as a tablib Dataset: {e}")
+
+
+def _records_rows(result: "Iterable[dict[str, Any]]", fields: "list[str]") -> "Iterator[list[Any]]":
+    try:
+        for obj in result:
+            yield [make_naive(obj[f]) if isinstance(obj[f], datetime.datetime) else obj[f] for f in fields]
+    except Exception:
+        raise ValueError("Results can't be rendered as a tablib Dataset")
+
+
+def iter_dataset(
+    result: "QuerySet[AnyModel]|Iterable[Any]|tablib.Dataset", limit: "int|None" = None
+) -> "tuple[list[str], Iterator[Sequence[Any]]]":
+    """Headers and rows of `result` as `to_dataset` would store them, produced lazily."""
     if isinstance(result, QuerySet):
-        data = tablib.Dataset()
         fields = result.__dict__["_fields"]
         if not fields:
             fields = [field.name for field in result.model._meta.concrete_fields]
-        data.headers = fields
-        try:
-            for obj in result.using(settings.POWER_QUERY_DB_ALIAS).all()[: config.PQ_SAMPLE_PAGE_SIZE]:
-                line = []
-                for f in fields:
-                    if isinstance(obj, tuple):
-                        line.append(str(obj))
-                    elif isinstance(obj, datetime.datetime):
-                        line.append(make_naive(obj))
-                    else:
-                        line.append(str(getattr(obj, f)))
-                data.append(line)
-        except Exception as e:
-            logger.exception(e)
-            raise
-            # raise ValueError(f"Results can't be rendered as a tablib Dataset: {e}")
-    elif isinstance(result, list | tuple):
-        data = tablib.Dataset()
+        qs = result.using(settings.POWER_QUERY_DB_ALIAS).all()
+        if limit:
+            qs = qs[:limit]
+        return list(fields), _queryset_rows(qs, fields)
+    if isinstance(result, list | tuple):
         fields = list({k: None for d in result for k in d.keys()}.keys())
-        data.headers = fields
-        try:
-            for obj in result:
-                data.append([make_naive(obj[f]) if isinstance(obj[f], datetime.datetime) else obj[f] for f in fields])
-        except Exception:
-            raise ValueError("Results can't be rendered as a tablib Dataset")
-    elif isinstance(result, tablib.Dataset | dict):
-        data = result
-    else:
-        raise ValueError(f"{result} ({type(result)}")
+        return fields, _records_rows(result, fields)
+    if isinstance(result, tablib.Dataset):
+        return list(result.headers or []), iter(result)
+    raise ValueError(f"{result} ({type(result)}")
+
+
+def to_dataset(
+    result: "QuerySet[AnyModel]|Iterable[Any]|tablib.Dataset|dict[str,Any]", limit: "int|None" = None
+) -> tablib.Dataset:
+    if isinstance(result, tablib.Dataset | dict):
+        return result
+    headers, rows = iter_dataset(result, limit)
+    data = tablib.Dataset()
+    data.headers = headers
+    for row in rows:
+        data.append(row)
     return data
 
 
@@ -160,11 +185,20 @@ def dict_hash(dictionary: dict[str, Any]) -> str:
     dhash = hashlib.md5()
     # We need to sort arguments so {'a': 1, 'b': 2} is
     # the same as {'b': 2, 'a': 1}
-    encoded = json.dumps(dictionary, sort_keys=True).encode()
+    encoded = json.dumps(dictionary, sort_keys=True, cls=PQJSONEncoder).encode()
     dhash.update(encoded)
     return dhash.hexdigest()
 
 
+def file_hash(f: "File") -> str:
+    """SHA256 hash of a file content. The file is rewound so it can be saved afterwards."""
+    dhash = hashlib.sha256()
+    for chunk in f.chunks():
+        dhash.update(chunk)
+    f.seek(0)
+    return dhash.hexdigest()
+
+
 def sentry_tags(func: Callable[..., Any]) -> Callable[..., Any]:
     @wraps(func)
     def wrapper(*args: Any, **kwargs: Any) -> Any:
@@ -188,7 +222,11 @@ def get_font_url(font_filename: str) -> str:
 
 
 def load_font_for_language(language: str, font_size: int = 12) -> ImageFont.FreeTypeFont:
-    """Returns the appropriate font for the given language by fetching it from its static URL."""
+    """Returns the appropriate font for the given language.
+
+    Fonts are read from the static files shipped with the project and only fetched from their static URL
+    when they cannot be found locally.
+    """
     font_filenames = {
         "arabic": "NotoNaskhArabic-Bold.ttf",
         "cyrillic": "FreeSansBold.ttf",
@@ -199,6 +237,9 @@ def load_font_for_language(language: str, font_size: int = 12) -> ImageFont.Free
     default_font_filename = "FreeSansBold.ttf"
     font_filename = font_filenames.get(language, default_font_filename)
 
+    if font_filename not in _font_cache and (local_font := finders.find(f"fonts/{font_filename}")):
+        _font_cache[font_filename] = Path(local_font).read_bytes()
+
     if font_filename not in _font_cache:
         font_url = get_font_url(font_filename)
         try:
@@ -294,19 +335,7 @@ def insert_special_image(
 
 def insert_qr_code(document: fitz.Document, field_name: str, data: str, rect: fitz.Rect, page_index: int) -> None:
     """Generates a QR code and inserts it into the specified field."""
-    qr = qrcode.QRCode(
-        version=1,
-        error_correction=qrcode.constants.ERROR_CORRECT_L,
-        box_size=10,
-        border=2,
-    )
-    qr.add_data(data)
-    qr.make(fit=True)
-
-    qr_image = qr.make_image(fill_color="black", back_color="white")
-    image_stream = io.BytesIO()
-    qr_image.save(image_stream, format="PNG")
-    image_stream.seek(0)
+    image_stream = io.BytesIO(qr_code_png(data))
 
     page = document[page_index]
 
@@ -0,0 +1,51 @@
+import logging
+from typing import TYPE_CHECKING
+
+from django.conf import settings
+from django.utils import timezone
+
+from ...config.celery import app
+from .publisher import PublishError, publish
+
+if TYPE_CHECKING:
+    from celery import Task
+
+logger = logging.getLogger(__name__)
+
+
+@app.task(
+    bind=True,
+    autoretry_for=(PublishError, ConnectionError, OSError),
+    retry_backoff=True,
+    retry_backoff_max=600,
+    max_retries=settings.STREAMING_PUBLISH_MAX_RETRIES,
+)
+def publish_dataset_event(self: "Task", dataset_id: int, content_hash: str = "") -> int:
+    """
+    Publish the streaming event of a Dataset saved by a query run.
+
+    Nothing is sent if the dataset has been deleted or replaced by a newer content (that content
+    has its own task), or if the same content has already been published. Retrying only resends
+    the messages: the query is not executed again.
+    """
+    from hope_country_report.apps.power_query.models import Dataset
+
+    dataset = Dataset._all.select_related("query__event", "query__country_office").filter(pk=dataset_id).first()
+    if dataset is None or dataset.content_hash != content_hash:
+        return 0
+    event = getattr(dataset.query, "event", None)
+    if event is None or not event.enabled:
+        return 0
+    if content_hash and dataset.info.get("stream", {}).get("content_hash") == content_hash:
+        logger.info(f"Dataset {dataset_id} content already published")
+        return 0
+    if event.publish_as_url and not dataset.query.country_office:
+        logger.warning(f"Cannot generate URL for Dataset {dataset_id}. It is missing a country_office link.")
+        return 0
+    sent = publish(event, dataset)
+    info = {
+        **dataset.info,
+        "stream": {"content_hash": content_hash, "messages": sent, "published_on": timezone.now().isoformat()},
+    }
+    Dataset._all.filter(pk=dataset_id).update(info=info)
+    return sent
@@ -0,0 +1,94 @@
+"""
+Build and send the streaming messages of a Dataset.
+
+Tabular datasets are sent as a sequence of messages of at most `STREAMING_CHUNK_ROWS` rows,
+read from storage chunk by chunk. Each message carries the dataset id, its content hash, its
+position (`seq`, starting from 0) and the total number of messages (`chunks`) so consumers can
+reassemble and de-duplicate them. With `Event.publish_as_url` a single message with the URL of
+the dataset is sent instead.
+"""
+
+import json
+import logging
+import math
+from functools import lru_cache
+from itertools import islice
+from typing import TYPE_CHECKING
+
+from django.conf import settings
+from django.urls import reverse
+
+from hope_country_report.apps.power_query.json import PQJSONEncoder
+from hope_country_report.apps.power_query.models.dataset import DatasetRows
+from hope_country_report.utils.mail import build_absolute_uri
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+    from typing import Any
+
+    from hope_country_report.apps.power_query.models import Dataset
+
+    from .models import Event
+
+logger = logging.getLogger(__name__)
+
+
+class PublishError(Exception):
+    pass
+
+
+@lru_cache(maxsize=1)
+def get_engine() -> "Any":
+    """Streaming engine shared by all the publications of the process."""
+    from streaming.manager import initialize_engine
+
+    return initialize_engine()
+
+
+def url_message(event: "Event", dataset: "Dataset") -> "dict[str, Any]":
+    url_kwargs = {
+        "query__country_office__slug": event.query.country_office.slug,
+        "query": event.query.pk,
+    }
+    message = {
+        "url": build_absolute_uri(reverse("api:dataset-detail", kwargs=url_kwargs)),
+        "dataset": dataset.pk,
+        "content_hash": dataset.content_hash,
+    }
+    if event.office:
+        message["office_slug"] = event.office.slug
+    return message
+
+
+def data_messages(dataset: "Dataset") -> "Iterator[dict[str, Any]]":
+    header = {"dataset": dataset.pk, "content_hash": dataset.content_hash}
+    try:
+        rows = DatasetRows(dataset)
+    except ValueError:
+        data = dataset.data
+        if not isinstance(data, dict):
+            raise TypeError("Dataset must be a Dataset or dict")
+        yield {**header, "seq": 0, "chunks": 1, "data": data}
+        return
+    size = settings.STREAMING_CHUNK_ROWS
+    chunks = max(math.ceil(len(rows) / size), 1)
+    it = iter(rows)
+    for seq in range(chunks):
+        chunk = list(islice(it, size))
+        yield {**header, "seq": seq, "chunks": chunks, "data": json.dumps(chunk, cls=PQJSONEncoder)}
+
+
+def publish(event: "Event", dataset: "Dataset") -> int:
+    """Send the messages of `dataset` for `event`. Raise PublishError if the broker refuses one of them."""
+    from streaming.utils import make_event
+
+    messages = [url_message(event, dataset)] if event.publish_as_url else data_messages(dataset)
+    routing_key = event.get_routing_key()
+    engine = get_engine()
+    sent = 0
+    for message in messages:
+        if not engine.notify(routing_key, make_event(message=message)):
+            get_engine.cache_clear()
+            raise PublishError(f"Event notification failed for Dataset {dataset.pk} (message {sent})")
+        sent += 1
+    return sent
@@ -5,6 +5,7 @@ from django.contrib.auth.backends import BaseBackend
 from django.contrib.auth.models import Permission
 from django.db.models import Q, QuerySet
 
+from hope_country_report.apps.core.authz import get_authz
 from hope_country_report.apps.tenant.utils import get_selected_tenant
 from hope_country_report.state import state
 
@@ -24,14 +25,12 @@ class TenantBackend(BaseBackend):
             return set()
         if user.is_anonymous:
             return set()
-        perm_cache_name = f"_tenant_{str(tenant.pk)}_perm_cache"
-        if not hasattr(user, perm_cache_name):
-            qs = Permission.objects.all()
-            if not user.is_superuser:
-                qs = qs.filter(group__userrole__user=user, group__userrole__country_office=tenant)
-            perms = qs.values_list("content_type__app_label", "codename").order_by()
-            setattr(user, perm_cache_name, {f"{ct}.{name}" for ct, name in perms})
-        return getattr(user, perm_cache_name)
+        if not user.is_superuser:
+            return get_authz(user).permissions(tenant.pk)
+        if not hasattr(user, "_tenant_perm_cache"):
+            perms = Permission.objects.values_list("content_type__app_label", "codename").order_by()
+            setattr(user, "_tenant_perm_cache", {f"{ct}.{name}" for ct, name in perms})
+        return user._tenant_perm_cache
 
     def get_available_modules(self, user: "User") -> "set[str]":
         return {perm[: perm.index(".")] for perm in self.get_all_permissions(user)}
@@ -34,13 +34,15 @@ def is_tenant_valid() -> bool:
 
 
 def must_tenant() -> bool:
+    from hope_country_report.apps.core.authz import get_authz
+
     if state.must_tenant is None:
         if state.request is None:
             return False
 
         if state.request.user.is_anonymous or state.request.user.is_superuser:
             state.must_tenant = False
-        elif state.request.user.is_staff or state.request.user.roles.exists():
+        elif state.request.user.is_staff or get_authz(state.request.user).has_roles:
             state.must_tenant = True
         else:
             state.must_tenant = None
@@ -48,7 +50,9 @@ def must_tenant() -> bool:
 
 
 def get_tenant_cookie_from_request(request: "AuthHttpRequest") -> str | None:
-    if request and request.user.is_authenticated and request.user.roles.exists():
+    from hope_country_report.apps.core.authz import get_authz
+
+    if request and request.user.is_authenticated and get_authz(request.user).has_roles:
         signer = get_cookie_signer()
         cookie_value = request.COOKIES.get(conf.COOKIE_NAME)
         if cookie_value:
@@ -1,4 +1,6 @@
 from enum import Enum
+from pathlib import Path
+from tempfile import gettempdir
 
 from smart_env import SmartEnv
 
@@ -75,9 +77,24 @@ CONFIG = {
     "MEDIA_AZURE_ACCOUNT_NAME": (str, ""),
     "MEDIA_AZURE_AZURE_CONTAINER": (str, ""),
     "MEDIA_AZURE_SAS_TOKEN": (str, ""),
+    "MEDIA_DOWNLOAD_ACCEL_PREFIX": (str, "/protected/", "Internal location the web server maps to the media storage"),
+    "MEDIA_DOWNLOAD_OFFLOAD": (
+        str,
+        "",
+        "How document downloads are delivered: '' (streamed by Django), 'redirect', 'x-accel-redirect' or 'x-sendfile'",
+    ),
     "MEDIA_ROOT": (str, "/tmp/media/", setting("media-root")),
     "MEDIA_URL": (str, "/media/", setting("media-url")),
+    "METRICS_TOKEN": (str, "", "Bearer token Prometheus must send to scrape /metrics/. Empty: superusers only"),
+    "POWER_QUERY_ASSET_CACHE_DIR": (
+        str,
+        str(Path(gettempdir()) / "hcr-assets"),
+        "Directory of the on-disk cache of the resized photos used by PDF forms",
+    ),
     "POWER_QUERY_FLOWER_ADDRESS": (str, "http://localhost:5555", "Flower address"),
+    "POWER_QUERY_QUEUE_FAST": (str, "queue_hcr", "Celery queue of the Query/Report tasks expected to be fast"),
+    "POWER_QUERY_QUEUE_HEAVY": (str, "queue_hcr", "Celery queue of the Query/Report tasks expected to be slow"),
+    "POWER_QUERY_QUEUE_PDF": (str, "queue_hcr", "Celery queue of the Report tasks rendering PDF documents"),
     "SECRET_KEY": (str, NOT_SET, setting("secret-key")),
     "SECURE_HSTS_PRELOAD": (bool, True, setting("secure-hsts-preload")),
     "SECURE_HSTS_SECONDS": (int, 60, setting("secure-hsts-seconds")),
@@ -110,6 +127,7 @@ CONFIG = {
         False,
         "Broker URL for Streaming. Must be a RabbitMQ URL (amqp://) or console://.",
     ),
+    "STREAMING_CHUNK_ROWS": (int, 5000, "Rows per message when a Dataset is published to the streaming broker"),
     "TIME_ZONE": (str, "UTC", setting("std-setting-TIME_ZONE")),
     "WP_APPLICATION_SERVER_KEY": (str, ""),
     "WP_CLAIMS": (str, '{"sub": "mailto: hope@unicef.org","aud": "https://android.googleapis.com"}'),
@@ -1,3 +1,27 @@
+from ..settings import env
+
 REPORTERS_GROUP_NAME = "Reporters"
 
 TENANT_TENANT_MODEL = "core.CountryOffice"
+# seconds roles, group permissions and report restrictions are cached (see core.authz)
+AUTHZ_CACHE_TIMEOUT = 300
+
+# how document downloads are delivered once access has been checked:
+# "" streams them through Django, "redirect" sends the client to a short-lived storage URL,
+# "x-accel-redirect" (nginx) and "x-sendfile" (apache/lighttpd) hand the transfer to the web server
+MEDIA_DOWNLOAD_OFFLOAD = env("MEDIA_DOWNLOAD_OFFLOAD")
+MEDIA_DOWNLOAD_ACCEL_PREFIX = env("MEDIA_DOWNLOAD_ACCEL_PREFIX")
+MEDIA_DOWNLOAD_URL_EXPIRE = 300
+
+# bearer token Prometheus must send to scrape /metrics/ (superusers can always read it)
+METRICS_TOKEN = env("METRICS_TOKEN")
+
+# country boundaries served to the home page maps (see core.geo): simplification tolerance (degrees),
+# TopoJSON quantization and coordinate decimals of each `?zoom=` level
+GEO_ZOOM_LEVELS = {
+    "low": {"tolerance": 0.5, "quantization": 10_000, "precision": 2},
+    "medium": {"tolerance": 0.05, "quantization": 100_000, "precision": 3},
+    "high": {"tolerance": 0.005, "quantization": 1_000_000, "precision": 4},
+}
+GEO_DEFAULT_ZOOM = "medium"
+GEO_CACHE_TIMEOUT = 60 * 60 * 24 * 7
@@ -2,6 +2,8 @@ from .. import env  # type: ignore[attr-defined]
 
 CELERY_ACCEPT_CONTENT = ["pickle", "json", "application/text", "application/json"]
 # CELERY_BROKER_TRANSPORT_OPTIONS = {"visibility_timeout": int(CELERY_BROKER_VISIBILITY_VAR)}
+# redis priorities: the lowest step is consumed first (see POWER_QUERY_TASK_PRIORITIES)
+CELERY_BROKER_TRANSPORT_OPTIONS = {"priority_steps": [0, 3, 6, 9]}
 CELERY_BROKER_URL = env("CELERY_BROKER_URL")
 CELERY_BROKER_VISIBILITY_VAR = env("CELERY_VISIBILITY_TIMEOUT")
 
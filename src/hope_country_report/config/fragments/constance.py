@@ -27,6 +27,30 @@ CONSTANCE_CONFIG = {
     "MINIFY_RESPONSE": ([], "select minification modes", "html_minify_select"),
     "MINIFY_IGNORE_PATH": (r"", "regex for ignored path", str),
     "PQ_SAMPLE_PAGE_SIZE": (100, "PowerQuery sample page size", int),
+    "PQ_MATRIX_MAX_WORKERS": (
+        4,
+        "Upper bound of the argument-matrix cells a single Query can run concurrently against the HOPE database",
+        int,
+    ),
+    "PQ_PDF_WORKERS": (
+        1,
+        "Processes used to render PDF form records. 1 renders them in the celery worker process",
+        int,
+    ),
+    "PQ_THROTTLE_OFFICE_LIMIT": (
+        4,
+        "Queries of the same Country Office that can run at the same time. 0 = no limit",
+        int,
+    ),
+    "PQ_THROTTLE_MODEL_LIMIT": (0, "Queries on the same HOPE model that can run at the same time. 0 = no limit", int),
+    "PQ_THROTTLE_DB_LIMIT": (8, "Queries that can run at the same time against the HOPE database. 0 = no limit", int),
+    "PQ_THROTTLE_LEASE": (
+        3600,
+        "Seconds after which a concurrency slot held by a dead worker is released (renewed while held)",
+        int,
+    ),
+    "PQ_THROTTLE_BACKOFF": (30, "Base delay (seconds) before a throttled query task is retried", int),
+    "PQ_THROTTLE_MAX_RETRIES": (20, "Times a throttled query task is requeued before failing", int),
     "MAILJET_TEMPLATE_ZIP_PASSWORD": (
         env("MAILJET_TEMPLATE_ZIP_PASSWORD"),
         "Mailjet template ID used to send zip password for protected documents",
@@ -3,5 +3,60 @@ from ..settings import env
 POWER_QUERY_DB_ALIAS = "hope_ro"
 POWER_QUERY_EXTRA_CONNECTIONS = []
 POWER_QUERY_PROJECT_MODEL = "core.CountryOffice"
+# rows fetched per round trip when streaming QuerySet results through a server-side cursor
+POWER_QUERY_CURSOR_CHUNK_SIZE = 2000
+# rendered documents bigger than this are spooled to disk before being uploaded
+POWER_QUERY_SPOOL_MAX_SIZE = 10 * 1024 * 1024
+# documents of a report run stored together (one upsert), bytes of rendered files a batch can hold
+# before it is stored and threads uploading their files
+POWER_QUERY_DOCUMENT_BATCH_SIZE = 50
+POWER_QUERY_DOCUMENT_BATCH_MAX_SIZE = 64 * 1024 * 1024
+POWER_QUERY_UPLOAD_WORKERS = 8
+# resized beneficiary photos used by PDF forms: in-memory LRU entries, on-disk cache and download threads
+POWER_QUERY_ASSET_CACHE_SIZE = 512
+POWER_QUERY_ASSET_CACHE_DIR = env("POWER_QUERY_ASSET_CACHE_DIR")
+POWER_QUERY_ASSET_PREFETCH_WORKERS = 8
+# photos are personal data: seconds they stay in the on-disk cache and bytes it can hold
+POWER_QUERY_ASSET_CACHE_TTL = 60 * 60 * 24
+POWER_QUERY_ASSET_CACHE_MAX_DISK_SIZE = 512 * 1024 * 1024
+# parsed PDF form templates kept in memory by each process
+POWER_QUERY_FORM_TEMPLATE_CACHE_SIZE = 8
+# celery queues for Query/Report tasks by estimated cost (see power_query.routing).
+# They default to the main queue (queue_hcr): dedicated workers must consume them when they are split
+POWER_QUERY_TASK_QUEUES = {
+    "fast": env("POWER_QUERY_QUEUE_FAST"),
+    "heavy": env("POWER_QUERY_QUEUE_HEAVY"),
+    "pdf": env("POWER_QUERY_QUEUE_PDF"),
+}
+# celery priorities of the routes and the boost given to tasks queued by users. The broker is
+# Redis: priority 0 is consumed first and values are rounded down to the `priority_steps` set in
+# CELERY_BROKER_TRANSPORT_OPTIONS, the boost is subtracted (down to 0)
+POWER_QUERY_TASK_PRIORITIES = {"fast": 3, "heavy": 6, "pdf": 6}
+POWER_QUERY_INTERACTIVE_PRIORITY_BOOST = 3
+POWER_QUERY_FAST_TASK_SECONDS = 60
+# HOPE tables on which a sequential scan in a query plan raises a warning (see power_query.plan)
+POWER_QUERY_PLAN_LARGE_TABLES = [
+    "household_household",
+    "household_individual",
+    "household_individualroleinhousehold",
+    "household_document",
+    "payment_payment",
+]
+# SQL captured by utils.perf.profile: distinct statements tracked, statements reported
+# and executions of the same statement flagged as a probable N+1 pattern
+POWER_QUERY_PROFILE_MAX_FINGERPRINTS = 500
+POWER_QUERY_PROFILE_TOP = 20
+POWER_QUERY_PROFILE_N_PLUS_ONE = 20
+# report bundles: threads reading the member files ahead, seconds a stored bundle is reused
+# and number of stored bundles kept per report
+POWER_QUERY_BUNDLE_PREFETCH_WORKERS = 4
+POWER_QUERY_BUNDLE_CACHE_TIMEOUT = 60 * 60 * 24 * 7
+POWER_QUERY_BUNDLE_KEEP = 5
+# interrupted report runs are resumed (only missing documents are rendered) within this window
+POWER_QUERY_REPORT_RESUME_WINDOW = 60 * 60 * 6
+# a document unit STARTED by a worker that has not completed it in this time can be taken over
+POWER_QUERY_REPORT_UNIT_TIMEOUT = 60 * 30
+# seconds the series aggregated for a ChartPage are cached (keys change with the datasets content)
+POWER_QUERY_CHART_CACHE_TIMEOUT = 60 * 60 * 24
 POWER_QUERY_FLOWER_ADDRESS = env("POWER_QUERY_FLOWER_ADDRESS", default="http://localhost:5555")
 CELERY_BOOST_FLOWER = env("CELERY_BOOST_FLOWER", default="http://localhost:5555")
@@ -17,3 +17,7 @@ STREAMING = {
         }
     },
 }
+
+# rows per message when a Dataset is published (see stream.publisher)
+STREAMING_CHUNK_ROWS = env.int("STREAMING_CHUNK_ROWS")
+STREAMING_PUBLISH_MAX_RETRIES = 8
@@ -1,13 +1,23 @@
+import inspect
 import os
+import re
+from collections.abc import Iterator
+from datetime import datetime
 from pathlib import Path
 from wsgiref.util import FileWrapper
 
 from django.conf import settings
+from django.core.files import File
 from django.core.files.storage import Storage, default_storage
-from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.http import Http404, HttpRequest, HttpResponse, HttpResponseRedirect, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe
 
 THttpResponse = type[StreamingHttpResponse | HttpResponse]
 
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+CHUNK_SIZE = 64 * 1024
+
 
 def resource_path(path: str) -> Path:
     return Path(settings.PACKAGE_DIR) / path
@@ -28,3 +38,136 @@ def download_media(
         response["Content-Disposition"] = "inline; filename=" + os.path.basename(file_path)
         return response
     raise Http404(file_path)
+
+
+def parse_range(header: str, size: int) -> tuple[int, int] | None:
+    """
+    Return first and last (inclusive) byte positions of a single `bytes=` range header.
+
+    Multiple ranges, other units and syntactically invalid ranges are ignored (None): the whole file is served.
+    Raise ValueError when the range cannot be satisfied.
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        if last and int(last) < start:
+            return None
+        end = min(int(last), size - 1) if last else size - 1
+    else:
+        if not int(last):
+            raise ValueError(header)
+        start, end = max(size - int(last), 0), size - 1
+    if start >= size:
+        raise ValueError(header)
+    return start, end
+
+
+def iter_file(file: File, start: int = 0, length: int | None = None, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    file.open("rb")
+    try:
+        file.seek(start)
+        remaining = length
+        while remaining is None or remaining > 0:
+            data = file.read(chunk_size if remaining is None else min(chunk_size, remaining))
+            if not data:
+                break
+            if remaining is not None:
+                remaining -= len(data)
+            yield data
+    finally:
+        file.close()
+
+
+def storage_url(file: File) -> str:
+    """URL of `file` on its storage, short-lived when the storage can sign it (S3, Azure...)."""
+    storage = file.storage
+    if "expire" in inspect.signature(storage.url).parameters:
+        return storage.url(file.name, expire=settings.MEDIA_DOWNLOAD_URL_EXPIRE)
+    return storage.url(file.name)
+
+
+def serve_file(
+    request: HttpRequest,
+    file: File,
+    content_type: str,
+    filename: str | None = None,
+    as_attachment: bool = True,
+    etag: str | None = None,
+    last_modified: datetime | None = None,
+) -> HttpResponse | StreamingHttpResponse:
+    """
+    Serve a stored file honouring conditional GETs (ETag/Last-Modified) and single byte-range requests.
+
+    Depending on `MEDIA_DOWNLOAD_OFFLOAD` the transfer can be delegated to the storage (redirect to a signed URL)
+    or to the web server (X-Accel-Redirect/X-Sendfile). Callers are responsible for access checks.
+    Raise FileNotFoundError if the file does not exist.
+    """
+    offload = settings.MEDIA_DOWNLOAD_OFFLOAD
+    if offload == "redirect":
+        return HttpResponseRedirect(storage_url(file))
+
+    if etag and not etag.startswith(('"', 'W/"')):
+        etag = f'"{etag}"'
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+
+    def headers(response: HttpResponse) -> HttpResponse:
+        if etag:
+            response["ETag"] = etag
+        if last_modified:
+            response["Last-Modified"] = http_date(timestamp)
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    if conditional := get_conditional_response(request, etag=etag, last_modified=timestamp):
+        return headers(conditional)
+
+    if offload == "x-accel-redirect":
+        response = HttpResponse(content_type=content_type)
+        response["X-Accel-Redirect"] = f"{settings.MEDIA_DOWNLOAD_ACCEL_PREFIX.rstrip('/')}/{file.name}"
+    elif offload == "x-sendfile" and (path := _local_path(file)):
+        response = HttpResponse(content_type=content_type)
+        response["X-Sendfile"] = path
+    else:
+        size = file.size
+        byte_range = None
+        if (header := request.headers.get("Range")) and _if_range(request, etag, timestamp):
+            try:
+                byte_range = parse_range(header, size)
+            except ValueError:
+                response = HttpResponse(status=416)
+                response["Content-Range"] = f"bytes */{size}"
+                return headers(response)
+        if byte_range:
+            start, end = byte_range
+            response = StreamingHttpResponse(
+                iter_file(file, start, end - start + 1), status=206, content_type=content_type
+            )
+            response["Content-Range"] = f"bytes {start}-{end}/{size}"
+            response["Content-Length"] = str(end - start + 1)
+        else:
+            response = StreamingHttpResponse(iter_file(file), content_type=content_type)
+            response["Content-Length"] = str(size)
+        response["Accept-Ranges"] = "bytes"
+
+    if filename:
+        response["Content-Disposition"] = content_disposition_header(as_attachment, filename)
+    return headers(response)
+
+
+def _if_range(request: HttpRequest, etag: str | None, timestamp: int | None) -> bool:
+    """A Range header is honoured only if the `If-Range` validator, if any, still matches the file."""
+    if not (validator := request.headers.get("If-Range")):
+        return True
+    if validator.startswith(('"', 'W/"')):
+        return validator == etag and not validator.startswith("W/")
+    return timestamp is not None and parse_http_date_safe(validator) == timestamp
+
+
+def _local_path(file: File) -> str | None:
+    try:
+        return file.storage.path(file.name)
+    except NotImplementedError:
+        return None
@@ -0,0 +1,71 @@
+"""
+Prometheus histogram of the durations observed by `utils.perf.span`.
+
+Spans are timed in web and celery processes, so the histogram is aggregated in Redis
+(one hash per span name) and rendered in the Prometheus text format by the `/metrics/` view.
+Metrics are best effort: Redis errors are logged and never interrupt the measured code.
+"""
+
+import logging
+import math
+
+from django.conf import settings
+from redis import RedisError, StrictRedis
+
+logger = logging.getLogger(__name__)
+
+METRIC = "hcr_span_duration_seconds"
+BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 900, math.inf)
+NAMES_KEY = "hcr:metrics:spans"
+
+rds = StrictRedis(settings.REDIS_URL, decode_responses=True)
+
+
+def _key(name: str) -> str:
+    return f"hcr:metrics:span:{name}"
+
+
+def _le(bound: float) -> str:
+    return "+Inf" if bound == math.inf else str(bound)
+
+
+def observe(name: str, seconds: float) -> None:
+    bucket = next(b for b in BUCKETS if seconds <= b)
+    try:
+        with rds.pipeline(transaction=False) as pipe:
+            pipe.sadd(NAMES_KEY, name)
+            pipe.hincrbyfloat(_key(name), "sum", seconds)
+            pipe.hincrby(_key(name), "count", 1)
+            pipe.hincrby(_key(name), _le(bucket), 1)
+            pipe.execute()
+    except RedisError as e:
+        logger.warning(f"Unable to record metric {name}: {e}")
+
+
+def collect() -> "dict[str, dict[str, float]]":
+    names = sorted(rds.smembers(NAMES_KEY))
+    with rds.pipeline(transaction=False) as pipe:
+        for name in names:
+            pipe.hgetall(_key(name))
+        values = pipe.execute()
+    return {name: {k: float(v) for k, v in data.items()} for name, data in zip(names, values, strict=True)}
+
+
+def render() -> str:
+    lines = [
+        f"# HELP {METRIC} Duration of query, report and storage phases",
+        f"# TYPE {METRIC} histogram",
+    ]
+    for name, data in collect().items():
+        cumulative = 0
+        for bound in BUCKETS:
+            cumulative += int(data.get(_le(bound), 0))
+            lines.append(f'{METRIC}_bucket{{span="{name}",le="{_le(bound)}"}} {cumulative}')
+        lines.append(f'{METRIC}_sum{{span="{name}"}} {data.get("sum", 0.0)}')
+        lines.append(f'{METRIC}_count{{span="{name}"}} {int(data.get("count", 0))}')
+    return "\n".join(lines) + "\n"
+
+
+def reset() -> None:
+    names = rds.smembers(NAMES_KEY)
+    rds.delete(NAMES_KEY, *[_key(name) for name in names])
@@ -1,23 +1,57 @@
 import contextlib
+import hashlib
+import re
 import resource
 import time
+from contextvars import ContextVar
 from typing import TYPE_CHECKING
 
+import sentry_sdk
 from django.conf import settings
 from django.db import connections
 
+from .metrics import observe
+
 if TYPE_CHECKING:
-    from collections.abc import Iterator
+    from collections.abc import Iterable, Iterator
     from typing import Any
 
+_trace: "ContextVar[tuple[float, list[dict[str, Any]]]|None]" = ContextVar("perf_trace", default=None)
+_parent: "ContextVar[str|None]" = ContextVar("perf_span", default=None)
+
+
+_NORMALIZE = (
+    (re.compile(r"'(?:[^']|'')*'"), "?"),
+    (re.compile(r"\b\d+(?:\.\d+)?\b"), "?"),
+    (re.compile(r"%s|%\(\w+\)s"), "?"),
+    (re.compile(r"\s+"), " "),
+    (re.compile(r"\bIN \((?:\?, )*\?\)", re.IGNORECASE), "IN (...)"),
+    (re.compile(r"(\((?:\?, )*\?\))(?:, \((?:\?, )*\?\))+"), r"\1, ..."),
+)
+
+
+def fingerprint(sql: str) -> str:
+    """Normalise a statement so that executions differing only by their parameters compare equal."""
+    for pattern, replacement in _NORMALIZE:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip()
+
 
 class DBMetrics:
+    """
+    Aggregate the statements executed on a connection by fingerprint.
+
+    Only the first execution of each fingerprint is rendered as SQL (`sample`). At most
+    `POWER_QUERY_PROFILE_MAX_FINGERPRINTS` are tracked: statements beyond that are only counted.
+    """
+
     def __init__(self, db_alias: str) -> None:
         self.db_alias = db_alias
         self.conn = connections[self.db_alias]
         self.count = 0
         self.elapsed_query_time = 0.0
-        self.clauses = []
+        self.untracked = 0
+        self.fingerprints: "dict[str, dict[str, Any]]" = {}
 
     def __call__(self, execute: "Any", sql: "Any", params: "Any", many: "Any", context: "Any") -> "Any":
         start_time = time.time()
@@ -25,9 +59,105 @@ class DBMetrics:
         try:
             return execute(sql, params, many, context)
         finally:
-            self.clauses.append(self.conn.ops.compose_sql(str(sql), params))
+            elapsed = time.time() - start_time
             self.count += 1
-            self.elapsed_query_time += time.time() - start_time
+            self.elapsed_query_time += elapsed
+            self.record(str(sql), params, elapsed)
+
+    def record(self, sql: str, params: "Any", elapsed: float) -> None:
+        key = fingerprint(sql)
+        if (entry := self.fingerprints.get(key)) is None:
+            if len(self.fingerprints) >= settings.POWER_QUERY_PROFILE_MAX_FINGERPRINTS:
+                self.untracked += 1
+                return
+            sample = self.conn.ops.compose_sql(sql, params)
+            entry = self.fingerprints[key] = {"count": 0, "time": 0.0, "max": 0.0, "sample": sample}
+        entry["count"] += 1
+        entry["time"] += elapsed
+        entry["max"] = max(entry["max"], elapsed)
+
+    def summary(self) -> "dict[str, Any]":
+        """Totals and the `POWER_QUERY_PROFILE_TOP` most expensive fingerprints.
+
+        Fingerprints executed at least `POWER_QUERY_PROFILE_N_PLUS_ONE` times are flagged as
+        probable N+1 patterns (a statement issued once per row of another one).
+        """
+        top = sorted(self.fingerprints.items(), key=lambda item: item[1]["time"], reverse=True)
+        top = top[: settings.POWER_QUERY_PROFILE_TOP]
+        statements = [
+            {
+                "fingerprint": hashlib.md5(key.encode()).hexdigest()[:12],
+                **entry,
+                "n_plus_one": entry["count"] >= settings.POWER_QUERY_PROFILE_N_PLUS_ONE,
+            }
+            for key, entry in top
+        ]
+        return {
+            "count": self.count,
+            "time": self.elapsed_query_time,
+            "distinct": len(self.fingerprints),
+            "untracked": self.untracked,
+            "n_plus_one": [s["fingerprint"] for s in statements if s["n_plus_one"]],
+            "statements": statements,
+            "queries": [s["sample"] for s in statements],
+        }
+
+
+@contextlib.contextmanager
+def trace() -> "Iterator[list[dict[str, Any]]]":
+    """Collect the spans completed in the block. The list is filled as spans end.
+
+    Nested traces share the list of the outermost one.
+    """
+    if (current := _trace.get()) is not None:
+        yield current[1]
+        return
+    spans: "list[dict[str, Any]]" = []
+    token = _trace.set((time.perf_counter(), spans))
+    try:
+        yield spans
+    finally:
+        _trace.reset(token)
+
+
+@contextlib.contextmanager
+def span(name: str, **attributes: "Any") -> "Iterator[dict[str, Any]]":
+    """
+    Time a phase of query/report processing.
+
+    The span is sent to Sentry tracing, its duration is observed by the `hcr_span_duration_seconds`
+    Prometheus histogram and it is appended to the enclosing `trace()`/`profile()`, if any.
+    """
+    record: "dict[str, Any]" = {"name": name, "parent": _parent.get(), "attributes": attributes}
+    token = _parent.set(name)
+    start = time.perf_counter()
+    with sentry_sdk.start_span(op=f"hcr.{name}", name=name) as sentry_span:
+        for key, value in attributes.items():
+            sentry_span.set_data(key, value)
+        try:
+            yield record
+        except BaseException as e:
+            record["error"] = e.__class__.__name__
+            raise
+        finally:
+            _parent.reset(token)
+            record["duration"] = time.perf_counter() - start
+            if (current := _trace.get()) is not None:
+                origin, spans = current
+                record["offset"] = start - origin
+                spans.append(record)
+            observe(name, record["duration"])
+
+
+def summarize_spans(spans: "Iterable[dict[str, Any]]") -> "list[dict[str, Any]]":
+    """Count, total and max duration of spans by name, most expensive first."""
+    summary: "dict[str, dict[str, Any]]" = {}
+    for record in spans:
+        entry = summary.setdefault(record["name"], {"name": record["name"], "count": 0, "total": 0.0, "max": 0.0})
+        entry["count"] += 1
+        entry["total"] += record["duration"]
+        entry["max"] = max(entry["max"], record["duration"])
+    return sorted(summary.values(), key=lambda e: e["total"], reverse=True)
 
 
 @contextlib.contextmanager
@@ -37,9 +167,11 @@ def profile() -> "Iterator[Any]":
     info: "dict[str,Any]" = {"time_start": time_start, "time_end": "N/A"}
     metrics1 = DBMetrics("default")
     metrics2 = DBMetrics(settings.POWER_QUERY_DB_ALIAS)
-    with connections["default"].execute_wrapper(metrics1):
-        with connections[settings.POWER_QUERY_DB_ALIAS].execute_wrapper(metrics2):
-            yield info
+    with trace() as spans:
+        info["spans"] = spans
+        with connections["default"].execute_wrapper(metrics1):
+            with connections[settings.POWER_QUERY_DB_ALIAS].execute_wrapper(metrics2):
+                yield info
     time_end = time.perf_counter()
     time_elapsed = time_end - time_start
     mem_end = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0 / 1024.0
@@ -47,12 +179,6 @@ def profile() -> "Iterator[Any]":
     info["time_elapsed"] = time_elapsed
     info["memory"] = mem_end - mem_start
     info["db"] = {
-        "default": {
-            "count": metrics1.count,
-            "queries": metrics1.clauses,
-        },
-        settings.POWER_QUERY_DB_ALIAS: {
-            "count": metrics2.count,
-            "queries": metrics2.clauses,
-        },
+        "default": metrics1.summary(),
+        settings.POWER_QUERY_DB_ALIAS: metrics2.summary(),
     }
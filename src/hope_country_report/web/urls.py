@@ -4,8 +4,10 @@ from django.urls import path
 from django.views.generic import TemplateView
 
 from .views import (
+    ChartDataView,
     ChartDetailView,
     ChartListView,
+    OfficeConfigurationBundleView,
     OfficeConfigurationDetailView,
     OfficeConfigurationListView,
     OfficeConfigurationRunView,
@@ -21,6 +23,7 @@ from .views import (
     UserProfileView,
     download,
     index,
+    metrics,
     select_tenant,
 )
 from .views.base import OfficeTemplateView
@@ -31,11 +34,13 @@ urlpatterns = [
     path("login/", LoginView.as_view(), name="login"),
     path("profile/", UserProfileView.as_view(), name="user-profile"),
     path("select-tenant/", select_tenant, name="select-tenant"),
+    path("metrics/", metrics, name="metrics"),
     path("<slug:co>/request-access/<int:id>/", RequestAccessView.as_view(), name="request-access"),
     path("<slug:co>/", OfficeHomeView.as_view(), name="office-index"),
     path("<slug:co>/map/", OfficeMapView.as_view(), name="office-map"),
     path("<slug:co>/charts/", ChartListView.as_view(), name="office-chart-list"),
     path("<slug:co>/charts/<int:pk>/", ChartDetailView.as_view(), name="office-chart"),
+    path("<slug:co>/charts/<int:pk>/data/", ChartDataView.as_view(), name="office-chart-data"),
     path("<slug:co>/world/", OfficeTemplateView.as_view(template_name="web/office/world.html"), name="office-world"),
     # path("<slug:co>/users/", OfficeUserListView.as_view(), name="office-users"),
     path("<slug:co>/pages/", OfficePageListView.as_view(), name="office-pages"),
@@ -43,6 +48,9 @@ urlpatterns = [
     path("<slug:co>/configurations/", OfficeConfigurationListView.as_view(), name="office-config-list"),
     path("<slug:co>/configuration/<int:pk>/", OfficeConfigurationDetailView.as_view(), name="office-config"),
     path("<slug:co>/configuration/<int:pk>/run/", OfficeConfigurationRunView.as_view(), name="office-config-run"),
+    path(
+        "<slug:co>/configuration/<int:pk>/bundle/", OfficeConfigurationBundleView.as_view(), name="office-config-bundle"
+    ),
     path("<slug:co>/docs/", OfficeReportDocumentListView.as_view(), name="office-doc-list"),
     path("<slug:co>/doc/<int:pk>/", OfficeReportDocumentDetailView.as_view(), name="office-doc"),
     path("<slug:co>/doc/<int:pk>/view/", OfficeDocumentDisplayView.as_view(), name="office-doc-display"),
@@ -1,4 +1,4 @@
-from .charts import ChartDetailView, ChartListView  # noqa
+from .charts import ChartDataView, ChartDetailView, ChartListView  # noqa
 from .document import (  # noqa
     OfficeDocumentDisplayView,
     OfficeDocumentDownloadView,
@@ -9,11 +9,17 @@ from .document import (  # noqa
 from .generic import (  # noqa
     download,
     index,
+    metrics,
     OfficeHomeView,
     OfficeMapView,
     OfficePageListView,
     OfficePreferencesView,
     select_tenant,
 )
-from .report import OfficeConfigurationDetailView, OfficeConfigurationListView, OfficeConfigurationRunView  # noqa
+from .report import (  # noqa
+    OfficeConfigurationBundleView,
+    OfficeConfigurationDetailView,
+    OfficeConfigurationListView,
+    OfficeConfigurationRunView,
+)
 from .user import UserProfileView  # noqa
@@ -1,10 +1,14 @@
 from typing import Any, Callable
 
 from django.contrib.auth.mixins import PermissionRequiredMixin
+from django.core.exceptions import ValidationError
 from django.db.models.query import QuerySet
-from django.http import HttpResponseBase
+from django.http import HttpRequest, HttpResponse, HttpResponseBase, JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
 from django.views.generic import DetailView, ListView
 
+from hope_country_report.apps.power_query.aggregation import chart_series
+from hope_country_report.apps.power_query.json import PQJSONEncoder
 from hope_country_report.apps.power_query.utils import to_dataset
 
 from ...apps.power_query.models import ChartPage
@@ -39,7 +43,11 @@ class ChartDetailView(SelectedOfficeMixin, PermissionRequiredMixin, DetailView[C
         context = super().get_context_data(**kwargs)
         chart_page = self.object
         context["title"] = chart_page.title
-        if chart_page.query:
+        if chart_page.params.get("dimensions") or chart_page.params.get("measures"):
+            # series are aggregated server side and fetched from ChartDataView
+            context["data_url"] = chart_page.get_data_url()
+            context["json_data"] = None
+        elif chart_page.query:
             all_data = []
             for dataset in chart_page.query.datasets.all():
                 all_data.extend(dataset.data)  # Assuming 'data' is a list-like structure
@@ -48,3 +56,29 @@ class ChartDetailView(SelectedOfficeMixin, PermissionRequiredMixin, DetailView[C
         else:
             context["json_data"] = None
         return context
+
+
+class ChartDataView(SelectedOfficeMixin, PermissionRequiredMixin, DetailView[ChartPage]):
+    """Series of a chart aggregated server side, as declared in `ChartPage.params`."""
+
+    permission_required = ["power_query.view_chartpage"]
+    model = ChartPage
+
+    def get_queryset(self) -> QuerySet[ChartPage]:
+        return super().get_queryset().filter(country_office=self.selected_office).select_related("query")
+
+    def get(self, request: HttpRequest, *args: Any, **kwargs: Any) -> HttpResponse:
+        chart_page: ChartPage = self.get_object()
+        try:
+            if not (spec := chart_page.aggregation):
+                return JsonResponse({"detail": "Chart does not declare dimensions or measures"}, status=400)
+            data, etag = chart_series(chart_page, spec)
+        except ValidationError as e:
+            return JsonResponse({"detail": e.messages}, status=400)
+        except KeyError as e:
+            return JsonResponse({"detail": f"Unknown column(s): {e.args[0]}"}, status=400)
+        etag = f'"{etag}"'
+        response = get_conditional_response(request, etag=etag) or JsonResponse(data, encoder=PQJSONEncoder)
+        response["ETag"] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
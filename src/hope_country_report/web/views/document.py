@@ -5,7 +5,7 @@ from adminfilters.utils import parse_bool
 from django.contrib import messages
 from django.contrib.auth.mixins import PermissionRequiredMixin
 from django.core.exceptions import PermissionDenied
-from django.http import HttpRequest, HttpResponse, HttpResponseRedirect, StreamingHttpResponse
+from django.http import HttpRequest, HttpResponse, HttpResponseRedirect
 from django.shortcuts import get_object_or_404
 from django.urls import reverse
 from django.utils.translation import gettext_lazy as _
@@ -13,8 +13,9 @@ from django.views.generic import DetailView, ListView
 from django.views.generic.edit import FormView
 
 from hope_country_report.apps.power_query.exceptions import RequestablePermissionDenied
-from hope_country_report.apps.power_query.models import ReportConfiguration, ReportDocument
+from hope_country_report.apps.power_query.models import ReportConfiguration, ReportDocument, ReportDocumentIndex
 from hope_country_report.utils.mail import send_request_access
+from hope_country_report.utils.media import serve_file
 from hope_country_report.web.forms import RequestAccessForm
 
 from .base import SelectedOfficeMixin
@@ -30,7 +31,7 @@ if TYPE_CHECKING:
     _M = TypeVar("_M", bound=Model, covariant=True)
 
 
-class OfficeReportDocumentListView(SelectedOfficeMixin, PermissionRequiredMixin, ListView[ReportDocument]):
+class OfficeReportDocumentListView(SelectedOfficeMixin, PermissionRequiredMixin, ListView[ReportDocumentIndex]):
     template_name = "web/office/document_list.html"
     permission_required = ["power_query.view_reportdocument"]
 
@@ -38,14 +39,14 @@ class OfficeReportDocumentListView(SelectedOfficeMixin, PermissionRequiredMixin,
         return super().get_context_data(title=_("Available Reports"), **kwargs)
 
     def get_queryset(self) -> "_SupportsPagination[_M]":
-        qs = ReportDocument.objects.filter(report__country_office=self.selected_office)
+        qs = ReportDocumentIndex.objects.filter(country_office=self.selected_office)
         if tag := self.request.GET.get("tag", None):
-            qs = qs.filter(report__tags__name=tag)
+            qs = qs.filter(tags__contains=[tag])
         if active := self.request.GET.get("active", None):
-            qs = qs.filter(report__active=parse_bool(active))
+            qs = qs.filter(active=parse_bool(active))
         if report := self.request.GET.get("report", None):
-            qs = qs.filter(report__name=report)
-        return qs.distinct("report", "dataset")
+            qs = qs.filter(report_name=report)
+        return qs.order_by("-updated_on")
 
 
 class OfficeReportDocumentDetailView(SelectedOfficeMixin, PermissionRequiredMixin, DetailView[ReportDocument]):
@@ -91,7 +92,15 @@ class OfficeDocumentDisplayView(SelectedOfficeMixin, PermissionRequiredMixin, De
             doc: ReportDocument = self.get_object()
             if not doc.file.size:
                 raise FileNotFoundError
-            return StreamingHttpResponse(doc.file, content_type=doc.content_type)
+            return serve_file(
+                request,
+                doc.file,
+                doc.content_type,
+                filename=f"{doc.title}{doc.file_suffix}",
+                as_attachment=False,
+                etag=doc.etag,
+                last_modified=doc.updated_on,
+            )
         except FileNotFoundError:
             messages.error(request, _("File not found."))
             return HttpResponseRedirectToReferrer(request)
@@ -108,9 +117,14 @@ class OfficeDocumentDownloadView(SelectedOfficeMixin, PermissionRequiredMixin, D
             doc: ReportDocument = self.get_object()
             if not doc.file.size:
                 raise FileNotFoundError
-            response = StreamingHttpResponse(doc.file, content_type="application/force-download")
-            response["Content-Disposition"] = f"attachment; filename= {doc.title}{doc.file_suffix}"
-            return response
+            return serve_file(
+                request,
+                doc.file,
+                "application/force-download",
+                filename=f"{doc.title}{doc.file_suffix}",
+                etag=doc.etag,
+                last_modified=doc.updated_on,
+            )
         except FileNotFoundError:
             messages.error(request, _("File not found."))
             return HttpResponseRedirectToReferrer(request)
@@ -2,12 +2,15 @@ import datetime
 from typing import TYPE_CHECKING, Any, TypeVar
 from urllib.parse import urlparse
 
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import PermissionRequiredMixin
+from django.core.exceptions import PermissionDenied
 from django.http import HttpRequest, HttpResponse, HttpResponseRedirect, StreamingHttpResponse
 from django.shortcuts import redirect, render
 from django.urls import resolve, reverse
+from django.utils.crypto import constant_time_compare
 from django.utils.safestring import mark_safe
 from django.utils.translation import gettext_lazy as _
 from django.views import View
@@ -19,6 +22,7 @@ from hope_country_report.apps.core.models import CountryOffice, User
 from hope_country_report.apps.tenant.forms import SelectTenantForm
 from hope_country_report.apps.tenant.utils import set_selected_tenant
 from hope_country_report.utils.media import download_media
+from hope_country_report.utils.metrics import render as render_metrics
 
 from .base import SelectedOfficeMixin
 
@@ -35,6 +39,15 @@ def index(request: "HttpRequest") -> "HttpResponse":
     return redirect("select-tenant")
 
 
+def metrics(request: "HttpRequest") -> "HttpResponse":
+    """Prometheus scrape endpoint. Requires the `METRICS_TOKEN` bearer token or a superuser session."""
+    token = settings.METRICS_TOKEN
+    authorization = request.headers.get("Authorization", "")
+    if not (request.user.is_superuser or (token and constant_time_compare(authorization, f"Bearer {token}"))):
+        raise PermissionDenied
+    return HttpResponse(render_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 class SimpleView(View):
     content = "Ok"
 
@@ -2,13 +2,22 @@ from typing import TYPE_CHECKING, Any, TypeVar
 
 from adminfilters.utils import parse_bool
 from django.contrib.auth.mixins import PermissionRequiredMixin
+from django.core.cache import cache
 from django.db.models import Count, F
-from django.http import JsonResponse
+from django.http import Http404, HttpRequest, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.functional import cached_property
+from django.utils.http import content_disposition_header, quote_etag
 from django.utils.translation import gettext_lazy as _
 from django.views import View
 from django.views.generic import DetailView, ListView
 
+from hope_country_report.apps.core.authz import get_authz
+from hope_country_report.apps.power_query import bundle
+from hope_country_report.apps.power_query.celery_tasks import store_report_bundle
+from hope_country_report.apps.power_query.exceptions import RequestablePermissionDenied
 from hope_country_report.apps.power_query.models import ReportConfiguration
+from hope_country_report.utils.media import serve_file
 
 from .base import SelectedOfficeMixin
 
@@ -121,7 +130,7 @@ class OfficeConfigurationDetailView(SelectedOfficeMixin, PermissionRequiredMixin
     context_object_name = "config"
 
     def get_context_data(self, **kwargs: Any) -> dict[str, Any]:
-        return super().get_context_data(title=self.object.title, **kwargs)
+        return super().get_context_data(title=self.object.title, progress=self.object.progress, **kwargs)
 
     def get_object(self, queryset: "QuerySet[_M]|None" = None) -> "_M":
         return ReportConfiguration.objects.get(country_office=self.selected_office, id=self.kwargs["pk"])
@@ -141,5 +150,51 @@ class OfficeConfigurationRunView(SelectedOfficeMixin, PermissionRequiredMixin, V
                 {"status": "error", "message": _("Report is already running.")},
                 status=409,  # Conflict
             )
-        report.queue()
+        report.queue(interactive=True)
         return JsonResponse({"status": "ok", "message": _("Report task queued.")})
+
+
+class OfficeConfigurationBundleView(SelectedOfficeMixin, PermissionRequiredMixin, View):
+    """
+    Download the current documents of a report as a single zip.
+
+    Query string parameters filter the documents by their arguments (ie. `?district=3`); parameters
+    that are not an argument of the report documents are ignored.
+    """
+
+    permission_required = ["power_query.download_reportdocument"]
+    http_method_names = ["get"]
+
+    @cached_property
+    def report(self) -> "ReportConfiguration":
+        return ReportConfiguration.objects.get(country_office=self.selected_office, id=self.kwargs["pk"])
+
+    def has_permission(self) -> bool:
+        user = self.request.user
+        if not user.has_perms(self.get_permission_required(), self.report):
+            return False
+        if user.is_superuser or user.pk == self.report.owner_id:
+            return True
+        if not get_authz(user).can_access_report(self.report.pk):
+            raise RequestablePermissionDenied(self.report)
+        return True
+
+    def get(self, request: HttpRequest, *args: Any, **kwargs: Any) -> "HttpResponse|StreamingHttpResponse":
+        documents = bundle.get_documents(self.report, request.GET.dict())
+        if not documents:
+            raise Http404(_("No documents available"))
+        etag = bundle.get_etag(documents)
+        filename = f"{self.report.name or self.report.pk}.zip"
+        if stored := bundle.get_stored(self.report, etag):
+            return serve_file(request, stored, "application/zip", filename=filename, etag=etag)
+
+        if conditional := get_conditional_response(request, etag=quote_etag(etag)):
+            response = conditional
+        else:
+            if cache.add(f"bundle:{bundle.storage_name(self.report, etag)}", "queued", 60 * 10):
+                store_report_bundle.delay(self.report.pk, [doc.pk for doc in documents], etag)
+            response = StreamingHttpResponse(bundle.stream(documents), content_type="application/zip")
+            response["Content-Disposition"] = content_disposition_header(True, filename)
+        response["ETag"] = quote_etag(etag)
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
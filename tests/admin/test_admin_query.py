@@ -1,4 +1,5 @@
 from typing import TYPE_CHECKING
+from unittest import mock
 
 import pytest
 from django.contrib.contenttypes.models import ContentType
@@ -129,3 +130,23 @@ def test_query_preview_exception(query_exception, django_app, admin_user):
     assert "/select-tenant/" in res_follow1.location
     res_follow2 = res_follow1.follow()
     assert res_follow2.status_code == 200
+
+
+@pytest.mark.django_db()
+def test_query_save_queues_plan(admin_user, query: "Query", django_capture_on_commit_callbacks):
+    from django.contrib.admin.sites import site
+
+    from hope_country_report.apps.power_query.models import Query
+
+    model_admin = site._registry[Query]
+    with (
+        mock.patch("hope_country_report.apps.power_query.admin.plan_query") as plan_query,
+        mock.patch.object(Query, "update_plan") as update_plan,
+        mock.patch.object(model_admin, "message_user"),
+        django_capture_on_commit_callbacks(execute=True),
+    ):
+        model_admin.save_model(mock.Mock(user=admin_user), query, mock.Mock(changed_data=["name"]), True)
+        plan_query.delay.assert_not_called()
+        model_admin.save_model(mock.Mock(user=admin_user), query, mock.Mock(changed_data=["code"]), True)
+    update_plan.assert_not_called()
+    plan_query.delay.assert_called_once_with(query.pk)
@@ -68,6 +68,41 @@ def test_api_boundaries(client, data):
     assert res.json()
 
 
+@pytest.fixture()
+def shape(db):
+    from django.contrib.gis.geos import MultiPolygon, Polygon
+    from testutils.factories import CountryShapeFactory
+
+    ring = ((60.0, 29.0), (60.0001, 29.5), (61.123456, 29.0001), (75.0, 38.0), (60.0, 29.0))
+    return CountryShapeFactory(mpoly=MultiPolygon(Polygon(ring)))
+
+
+@pytest.mark.parametrize("url", ["/api/home/topology/", "/api/home/boundaries/"])
+def test_api_geo_etag(client, shape, url):
+    res = client.get(url, {"zoom": "low"})
+    assert res.status_code == 200
+    etag = res["ETag"]
+
+    res = client.get(url, {"zoom": "low"}, HTTP_IF_NONE_MATCH=etag)
+    assert res.status_code == 304
+
+    shape.name = "Renamed"
+    shape.save()
+    res = client.get(url, {"zoom": "low"}, HTTP_IF_NONE_MATCH=etag)
+    assert res.status_code == 200
+    assert res["ETag"] != etag
+
+
+def test_api_geo_zoom(client, shape):
+    low = client.get("/api/home/boundaries/", {"zoom": "low"}).json()
+    high = client.get("/api/home/boundaries/", {"zoom": "high"}).json()
+    assert low["features"][0]["properties"]["iso3"] == "AFG"
+    assert len(str(low)) < len(str(high))
+
+    res = client.get("/api/home/boundaries/", {"zoom": "max"})
+    assert res.status_code == 400
+
+
 def test_api_offices(client, data):
     url = "/api/home/offices/"
     res = client.get(url)
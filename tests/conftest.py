@@ -244,6 +244,8 @@ def mocked_responses():
 def state_context(db):
     from testutils.utils import set_flag
 
+    from hope_country_report.apps.core import geo
+    from hope_country_report.apps.core.authz import invalidate_all
     from hope_country_report.apps.core.utils import get_or_create_reporter_group
     from hope_country_report.apps.power_query.defaults import create_defaults, create_periodic_tasks
     from hope_country_report.config.celery import app
@@ -254,6 +256,8 @@ def state_context(db):
     get_or_create_reporter_group()
 
     app.control.purge()
+    invalidate_all()
+    geo.invalidate()
     set_flag("LOCAL_LOGIN", True).start()
     with state.configure():
         yield
@@ -0,0 +1,81 @@
+from typing import TYPE_CHECKING
+
+import pytest
+from testutils.perms import user_grant_permissions
+
+from hope_country_report.apps.core.authz import get_authz, invalidate_all
+from hope_country_report.state import state
+
+if TYPE_CHECKING:
+    from hope_country_report.apps.core.models import CountryOffice, User
+
+
+@pytest.fixture()
+def office(db) -> "CountryOffice":
+    from testutils.factories import CountryOfficeFactory
+
+    return CountryOfficeFactory()
+
+
+@pytest.fixture()
+def req(rf):
+    request = rf.get("/")
+    with state.set(request=request):
+        yield request
+
+
+def test_get_authz(user: "User", office: "CountryOffice") -> None:
+    assert not get_authz(user).has_roles
+    with user_grant_permissions(user, "power_query.view_reportdocument", office):
+        authz = get_authz(user)
+        assert authz.has_roles
+        assert authz.permissions(office.pk) == {"power_query.view_reportdocument"}
+        assert authz.permissions(-1) == set()
+    assert not get_authz(user).has_roles
+
+
+def test_get_authz_cached(user: "User", office: "CountryOffice", req, django_assert_num_queries) -> None:
+    with user_grant_permissions(user, "power_query.view_reportdocument", office):
+        with django_assert_num_queries(1):
+            get_authz(user)
+        with django_assert_num_queries(0):
+            assert get_authz(user) is get_authz(user)
+
+        req.__dict__.pop("_authz")
+        with django_assert_num_queries(0):
+            assert get_authz(user).permissions(office.pk) == {"power_query.view_reportdocument"}
+
+        invalidate_all()
+        with django_assert_num_queries(1):
+            get_authz(user)
+
+
+def test_can_access_report(user: "User", django_assert_num_queries) -> None:
+    from testutils.factories import ReportConfigurationFactory, UserFactory
+
+    report = ReportConfigurationFactory()
+    assert get_authz(user).can_access_report(report.pk)
+
+    report.limit_access_to.add(UserFactory())
+    assert not get_authz(user).can_access_report(report.pk)
+
+    report.limit_access_to.add(user)
+    authz = get_authz(user)
+    assert authz.can_access_report(report.pk)
+    with django_assert_num_queries(0):
+        assert authz.can_access_report(report.pk)
+
+
+def test_role_moved_to_other_user(user: "User", office: "CountryOffice") -> None:
+    from testutils.factories import GroupFactory, UserFactory
+
+    from hope_country_report.apps.core.models import UserRole
+
+    role = UserRole.objects.create(user=user, group=GroupFactory(), country_office=office)
+    assert get_authz(user).has_roles
+
+    other = UserFactory()
+    role.user = other
+    role.save()
+    assert not get_authz(user).has_roles
+    assert get_authz(other).has_roles
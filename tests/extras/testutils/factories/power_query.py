@@ -13,6 +13,7 @@ from hope_country_report.apps.power_query.models import (
     Query,
     ReportConfiguration,
     ReportDocument,
+    ReportDocumentIndex,
     ReportTemplate,
 )
 from hope_country_report.apps.power_query.processors import ToHTML
@@ -132,6 +133,18 @@ class ReportDocumentFactory(AutoRegisterModelFactory):
         return ret
 
 
+class ReportDocumentIndexFactory(AutoRegisterModelFactory):
+    document = factory.SubFactory(ReportDocumentFactory)
+    report = factory.SelfAttribute("document.report")
+    country_office = factory.SelfAttribute("document.report.country_office")
+    dataset_ref = factory.SelfAttribute("document.dataset_id")
+    title = factory.SelfAttribute("document.title")
+
+    class Meta:
+        model = ReportDocumentIndex
+        django_get_or_create = ("report", "dataset_ref")
+
+
 class ParametrizerFactory(AutoRegisterModelFactory):
     code = factory.Sequence(lambda n: f"params-{n}")
     source = None
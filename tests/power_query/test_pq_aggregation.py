@@ -0,0 +1,86 @@
+from typing import TYPE_CHECKING
+
+import pytest
+from django.core.exceptions import ValidationError
+from django.urls import reverse
+
+from hope_country_report.apps.power_query.aggregation import aggregate, chart_series, parse
+
+if TYPE_CHECKING:
+    from hope_country_report.apps.power_query.models import ChartPage
+
+ROWS = [
+    {"region": "north", "sex": "F", "size": 3},
+    {"region": "north", "sex": "M", "size": 5},
+    {"region": "south", "sex": "F", "size": 2},
+    {"region": "south", "sex": "F", "size": None},
+]
+
+
+@pytest.fixture()
+def chart(db) -> "ChartPage":
+    from testutils.factories import ChartPageFactory, DatasetFactory
+
+    chart = ChartPageFactory(
+        params={
+            "dimensions": ["region"],
+            "measures": [{"op": "sum", "column": "size", "as": "members"}, "count"],
+        }
+    )
+    DatasetFactory(query=chart.query, hash="ds-1", data=ROWS[:2])
+    DatasetFactory(query=chart.query, hash="ds-2", data=ROWS[2:])
+    return chart
+
+
+def test_parse() -> None:
+    assert parse({}) is None
+    assert parse({"dimensions": ["a"]})["measures"] == [{"op": "count", "column": None, "as": "count"}]
+    spec = parse({"measures": [{"op": "avg", "column": "size"}], "filters": [["sex", "F"]]})
+    assert spec["measures"] == [{"op": "avg", "column": "size", "as": "avg_size"}]
+    assert spec["filters"] == [("sex", "F")]
+    with pytest.raises(ValidationError):
+        parse({"measures": [{"op": "median", "column": "size"}]})
+    with pytest.raises(ValidationError):
+        parse({"measures": ["sum"]})
+
+
+def test_aggregate(chart: "ChartPage") -> None:
+    datasets = chart.query.datasets.order_by("pk")
+    result = aggregate(datasets, chart.aggregation)
+    assert result["columns"] == ["region", "members", "count"]
+    assert result["rows"] == [["north", 8, 2], ["south", 2, 2]]
+    assert result["source_rows"] == 4
+
+    spec = parse({"dimensions": ["sex"], "measures": ["count"], "filters": [["region", "south"]]})
+    assert aggregate(datasets, spec)["rows"] == [["F", 2]]
+
+    with pytest.raises(KeyError):
+        aggregate(datasets, parse({"dimensions": ["missing"]}))
+
+
+def test_aggregate_skip_not_tabular(chart: "ChartPage") -> None:
+    from testutils.factories import DatasetFactory
+
+    DatasetFactory(query=chart.query, hash="ds-3", data=[1, 2, 3])
+    result = aggregate(chart.query.datasets.order_by("pk"), chart.aggregation)
+    assert result["source_rows"] == 4
+
+
+def test_chart_series_cached(chart: "ChartPage", django_assert_max_num_queries) -> None:
+    data, etag = chart_series(chart, chart.aggregation)
+    with django_assert_max_num_queries(1):
+        assert chart_series(chart, chart.aggregation) == (data, etag)
+
+
+def test_chart_data_view(django_app, admin_user, chart: "ChartPage") -> None:
+    url = reverse("office-chart-data", args=[chart.country_office.slug, chart.pk])
+    res = django_app.get(url, user=admin_user)
+    assert res.json["rows"] == [["north", 8, 2], ["south", 2, 2]]
+
+    res = django_app.get(url, user=admin_user, headers={"If-None-Match": res.headers["ETag"]})
+    assert res.status_code == 304
+
+    chart.params = {"dimensions": ["missing"]}
+    chart.save()
+    res = django_app.get(url, user=admin_user, expect_errors=True)
+    assert res.status_code == 400
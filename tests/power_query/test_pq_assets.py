@@ -0,0 +1,99 @@
+import os
+import time
+from io import BytesIO
+from unittest.mock import MagicMock
+
+import pytest
+from PIL import Image
+
+from hope_country_report.apps.power_query.assets import PhotoCache, photo_size, qr_code_png
+
+
+@pytest.fixture
+def photo() -> bytes:
+    buffer = BytesIO()
+    Image.new("RGB", (400, 300), "red").save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def cache(tmp_path, photo) -> PhotoCache:
+    cache = PhotoCache(maxsize=2, cache_dir=tmp_path, workers=2)
+    cache.read = MagicMock(return_value=photo)
+    return cache
+
+
+def test_photo_size():
+    assert photo_size(72, 144) == (300, 600)
+    assert photo_size(71.99999, 144.00001) == (300, 600)
+
+
+def test_qr_code_png():
+    qr_code_png.cache_clear()
+    png = qr_code_png("https://example.com")
+    assert Image.open(BytesIO(png)).format == "PNG"
+    assert qr_code_png("https://example.com") is png
+    assert qr_code_png.cache_info().hits == 1
+
+
+def test_photo_cache_get(cache, tmp_path):
+    content = cache.get("photos/1.jpg", (40, 30))
+    image = Image.open(BytesIO(content))
+    assert image.size == (40, 30)
+    assert cache.get("photos/1.jpg", (40, 30)) == content
+    assert cache.read.call_count == 1
+    assert len(list(tmp_path.glob("*.png"))) == 1
+
+    cache.clear()
+    assert cache.get("photos/1.jpg", (40, 30)) == content
+    assert cache.read.call_count == 1
+
+
+def test_photo_cache_eviction(tmp_path, photo):
+    cache = PhotoCache(maxsize=2)
+    cache.read = MagicMock(return_value=photo)
+    for size in [(10, 10), (20, 20), (30, 30)]:
+        cache.get("photos/1.jpg", size)
+    assert len(cache._entries) == 2
+    cache.get("photos/1.jpg", (10, 10))
+    assert cache.read.call_count == 4
+
+
+def test_photo_cache_prefetch(cache, photo):
+    def read(path: str) -> bytes:
+        if "missing" in path:
+            raise FileNotFoundError(path)
+        return photo
+
+    cache.read.side_effect = read
+    cache.prefetch(
+        [
+            ("photos/1.jpg", (40, 30)),
+            ("photos/1.jpg", (40, 30)),
+            ("photos/missing.jpg", (40, 30)),
+            ("", (1, 1)),
+        ]
+    )
+    assert cache.read.call_count == 2
+    assert len(cache._entries) == 1
+
+
+def test_photo_cache_disk_eviction(tmp_path, photo):
+    cache = PhotoCache(maxsize=2, cache_dir=tmp_path, ttl=60)
+    cache.read = MagicMock(return_value=photo)
+    cache.get("photos/1.jpg", (40, 30))
+    cache.get("photos/2.jpg", (40, 30))
+    old = tmp_path / f"{cache.key('photos/1.jpg', (40, 30), 300)}.png"
+    os.utime(old, (time.time() - 120, time.time() - 120))
+
+    cache.clear()
+    cache.get("photos/1.jpg", (40, 30))
+    assert cache.read.call_count == 3
+
+    os.utime(old, (time.time() - 120, time.time() - 120))
+    assert cache.evict() == 1
+    assert len(list(tmp_path.iterdir())) == 1
+
+    cache.max_disk_size = 1
+    assert cache.evict() == 1
+    assert not list(tmp_path.iterdir())
@@ -173,6 +173,60 @@ def test_celery_reports_refresh(
     assert report.documents.exists()
 
 
+def test_refresh_workflow_runs_shared_query_once(settings, report: "ReportConfiguration") -> None:
+    from testutils.factories import ReportConfigurationFactory
+
+    from hope_country_report.apps.power_query.celery_tasks import build_refresh_workflow
+
+    settings.CELERY_TASK_ALWAYS_EAGER = True
+    other = ReportConfigurationFactory(name="Other Report", query=report.query, owner=report.owner)
+
+    with mock.patch.object(Query, "execute_matrix", autospec=True, side_effect=Query.execute_matrix) as execute:
+        build_refresh_workflow([report, other]).apply_async()
+
+    assert execute.call_count == 1
+    assert report.documents.exists()
+    assert other.documents.exists()
+
+
+def test_refresh_workflow_source_first(settings, report: "ReportConfiguration") -> None:
+    from testutils.factories import ParametrizerFactory, QueryFactory, ReportConfigurationFactory
+
+    from hope_country_report.apps.power_query.celery_tasks import build_refresh_workflow
+    from hope_country_report.apps.power_query.models import Parametrizer
+
+    settings.CELERY_TASK_ALWAYS_EAGER = True
+    source = QueryFactory(name="Source Query", owner=report.owner)
+    parametrizer = ParametrizerFactory(source=source)
+    report.query.parametrizer = parametrizer
+    report.query.save()
+    source_report = ReportConfigurationFactory(name="Source Report", query=source, owner=report.owner)
+
+    calls = []
+    with (
+        mock.patch.object(
+            Query, "execute_matrix", autospec=True, side_effect=lambda q, **kw: calls.append(("query", q.pk)) or {}
+        ),
+        mock.patch.object(
+            Parametrizer, "refresh", autospec=True, side_effect=lambda p: calls.append(("parametrizer", p.pk))
+        ),
+        mock.patch.object(ReportConfiguration, "execute", return_value=[]),
+    ):
+        build_refresh_workflow([report, source_report]).apply_async()
+
+    assert calls == [("query", source.pk), ("parametrizer", parametrizer.pk), ("query", report.query.pk)]
+
+
+def test_refresh_workflow_skips_refreshed_query(settings, report: "ReportConfiguration") -> None:
+    from hope_country_report.apps.power_query.celery_tasks import refresh_query
+
+    settings.CELERY_TASK_ALWAYS_EAGER = True
+    report.query.execute_matrix()
+    with mock.patch.object(Query, "execute_matrix") as execute:
+        refresh_query.delay(report.query.pk, report.query.last_run.timestamp() - 1)
+    assert not execute.called
+
+
 @pytest.mark.django_db
 def test_celery_error(settings, query_exception: Query) -> None:
     settings.CELERY_TASK_ALWAYS_EAGER = True
@@ -0,0 +1,216 @@
+import datetime
+import io
+import pickle
+from typing import TYPE_CHECKING
+
+import pytest
+import tablib
+
+from hope_country_report.apps.power_query.columnar import (
+    FORMAT_COLUMNAR,
+    FORMAT_PICKLE,
+    ColumnarReader,
+    ColumnarWriter,
+    is_tabular,
+    iter_tabular,
+    merge_columnar,
+    queryset_fields,
+    write_columnar,
+)
+from hope_country_report.state import state
+
+if TYPE_CHECKING:
+    from hope_country_report.apps.power_query.models import Query
+
+
+ROWS = [{"id": i, "name": f"name-{i}", "created": datetime.date(2000, 1, 1 + i % 28)} for i in range(25)]
+
+
+@pytest.fixture()
+def columnar_file() -> io.BytesIO:
+    fp = io.BytesIO()
+    write_columnar(fp, ROWS, row_group_size=10)
+    fp.seek(0)
+    return fp
+
+
+def test_is_tabular():
+    assert is_tabular(ROWS)
+    assert is_tabular(tablib.Dataset())
+    assert not is_tabular({"a": 1})
+    assert not is_tabular([1, 2, 3])
+
+
+@pytest.mark.parametrize("result", [[1, 2, 3], [(1, "a"), (2, "b")], {"a": 1}])
+def test_iter_tabular_not_tabular(result):
+    with pytest.raises(ValueError):
+        iter_tabular(result)
+
+
+def test_queryset_fields(db, django_user_model):
+    from django.db.models import Value
+
+    django_user_model.objects.create(username="user")
+    qs = django_user_model.objects.all()
+    assert "username" in queryset_fields(qs.values())
+    assert queryset_fields(qs.annotate(x=Value(1)).values("username", "x")) == ["username", "x"]
+    assert queryset_fields(qs.annotate(x=Value(1)))[-1] == "x"
+    assert queryset_fields(qs.extra(select={"e": "1"}))[0] == "e"
+
+    fp = io.BytesIO()
+    write_columnar(fp, qs.annotate(x=Value(1)))
+    fp.seek(0)
+    with ColumnarReader(fp) as reader:
+        assert reader.to_dicts(["username", "x"]) == [{"username": "user", "x": 1}]
+
+
+def test_manifest(columnar_file):
+    with ColumnarReader(columnar_file) as reader:
+        assert len(reader) == 25
+        assert reader.row_groups == [10, 10, 5]
+        assert reader.schema == {"id": "int", "name": "str", "created": "date"}
+
+
+def test_read_projection_and_range(columnar_file):
+    with ColumnarReader(columnar_file) as reader:
+        rows = list(reader.iter_rows(["name"], start=8, stop=12))
+        assert rows == [("name-8",), ("name-9",), ("name-10",), ("name-11",)]
+        assert reader.to_dicts() == ROWS
+        assert reader.to_dataset(["id"], stop=2).dict == [{"id": 0}, {"id": 1}]
+
+
+def test_read_unknown_column(columnar_file):
+    with ColumnarReader(columnar_file) as reader, pytest.raises(KeyError):
+        list(reader.iter_rows(["missing"]))
+
+
+def test_mixed_types():
+    fp = io.BytesIO()
+    with ColumnarWriter(fp, ["value"]) as writer:
+        writer.write_rows([[None], [1], ["a"]])
+    fp.seek(0)
+    with ColumnarReader(fp) as reader:
+        assert reader.types == ["object"]
+        assert reader.to_dicts() == [{"value": None}, {"value": 1}, {"value": "a"}]
+
+
+def test_merge(columnar_file):
+    fp = io.BytesIO()
+    with ColumnarReader(columnar_file) as previous:
+        assert merge_columnar(fp, previous, [(1, "changed", None), (99, "new", None)], "id", {1, 2}) == 25
+    fp.seek(0)
+    with ColumnarReader(fp) as reader:
+        rows = reader.to_dicts(["id", "name"])
+    assert [r["id"] for r in rows[:2]] == [0, 3]
+    assert rows[-2:] == [{"id": 1, "name": "changed"}, {"id": 99, "name": "new"}]
+
+
+@pytest.fixture()
+def query(db) -> "Query":
+    from testutils.factories import CountryOfficeFactory, HouseholdFactory, QueryFactory
+
+    with state.set(must_tenant=False):
+        co = CountryOfficeFactory(name="Afghanistan")
+        HouseholdFactory(business_area=co.business_area, withdrawn=True)
+        HouseholdFactory(business_area=co.business_area, withdrawn=False)
+    return QueryFactory(
+        name="Columnar Query",
+        code="result=conn.values('id', 'withdrawn').order_by('withdrawn')",
+        dataset_format=FORMAT_COLUMNAR,
+    )
+
+
+def test_query_columnar(query: "Query"):
+    ds, __ = query.run(persist=True)
+    ds.refresh_from_db()
+    assert ds.format == FORMAT_COLUMNAR
+    assert ds.size == 2
+    assert ds.headers == ["id", "withdrawn"]
+    assert [r["withdrawn"] for r in ds.data] == [False, True]
+    assert list(ds.read(["withdrawn"], start=1)) == [{"withdrawn": True}]
+
+
+def test_query_columnar_fallback(query: "Query"):
+    query.code = "result={'a': 1}"
+    ds, __ = query.run(persist=True)
+    assert ds.format == "pickle"
+    assert ds.data == {"a": 1}
+
+
+def test_query_incremental(query: "Query"):
+    from django.utils import timezone
+
+    from hope_country_report.apps.hope.models import Household
+
+    query.incremental = True
+    query.save()
+    yesterday = timezone.now() - datetime.timedelta(days=1)
+    with state.set(must_tenant=False):
+        Household.objects.update(updated_at=yesterday)
+    ds, __ = query.run(persist=True)
+    assert ds.info["incremental"] == {"field": "updated_at", "high_water_mark": yesterday.isoformat(), "mode": "full"}
+
+    with state.set(must_tenant=False):
+        Household.objects.filter(withdrawn=True).update(withdrawn=False, updated_at=timezone.now())
+    ds, __ = query.run(persist=True)
+    ds.refresh_from_db()
+    assert ds.info["incremental"]["mode"] == "delta"
+    assert ds.info["incremental"]["changed"] == 1
+    assert ds.size == 2
+    assert [r["withdrawn"] for r in ds.data] == [False, False]
+
+
+def test_query_incremental_selected_rows(query: "Query"):
+    from django.utils import timezone
+
+    from hope_country_report.apps.hope.models import Household
+
+    query.incremental = True
+    query.code = "result=conn.filter(withdrawn=False).values('id', 'withdrawn')"
+    query.save()
+    with state.set(must_tenant=False):
+        Household.objects.update(updated_at=timezone.now() - datetime.timedelta(days=1))
+    query.run(persist=True)
+
+    # rows the query does not select are not merged
+    with state.set(must_tenant=False):
+        Household.objects.filter(withdrawn=True).update(updated_at=timezone.now())
+    ds, __ = query.run(persist=True)
+    assert ds.info["incremental"]["mode"] == "delta"
+    assert ds.info["incremental"]["changed"] == 0
+    assert ds.size == 1
+
+    # a row no longer selected forces a full refresh
+    with state.set(must_tenant=False):
+        Household.objects.update(withdrawn=True, updated_at=timezone.now())
+    ds, __ = query.run(persist=True)
+    ds.refresh_from_db()
+    assert ds.info["incremental"]["mode"] == "full"
+    assert ds.size == 0
+
+
+def test_query_incremental_combinator(query: "Query"):
+    query.incremental = True
+    query.code = "result=conn.values('id', 'withdrawn').union(conn.values('id', 'withdrawn'))"
+    query.save()
+    ds, __ = query.run(persist=True)
+    assert "incremental" not in ds.info
+    assert ds.size == 2
+
+
+def test_marshall_result_queryset(query: "Query"):
+    from hope_country_report.apps.hope.models import Household
+
+    with state.set(must_tenant=False):
+        qs = Household.objects.values("id", "withdrawn")
+        marshalled = query.marshall_result(qs, "columnar", False)
+        # streamed through a cursor
+        assert qs._result_cache is None
+        assert marshalled["size"] == 2
+
+        query.dataset_format = FORMAT_PICKLE
+        marshalled = query.marshall_result(qs, "pickle", True)
+        # pickled QuerySets are loaded in full
+        assert qs._result_cache is not None
+    assert marshalled["format"] == FORMAT_PICKLE
+    assert len(pickle.load(marshalled["file"])) == 2
@@ -220,6 +220,29 @@ def test_retrieve_dataset_data_endpoint(api_client, authorized_user, token, afgh
         assert len(response.data["results"]) == 50
 
 
+def test_dataset_data_endpoint_not_tabular(api_client, authorized_user, token, afghanistan, query):
+    from django.core.files.base import ContentFile
+
+    with state.set(tenant=afghanistan):
+        dataset = Dataset.objects.create(query=query, hash="scalars", description="Scalars", info={"arguments": {}})
+        dataset.file.save("test.pkl", ContentFile(Dataset.marshall(list(range(30)))))
+
+    api_client.credentials(HTTP_AUTHORIZATION="Token " + token.key)
+    url = reverse(
+        "api:dataset-data",
+        kwargs={
+            "parent_lookup_query__country_office__slug": afghanistan.slug,
+            "parent_lookup_query": query.pk,
+            "pk": dataset.pk,
+        },
+    )
+    with state.set(tenant=afghanistan):
+        response = api_client.get(url, {"page": 2, "page_size": 10})
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["count"] == 30
+        assert response.data["results"] == list(range(10, 20))
+
+
 def test_list_datasets_filter(api_client, authorized_user, token, afghanistan, query):
     from hope_country_report.apps.power_query.models import Dataset
     from hope_country_report.state import state
@@ -247,3 +270,70 @@ def test_list_datasets_filter(api_client, authorized_user, token, afghanistan, q
         results = response.data.get("results", response.data) if isinstance(response.data, dict) else response.data
         assert len(results) == 1
         assert results[0]["id"] == d1.pk
+
+
+@pytest.fixture
+def columnar_dataset(db, query, afghanistan):
+    import io
+
+    from django.core.files.base import ContentFile
+
+    from hope_country_report.apps.power_query.columnar import FORMAT_COLUMNAR, write_columnar
+
+    rows = [{"id": i, "name": f"name-{i}", "group": i % 3} for i in range(25)]
+    fp = io.BytesIO()
+    write_columnar(fp, rows, row_group_size=10)
+    with state.set(tenant=afghanistan):
+        dataset = Dataset.objects.create(
+            query=query, hash="columnar", description="Columnar", info={"arguments": {}}, format=FORMAT_COLUMNAR
+        )
+        dataset.file.save("data.zip", ContentFile(fp.getvalue()))
+    return dataset
+
+
+def test_dataset_rows(columnar_dataset):
+    from hope_country_report.apps.power_query.models.dataset import DatasetRows
+
+    rows = DatasetRows(columnar_dataset, columns=["name"])
+    assert rows.count() == 25
+    assert rows[12:14] == [{"name": "name-12"}, {"name": "name-13"}]
+
+    rows = DatasetRows(columnar_dataset, columns=["id"], filters=[("group", "1")], ordering=["-id"])
+    assert rows.count() == 8
+    assert rows[0:2] == [{"id": 22}, {"id": 19}]
+
+    with pytest.raises(KeyError):
+        DatasetRows(columnar_dataset, columns=["missing"])
+
+
+def test_dataset_data_endpoint_columnar(api_client, authorized_user, token, afghanistan, query, columnar_dataset):
+    api_client.credentials(HTTP_AUTHORIZATION="Token " + token.key)
+    url = reverse(
+        "api:dataset-data",
+        kwargs={
+            "parent_lookup_query__country_office__slug": afghanistan.slug,
+            "parent_lookup_query": query.pk,
+            "pk": columnar_dataset.pk,
+        },
+    )
+    with state.set(tenant=afghanistan):
+        response = api_client.get(url, {"page": 2, "page_size": 10, "fields": "id"})
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["count"] == 25
+        assert response.data["results"] == [{"id": i} for i in range(10, 20)]
+
+        response = api_client.get(url, {"filter": "group:2", "ordering": "-id", "fields": "id,name"})
+        assert response.data["count"] == 8
+        assert response.data["results"][0] == {"id": 23, "name": "name-23"}
+
+        response = api_client.get(url, {"fields": "unknown"})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+        response = api_client.get(url, {"stream": "ndjson", "filter": "group:0", "fields": "id"})
+        assert response["Content-Type"] == "application/x-ndjson"
+        assert b"".join(response.streaming_content).splitlines()[:2] == [b'{"id": 0}', b'{"id": 3}']
+
+        response = api_client.get(url, {"stream": "csv", "fields": "id,group"})
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        assert lines[:2] == ["id,group", "0,0"]
+        assert len(lines) == 26
@@ -0,0 +1,67 @@
+import pytest
+
+from hope_country_report.apps.power_query.models import ReportDocument, ReportDocumentIndex
+
+
+@pytest.fixture()
+def document(db) -> "ReportDocument":
+    from testutils.factories import ReportDocumentFactory
+
+    return ReportDocumentFactory(report__name="report-idx")
+
+
+def test_index_document(document: "ReportDocument") -> None:
+    entry = ReportDocumentIndex.objects.get(report=document.report, dataset_ref=document.dataset_id)
+    assert entry.document == document
+    assert entry.country_office == document.report.country_office
+    assert entry.report_name == "report-idx"
+    assert entry.owner == str(document.report.owner)
+    assert entry.formats == [{"pk": document.pk, "suffix": document.formatter.file_suffix, "size": 0}]
+
+
+def test_index_formats(document: "ReportDocument") -> None:
+    from testutils.factories import FormatterFactory, ReportDocumentFactory
+
+    other = ReportDocumentFactory(
+        report=document.report, dataset=document.dataset, formatter=FormatterFactory(name="other")
+    )
+    entry = ReportDocumentIndex.objects.get(report=document.report, dataset_ref=document.dataset_id)
+    assert [f["pk"] for f in entry.formats] == [document.pk, other.pk]
+
+    document.delete()
+    entry = ReportDocumentIndex.objects.get(report=other.report, dataset_ref=other.dataset_id)
+    assert entry.document == other
+    other.delete()
+    assert not ReportDocumentIndex.objects.filter(report=other.report, dataset_ref=other.dataset_id).exists()
+
+
+def test_index_report_changes(document: "ReportDocument") -> None:
+    report = document.report
+    report.active = False
+    report.name = "renamed"
+    report.save()
+    report.tags.add("tag1", "tag2")
+
+    entry = ReportDocumentIndex.objects.get(report=report, dataset_ref=document.dataset_id)
+    assert not entry.active
+    assert entry.report_name == "renamed"
+    assert entry.tags == ["tag1", "tag2"]
+    assert ReportDocumentIndex.objects.filter(tags__contains=["tag1"]).count() == 1
+
+    report.tags.clear()
+    entry.refresh_from_db()
+    assert entry.tags == []
+
+
+def test_index_dataset_deleted(document: "ReportDocument") -> None:
+    dataset_id = document.dataset_id
+    document.dataset.delete()
+    assert not ReportDocumentIndex.objects.filter(report=document.report, dataset_ref=dataset_id).exists()
+    assert ReportDocumentIndex.objects.get(report=document.report, dataset_ref=None).document == document
+
+
+def test_index_rebuild(document: "ReportDocument") -> None:
+    ReportDocumentIndex.objects.all().delete()
+    pairs = set(ReportDocument.objects.values_list("report_id", "dataset_id"))
+    assert ReportDocumentIndex.rebuild() == len(pairs)
+    assert ReportDocumentIndex.objects.filter(document=document).exists()
@@ -107,3 +107,17 @@ def test_formatter_htmlpdf_list(dataset):
     result = fmt.render({"dataset": dataset})
     content = result.decode()
     assert content == f"<html><body><div>{H1}</div><div>{H2}</div><div>{H3}</div></body></html>"
+
+
+def test_formatter_fingerprint_template_content(db):
+    from testutils.factories import FormatterFactory, ReportTemplateFactory
+
+    template = ReportTemplateFactory()
+    fmt: "Formatter" = FormatterFactory(name="f1", code="", template=template, processor=fqn(processors.ToFormPDF))
+    before = fmt.fingerprint
+    assert type(fmt).objects.get(pk=fmt.pk).fingerprint == before
+
+    # the file is edited in place: its name does not change
+    with template.doc.storage.open(template.doc.name, "wb") as f:
+        f.write(b"Edited template content")
+    assert type(fmt).objects.get(pk=fmt.pk).fingerprint != before
@@ -0,0 +1,79 @@
+from io import StringIO
+from typing import TYPE_CHECKING
+
+import pytest
+from django.core.management import call_command
+
+from hope_country_report.apps.power_query.plan import summarize
+
+if TYPE_CHECKING:
+    from hope_country_report.apps.power_query.models import Query
+
+PLAN = {
+    "Plan": {
+        "Node Type": "Hash Join",
+        "Total Cost": 1200.5,
+        "Plan Rows": 350,
+        "Plans": [
+            {"Node Type": "Seq Scan", "Relation Name": "household_individual", "Total Cost": 900, "Plan Rows": 900},
+            {
+                "Node Type": "Hash",
+                "Plans": [{"Node Type": "Seq Scan", "Relation Name": "geo_area", "Total Cost": 10, "Plan Rows": 5}],
+            },
+        ],
+    }
+}
+
+
+@pytest.fixture()
+def query(db):
+    from testutils.factories import QueryFactory
+
+    return QueryFactory(code="result=conn.all()")
+
+
+def test_summarize(settings) -> None:
+    settings.POWER_QUERY_PLAN_LARGE_TABLES = ["household_individual"]
+    summary = summarize(PLAN)
+    assert summary["rows"] == 350
+    assert summary["cost"] == 1200.5
+    assert summary["seq_scans"] == ["geo_area", "household_individual"]
+    assert summary["warnings"] == ["Sequential scan on household_individual"]
+
+
+def test_update_plan(query: "Query") -> None:
+    plan = query.update_plan()
+    query.refresh_from_db()
+    assert query.estimated_rows == plan["rows"]
+    assert query.estimated_cost == plan["cost"]
+    assert "household_household" in query.plan["seq_scans"]
+    assert query.plan["warnings"]
+    assert not query.datasets.exists()
+
+
+def test_update_plan_not_queryset(query: "Query") -> None:
+    query.code = "result={'a': 1}"
+    plan = query.update_plan()
+    assert plan["cost"] is None
+    assert plan["type"] == "dict"
+
+
+def test_plan_query_task(query: "Query") -> None:
+    from hope_country_report.apps.power_query.celery_tasks import plan_query
+
+    plan = plan_query(query.pk)
+    query.refresh_from_db()
+    assert query.estimated_rows == plan["rows"]
+    assert plan_query(-1) is None
+
+    query.code = "1/0"
+    query.save()
+    assert plan_query(query.pk) is None
+
+
+def test_command_plan(query: "Query") -> None:
+    out = StringIO()
+    call_command("pq", "plan", "--sql", stdout=out)
+    output = out.getvalue()
+    assert query.name in output
+    assert "Sequential scan on household_household" in output
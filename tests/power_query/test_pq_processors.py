@@ -1,3 +1,4 @@
+import io
 import pickle
 from pathlib import Path
 from typing import TYPE_CHECKING, NoReturn, Type
@@ -7,6 +8,7 @@ import factory
 import pymupdf as fitz
 import pytest
 import tablib
+from constance.test import override_config
 from django.core.files.base import ContentFile
 from django.core.files.storage import default_storage
 from django.core.files.uploadedfile import SimpleUploadedFile
@@ -19,6 +21,7 @@ from testutils.factories import DatasetFactory
 from hope_country_report.apps.hope.models._inspect import Household
 from hope_country_report.apps.power_query import processors
 from hope_country_report.apps.power_query.processors import ProcessorStrategy, registry
+from hope_country_report.apps.power_query.utils import to_dataset
 from hope_country_report.state import state
 
 if TYPE_CHECKING:
@@ -135,6 +138,22 @@ def test_processor_json(dataset: NoReturn, tmp_path: Path):
     assert result
 
 
+@pytest.mark.parametrize(
+    "processor,fmt", [(processors.ToCSV, "csv"), (processors.ToJSON, "json"), (processors.ToYAML, "yaml")]
+)
+def test_processor_streaming(dataset: NoReturn, processor: "Type[ProcessorStrategy]", fmt: str):
+    sink = io.BytesIO()
+    processor(Mock()).write({"dataset": dataset}, sink)
+    assert sink.getvalue() == to_dataset(dataset.data).export(fmt).encode()
+
+
+def test_processor_xlsx_streaming(dataset: NoReturn):
+    result = processors.ToXLSX(Mock()).process({"dataset": dataset})
+    loaded = tablib.Dataset().load(result, format="xlsx")
+    assert loaded.headers == to_dataset(dataset.data).headers
+    assert loaded.height == dataset.data.count()
+
+
 def test_processor_docx(dataset: NoReturn, tmp_path: Path):
     from testutils.factories import ReportTemplateFactory
 
@@ -178,6 +197,48 @@ def test_processor_pdfform(dataset: NoReturn, tmp_path: Path):
     assert result
 
 
+def test_processor_pdfform_template_cache(db):
+    from testutils.factories import ReportTemplateFactory
+
+    tpl = ReportTemplateFactory(name="program_receipt.pdf")
+    processor = processors.ToFormPDF(Mock(template=tpl))
+    template = processor.get_form_template(tpl)
+    assert processor.get_form_template(tpl) is template
+    assert template.fields["code_qr"] == (processors.FormTemplate.QR, None)
+    assert template.fields["Cognome_ar"] == (processors.FormTemplate.SPECIAL, "arabic")
+    assert template.fields["Nome"] == (processors.FormTemplate.TEXT, None)
+
+
+def test_processor_pdfform_template_lru(db, settings):
+    from testutils.factories import ReportTemplateFactory
+
+    settings.POWER_QUERY_FORM_TEMPLATE_CACHE_SIZE = 1
+    processors._form_templates.clear()
+    tpl = ReportTemplateFactory(name="program_receipt.pdf")
+    other = ReportTemplateFactory(
+        name="template.pdf",
+        doc=SimpleUploadedFile("template.pdf", (Path(__file__).parent / "template.pdf").read_bytes()),
+    )
+    processor = processors.ToFormPDF(Mock(template=tpl))
+    template = processor.get_form_template(tpl)
+    processor.get_form_template(other)
+    assert len(processors._form_templates) == 1
+    assert processor.get_form_template(tpl) is not template
+
+
+def test_processor_pdfform_pool(dataset: NoReturn):
+    from testutils.factories import ReportTemplateFactory
+
+    fmt = Mock(template=ReportTemplateFactory(name="program_receipt.pdf"))
+    context = {"dataset": dataset, "business_area": "Afghanistan"}
+    records = len(to_dataset(dataset.data).dict)
+    assert records > 1
+    with override_config(PQ_PDF_WORKERS=2):
+        result = processors.ToFormPDF(fmt).process(context)
+    with fitz.open("pdf", result) as document, fitz.open("pdf", processors.ToFormPDF(fmt).process(context)) as serial:
+        assert document.page_count == serial.page_count >= records
+
+
 def test_processor_pdf_with_image(updated_dataset: tablib.Dataset, tmp_path: Path):
     from testutils.factories import ReportTemplateFactory
 
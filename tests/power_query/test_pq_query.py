@@ -1,4 +1,6 @@
+from types import SimpleNamespace
 from typing import TYPE_CHECKING
+from unittest import mock
 from uuid import UUID
 
 import pytest
@@ -149,6 +151,14 @@ def test_query_execution(query: "Query"):
     assert result[0].data[0].pk
 
 
+def test_query_execution_timings(query: "Query"):
+    dataset, __ = query.run(persist=True)
+    dataset.refresh_from_db()
+    perfs = dataset.info["perfs"]
+    assert perfs["time_elapsed"] > 0
+    assert [s["name"] for s in perfs["spans"]] == ["query.exec", "query.marshall", "storage.write", "query.cell"]
+
+
 def test_nested_query(query_nested: "Query"):
     result = query_nested.execute_matrix()
     assert query_nested.datasets.exists()
@@ -183,6 +193,39 @@ def test_query_parametrizer(query_parametrizer: "Query"):
     assert ds.data.filter(withdrawn=True).count() == ds.data.count() == 2
 
 
+def test_query_parametrizer_parallel(query_parametrizer: "Query"):
+    def run(persist, arguments, **kwargs):
+        if arguments["withdrawn"]:
+            raise ValueError("boom")
+        return SimpleNamespace(pk=-1), {}
+
+    query_parametrizer.matrix_workers = 2
+    assert query_parametrizer.get_matrix_workers(10) == 2
+    assert query_parametrizer.get_matrix_workers(1) == 1
+    with mock.patch.object(type(query_parametrizer), "run", autospec=True) as m:
+        m.side_effect = lambda self, *a, **kw: run(*a, **kw)
+        result = query_parametrizer.execute_matrix()
+    assert m.call_count == 2
+    assert result["{'withdrawn': False}"] == -1
+    assert result["error_{'withdrawn': True}"] == "boom"
+    assert query_parametrizer.error_message == "boom"
+
+
+@pytest.mark.django_db(transaction=True)
+def test_query_parametrizer_parallel_failures(query_parametrizer: "Query"):
+    query_parametrizer.code = "import time\ntime.sleep(0.2)\nraise ValueError(f\"boom {arguments['withdrawn']}\")"
+    query_parametrizer.matrix_workers = 2
+    query_parametrizer.save()
+
+    result = query_parametrizer.execute_matrix()
+
+    assert result["error_{'withdrawn': True}"] == "boom True"
+    assert result["error_{'withdrawn': False}"] == "boom False"
+    query_parametrizer.refresh_from_db()
+    assert query_parametrizer.error_message.startswith("boom")
+    assert not query_parametrizer.datasets.exists()
+
+
 def test_query_silk(query: "Query", data):
     query.datasets.all().delete()
     tenant_slug = data["hh1"][0].business_area.id
@@ -1,3 +1,4 @@
+from datetime import timedelta
 from pathlib import Path, PurePath
 from tempfile import TemporaryDirectory
 from typing import TYPE_CHECKING
@@ -8,6 +9,8 @@ import pytest
 import pyzipper
 from constance.test import override_config
 from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.utils import timezone
 from extras.testutils.factories import ReportConfigurationFactory
 
 from hope_country_report.apps.power_query.models import ReportConfiguration
@@ -133,6 +136,122 @@ def test_report_refresh(db, settings, report: "ReportConfiguration") -> None:
     assert doc.file
 
 
+def test_report_refresh_unchanged(db, settings, report: "ReportConfiguration") -> None:
+    settings.CELERY_TASK_ALWAYS_EAGER = True
+    report.execute(True)
+    doc = report.documents.get()
+    assert doc.content_hash
+    assert doc.dataset.content_hash
+
+    with mock.patch("hope_country_report.apps.power_query.models.Formatter.render") as render:
+        report.execute(True)
+    render.assert_not_called()
+
+    report.context = {"subtitle": "changed"}
+    report.save()
+    report.execute(False)
+    refreshed = report.documents.get()
+    assert refreshed.info["source"] != doc.info["source"]
+    assert refreshed.file.name == doc.file.name
+
+
+def test_report_resume(db, settings, report: "ReportConfiguration") -> None:
+    from testutils.factories import FormatterFactory
+
+    from hope_country_report.apps.power_query.models import Query, ReportDocument, ReportRunUnit
+
+    class WorkerLost(BaseException):
+        pass
+
+    settings.POWER_QUERY_DOCUMENT_BATCH_SIZE = 1
+    report.formatters.add(FormatterFactory(name="Second HTML"))
+    task = Mock(request=Mock(id="task-1"))
+    render = ReportDocument.render
+
+    def crash(*args, **kwargs):
+        if ReportRunUnit.objects.filter(report=report, status=ReportRunUnit.SUCCESS).exists():
+            raise WorkerLost
+        return render(*args, **kwargs)
+
+    with mock.patch.object(ReportDocument, "render", side_effect=crash):
+        with pytest.raises(WorkerLost):
+            report.execute(False, notify=False, running_task=task)
+    assert report.progress == {"total": 2, "pending": 0, "started": 1, "success": 1, "failure": 0, "percent": 50}
+
+    unit = ReportRunUnit.objects.get(report=report, status=ReportRunUnit.STARTED)
+    assert not unit.claim("another-task")
+    # the unit may still be processed by its owner: other tasks run a new query
+    assert not ReportRunUnit.is_interrupted(report, "another-task")
+    assert ReportRunUnit.is_interrupted(report, "task-1")
+    ReportRunUnit.objects.filter(pk=unit.pk).update(updated_on=timezone.now() - timedelta(hours=1))
+    assert ReportRunUnit.is_interrupted(report, "another-task")
+
+    with (
+        mock.patch.object(Query, "execute_matrix") as execute_matrix,
+        mock.patch.object(ReportDocument, "render", wraps=render) as rendered,
+    ):
+        report.execute(True, notify=False, running_task=task)
+    execute_matrix.assert_not_called()
+    assert rendered.call_count == 1
+    unit.refresh_from_db()
+    assert unit.status == ReportRunUnit.SUCCESS
+    assert unit.attempts == 2
+    assert report.progress["percent"] == 100
+
+    with mock.patch.object(ReportDocument, "render", wraps=render) as rendered:
+        report.execute(False, notify=False)
+    assert rendered.call_count == 2
+
+
+def test_report_documents_batch(
+    db, settings, report: "ReportConfiguration", django_capture_on_commit_callbacks
+) -> None:
+    from testutils.factories import FormatterFactory
+
+    from hope_country_report.apps.power_query.models import ReportDocument, ReportDocumentIndex
+
+    report.formatters.add(FormatterFactory(name="Second HTML"))
+    superseded = report.documents.get().file.name
+    report.compress = True
+    report.save()
+
+    with (
+        mock.patch.object(ReportDocument._all, "bulk_create", wraps=ReportDocument._all.bulk_create) as bulk_create,
+        mock.patch("hope_country_report.apps.power_query.persistence.remove_report_files") as remove_files,
+        django_capture_on_commit_callbacks(execute=True),
+    ):
+        result = report.execute(False, notify=False)
+
+    assert bulk_create.call_count == 1
+    assert [pk for pk, __ in result] == list(report.documents.order_by("formatter_id").values_list("pk", flat=True))
+    assert all(doc.file.name.endswith(".zip") for doc in report.documents.all())
+    remove_files.delay.assert_called_once_with([superseded])
+    entry = ReportDocumentIndex.objects.get(report=report)
+    assert len(entry.formats) == 2
+
+
+def test_report_documents_batch_bounds(db, settings, report: "ReportConfiguration") -> None:
+    from testutils.factories import FormatterFactory
+
+    from hope_country_report.apps.power_query.models import ReportDocument, ReportRunUnit
+
+    report.formatters.add(FormatterFactory(name="Second HTML"))
+    report.compress = True
+    report.save()
+
+    # claims of the rendered units are renewed until their batch is stored
+    with mock.patch.object(ReportRunUnit, "renew", wraps=ReportRunUnit.renew) as renew:
+        report.execute(False, notify=False)
+    assert [len(c.args[0]) for c in renew.call_args_list] == [0, 1, 2]
+
+    settings.POWER_QUERY_DOCUMENT_BATCH_MAX_SIZE = 1
+    report.compress = False
+    report.save()
+    with mock.patch.object(ReportDocument._all, "bulk_create", wraps=ReportDocument._all.bulk_create) as bulk_create:
+        report.execute(False, notify=False)
+    assert bulk_create.call_count == 2
+
+
 @override_config(CATCH_ALL_EMAIL="")
 def test_report_zip(db, settings, report: "ReportConfiguration", mailoutbox) -> None:
     settings.CELERY_TASK_ALWAYS_EAGER = True
@@ -155,6 +274,48 @@ def test_report_zip(db, settings, report: "ReportConfiguration", mailoutbox) ->
         assert PurePath(page_document.name).suffix == doc.formatter.file_suffix
 
 
+@pytest.mark.parametrize("compression", ["stored", "deflated", "bzip2", "lzma"])
+@pytest.mark.parametrize("protect", [False, True])
+def test_report_compress_stream(compression: str, protect: bool) -> None:
+    from io import BytesIO
+
+    from hope_country_report.apps.power_query.models import ReportDocument
+    from hope_country_report.apps.power_query.models.report_document import ZIP_CODECS
+
+    payload = b"<tr><td>row</td></tr>" * 100_000
+    report = Mock(compression=compression, compression_level=None if compression == "lzma" else 1, protect=protect)
+    report.pwd = "s3cret"
+    content = ReportDocument._compress(report, "report.html", BytesIO(payload))
+    assert content.name == "report.html.zip"
+    with pyzipper.AESZipFile(content, "r") as archive:
+        if protect:
+            archive.setpassword(b"s3cret")
+        info = archive.getinfo("report.html")
+        assert info.compress_type == ZIP_CODECS[compression]
+        assert archive.read("report.html") == payload
+
+
+def test_report_compression_options(db, settings, report: "ReportConfiguration") -> None:
+    report.compress = True
+    report.save()
+    report.execute(False, notify=False)
+    doc = report.documents.get()
+    package = doc.info["package"]
+
+    report.compression = "lzma"
+    report.save()
+    report.execute(False, notify=False)
+    doc.refresh_from_db()
+    assert doc.info["package"] != package
+    with pyzipper.AESZipFile(doc.file, "r") as archive:
+        assert archive.infolist()[0].compress_type == pyzipper.ZIP_LZMA
+
+    report.compression = "bzip2"
+    report.compression_level = 0
+    with pytest.raises(ValidationError):
+        report.clean()
+
+
 @override_config(CATCH_ALL_EMAIL="")
 def test_report_zip_protected_notify_email(
     transactional_db, rf, settings, report: "ReportConfiguration", mailoutbox
@@ -0,0 +1,113 @@
+from types import SimpleNamespace
+from typing import TYPE_CHECKING
+from unittest import mock
+
+import pytest
+from strategy_field.utils import fqn
+
+from hope_country_report.apps.power_query.models import Formatter
+from hope_country_report.apps.power_query.processors import ToFormPDF
+from hope_country_report.apps.power_query.routing import FAST, HEAVY, PDF, get_route, route_query, route_report
+
+if TYPE_CHECKING:
+    from hope_country_report.apps.power_query.models import Query, ReportConfiguration
+
+
+@pytest.fixture(autouse=True)
+def queues(settings):
+    settings.POWER_QUERY_TASK_QUEUES = {FAST: "q-fast", HEAVY: "q-heavy", PDF: "q-pdf"}
+    settings.POWER_QUERY_TASK_PRIORITIES = {FAST: 3, HEAVY: 6, PDF: 6}
+    settings.POWER_QUERY_INTERACTIVE_PRIORITY_BOOST = 3
+    settings.POWER_QUERY_FAST_TASK_SECONDS = 60
+
+
+@pytest.fixture()
+def query(db):
+    from testutils.factories import QueryFactory
+
+    return QueryFactory()
+
+
+@pytest.fixture()
+def report(db):
+    from testutils.factories import ReportConfigurationFactory
+
+    return ReportConfigurationFactory()
+
+
+def _set_elapsed(query: "Query", seconds: float) -> None:
+    query.datasets.update(info={"perfs": {"time_elapsed": seconds}})
+
+
+def test_route_query_never_run(query: "Query") -> None:
+    route = route_query(query)
+    assert (route.name, route.queue, route.priority) == (FAST, "q-fast", 3)
+
+
+def test_route_query_by_cost(query: "Query") -> None:
+    query.run(persist=True)
+    _set_elapsed(query, 10)
+    assert route_query(query).name == FAST
+    _set_elapsed(query, 600)
+    assert route_query(query).name == HEAVY
+    assert route_query(query).priority == 6
+    assert route_query(query, interactive=True).priority == 3
+
+
+def test_route_report(report: "ReportConfiguration") -> None:
+    _set_elapsed(report.query, 600)
+    assert route_report(report).name == HEAVY
+    assert route_report(report, run_query=False).name == FAST
+
+    report.formatters.add(Formatter.objects.create(name="Form PDF", processor=fqn(ToFormPDF)))
+    route = route_report(report, interactive=True)
+    assert (route.name, route.queue, route.priority) == (PDF, "q-pdf", 3)
+
+
+def test_queue_routed(report: "ReportConfiguration") -> None:
+    with mock.patch.object(type(report).task_handler, "apply_async") as apply_async:
+        apply_async.return_value.id = "abc"
+        report.queue(interactive=True)
+    apply_async.assert_called_once_with((report.pk, report.version), queue="q-fast", priority=0)
+    report.refresh_from_db()
+    assert report.task_queue == "q-fast"
+    assert report.celery_task_queue == "q-fast"
+
+
+def test_priority_order_on_broker(settings) -> None:
+    from kombu.transport.redis import Channel
+
+    # the redis transport polls the priority steps in ascending order (BRPOP queue, queue:3, ...)
+    channel = SimpleNamespace(priority_steps=settings.CELERY_BROKER_TRANSPORT_OPTIONS["priority_steps"])
+
+    def consumed(route):
+        return channel.priority_steps.index(Channel.priority(channel, route.priority))
+
+    routes = [
+        get_route(HEAVY),
+        get_route(FAST),
+        get_route(HEAVY, interactive=True),
+        get_route(FAST, interactive=True),
+    ]
+    assert [consumed(r) for r in routes] == [2, 1, 1, 0]
+    assert consumed(get_route(PDF)) > consumed(get_route(PDF, interactive=True))
+
+
+def test_default_route() -> None:
+    from hope_country_report.apps.power_query.models._base import RoutedTaskMixin
+
+    assert RoutedTaskMixin().get_route() == (FAST, "q-fast", 3)
+    assert RoutedTaskMixin().get_route(interactive=True).priority == 0
+
+
+def test_queued_with_priority(settings, report: "ReportConfiguration") -> None:
+    settings.CELERY_TASK_ALWAYS_EAGER = False
+    assert report.get_route().priority == 3
+    report.queue()
+    try:
+        assert report.task_status == report.QUEUED
+        assert report.queue_position >= 1
+        assert report.queue() is None
+    finally:
+        assert report.terminate() == report.CANCELED
+    assert not report.is_queued()
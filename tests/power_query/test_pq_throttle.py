@@ -0,0 +1,128 @@
+from typing import Any
+from unittest import mock
+
+import pytest
+from celery import states
+from constance.test import override_config
+
+from hope_country_report.apps.power_query.celery_tasks import refresh_report, run_background_query
+from hope_country_report.apps.power_query.models import Query, ReportConfiguration
+from hope_country_report.apps.power_query.throttle import QuerySlot, backoff, get_limits, rds
+
+
+@pytest.fixture()
+def query(db):
+    from testutils.factories import QueryFactory, UserFactory
+
+    q = QueryFactory(owner=UserFactory())
+    yield q
+    rds.delete(*get_limits(q))
+
+
+@override_config(PQ_THROTTLE_OFFICE_LIMIT=1, PQ_THROTTLE_MODEL_LIMIT=0, PQ_THROTTLE_DB_LIMIT=5)
+def test_slot(query: "Query") -> None:
+    first, second = QuerySlot(query), QuerySlot(query)
+    assert len(first.limits) == 2
+    assert first.acquire()
+    assert not second.acquire()
+    first.release()
+    assert second.acquire()
+    second.release()
+
+
+@override_config(PQ_THROTTLE_OFFICE_LIMIT=1, PQ_THROTTLE_LEASE=-1)
+def test_slot_lease_expired(query: "Query") -> None:
+    assert QuerySlot(query).acquire()
+    assert QuerySlot(query).acquire()
+
+
+@override_config(PQ_THROTTLE_OFFICE_LIMIT=3, PQ_THROTTLE_MODEL_LIMIT=0, PQ_THROTTLE_DB_LIMIT=0)
+def test_slot_matrix_workers(query: "Query") -> None:
+    query.matrix_workers = 2
+    with mock.patch.object(type(query), "get_args", return_value=[{"a": 1}, {"a": 2}]):
+        first, second = QuerySlot(query), QuerySlot(query)
+    assert first.weight == 2
+    assert first.acquire()
+    assert rds.zcard(*first.limits) == 2
+    assert not second.acquire()
+    first.release()
+    assert rds.zcard(*first.limits) == 0
+    assert second.acquire()
+    second.release()
+
+
+@override_config(PQ_THROTTLE_OFFICE_LIMIT=1, PQ_THROTTLE_MODEL_LIMIT=0, PQ_THROTTLE_DB_LIMIT=0)
+def test_slot_renew(query: "Query") -> None:
+    slot = QuerySlot(query)
+    assert slot.acquire()
+    (key,) = slot.limits
+    lease_end = rds.zscore(key, slot.members[0])
+    slot.lease += 60
+    assert slot.renew()
+    assert rds.zscore(key, slot.members[0]) > lease_end
+    slot.release()
+    assert not slot.renew()
+
+
+@override_config(PQ_THROTTLE_OFFICE_LIMIT=1, PQ_THROTTLE_MODEL_LIMIT=0, PQ_THROTTLE_DB_LIMIT=0)
+def test_slot_no_office(query: "Query") -> None:
+    query.country_office = None
+    assert not [key for key in get_limits(query) if key.startswith("pq:throttle:office:")]
+    assert not QuerySlot(query).limits
+
+
+@override_config(PQ_THROTTLE_OFFICE_LIMIT=0, PQ_THROTTLE_MODEL_LIMIT=0, PQ_THROTTLE_DB_LIMIT=0)
+def test_slot_unlimited(query: "Query") -> None:
+    slot = QuerySlot(query)
+    assert not slot.limits
+    assert slot.acquire()
+
+
+@override_config(PQ_THROTTLE_BACKOFF=10)
+def test_backoff() -> None:
+    assert 10 <= backoff(0) <= 15
+    assert 40 <= backoff(2) <= 60
+    assert backoff(20) <= 900
+
+
+@override_config(PQ_THROTTLE_OFFICE_LIMIT=1, PQ_THROTTLE_MAX_RETRIES=2, PQ_THROTTLE_BACKOFF=0)
+def test_throttled_task(settings, query: "Query") -> None:
+    settings.CELERY_TASK_ALWAYS_EAGER = True
+    busy = QuerySlot(query)
+    assert busy.acquire()
+    with mock.patch("hope_country_report.apps.power_query.models.Query.execute_matrix") as execute:
+        result = run_background_query.apply((query.pk, query.version), throw=False)
+    assert not execute.called
+    assert result.state == states.FAILURE
+
+    busy.release()
+    result = run_background_query.apply((query.pk, query.version), throw=False)
+    assert result.state == states.SUCCESS
+    assert query.datasets.exists()
+
+
+@override_config(PQ_THROTTLE_OFFICE_LIMIT=1, PQ_THROTTLE_MODEL_LIMIT=0, PQ_THROTTLE_DB_LIMIT=0)
+def test_report_slot_held_by_query_only(settings, query: "Query") -> None:
+    from testutils.factories import ReportConfigurationFactory
+
+    settings.CELERY_TASK_ALWAYS_EAGER = True
+    report = ReportConfigurationFactory(query=query, owner=query.owner, country_office=query.country_office)
+    key = f"pq:throttle:office:{query.country_office_id}"
+    execute_matrix, process_units = Query.execute_matrix, ReportConfiguration.process_units
+    held = []
+
+    def run(q: "Query", **kwargs: "Any") -> "Any":
+        held.append(("query", rds.zcard(key)))
+        return execute_matrix(q, **kwargs)
+
+    def render(r: "ReportConfiguration", owner: str) -> "Any":
+        held.append(("render", rds.zcard(key)))
+        return process_units(r, owner)
+
+    with (
+        mock.patch.object(Query, "execute_matrix", autospec=True, side_effect=run),
+        mock.patch.object(ReportConfiguration, "process_units", autospec=True, side_effect=render),
+    ):
+        result = refresh_report.apply((report.pk,), throw=False)
+    assert result.state == states.SUCCESS
+    assert held == [("query", 1), ("render", 0)]
@@ -123,6 +123,15 @@ def test_to_dataset_values(user):
     assert str(to_dataset(qs)) == "username             \n---------------------\n('user@example.com',)"
 
 
+def test_to_dataset_limit(user):
+    from testutils.factories import UserFactory
+
+    UserFactory.create_batch(2)
+    qs = type(user).objects.values_list("pk")
+    assert len(to_dataset(qs)) == 3
+    assert len(to_dataset(qs, limit=2)) == 2
+
+
 def test_to_dataset_iterable(user):
     qs = type(user).objects.values("pk")
     assert to_dataset(list(qs))
@@ -339,6 +348,26 @@ def test_load_font_for_language(mocked_responses, language, expected_font_name):
 
     font = load_font_for_language(language)
     assert font is not None
+    assert utils._font_cache[expected_font_name] == font_content
+    assert len(mocked_responses.calls) == 0
+
+
+def test_load_font_for_language_remote(monkeypatch, mocked_responses):
+    from hope_country_report.apps.power_query import utils
+
+    utils._font_cache.clear()
+    monkeypatch.setattr(utils.finders, "find", lambda path: None)
+    expected_font_name = "FreeSansBold.ttf"
+    font_url = get_font_url(expected_font_name)
+    mocked_responses.add(
+        "GET",
+        font_url,
+        body=Path(resource_path(f"web/static/fonts/{expected_font_name}")).read_bytes(),
+        status=200,
+    )
+
+    assert load_font_for_language("cyrillic")
+    assert load_font_for_language("cyrillic", font_size=20)
     assert len(mocked_responses.calls) == 1
     assert mocked_responses.calls[0].request.url == font_url
 
@@ -1,56 +1,114 @@
+import json
+from unittest import mock
+from unittest.mock import Mock
+
 import pytest
 from django.core.files.base import ContentFile
 
+from hope_country_report.apps.stream.celery_tasks import publish_dataset_event
+from hope_country_report.apps.stream.publisher import PublishError, data_messages, get_engine, publish
 from testutils.factories.power_query import DatasetFactory, QueryFactory
 from testutils.factories.streaming import EventFactory
 
 pytestmark = pytest.mark.django_db
 
 
-def test_publish_event_when_enabled(capsys):
+@pytest.fixture(autouse=True)
+def engine():
+    # the engine is shared by the process: do not reuse one bound to another test output
+    get_engine.cache_clear()
+    yield
+    get_engine.cache_clear()
+
+
+def test_publish_event_when_enabled(capsys, django_capture_on_commit_callbacks):
     event = EventFactory(enabled=True, routing_key="test.key")
     data = [{"name": "test", "value": 1}]
-    DatasetFactory(query=event.query, data=data)
+    with django_capture_on_commit_callbacks(execute=True):
+        DatasetFactory(query=event.query, data=data)
     captured = capsys.readouterr()
     assert "routing_key:test.key" in captured.out
 
 
-def test_publish_event_when_disabled(capsys):
+def test_publish_event_when_disabled(capsys, django_capture_on_commit_callbacks):
     event = EventFactory(enabled=False)
-    DatasetFactory(query=event.query, data=[])
+    with django_capture_on_commit_callbacks(execute=True) as callbacks:
+        DatasetFactory(query=event.query, data=[])
+    assert not callbacks
     captured = capsys.readouterr()
     assert captured.out == ""
 
 
-def test_no_event_for_query_without_event_relation(capsys):
+def test_no_event_for_query_without_event_relation(capsys, django_capture_on_commit_callbacks):
     query = QueryFactory()
     assert not hasattr(query, "event")
-    DatasetFactory(query=query, data=[])
+    with django_capture_on_commit_callbacks(execute=True):
+        DatasetFactory(query=query, data=[])
     captured = capsys.readouterr()
     assert captured.out == ""
 
 
-def test_uses_dynamic_routing_key(capsys):
+def test_uses_dynamic_routing_key(capsys, django_capture_on_commit_callbacks):
     event = EventFactory(enabled=True, routing_key="")
-    DatasetFactory(query=event.query, data=[])
+    with django_capture_on_commit_callbacks(execute=True):
+        DatasetFactory(query=event.query, data=[])
     captured = capsys.readouterr()
     office_code = event.office.code.lower()
     expected_key = f"hcr.{office_code}.dataset.save"
     assert f"routing_key:{expected_key}" in captured.out
 
 
-def test_fires_on_update(capsys):
+def test_fires_on_update(capsys, django_capture_on_commit_callbacks):
     event = EventFactory(enabled=True)
-    dataset = DatasetFactory(query=event.query, data=[{"value": 1}])
+    with django_capture_on_commit_callbacks(execute=True):
+        dataset = DatasetFactory(query=event.query, data=[{"value": 1}])
     capsys.readouterr()
     # We need to manually trigger the save signal for the update
     new_data = [{"value": 2}]
-    dataset.file.save("update.pkl", ContentFile(dataset.marshall(new_data)))
+    with django_capture_on_commit_callbacks(execute=True):
+        dataset.file.save("update.pkl", ContentFile(dataset.marshall(new_data)))
     captured = capsys.readouterr()
     # With the console backend, we can only verify that an event was published
     assert "routing_key:" in captured.out
 
 
+def test_publish_in_chunks(capsys, settings, django_capture_on_commit_callbacks):
+    settings.STREAMING_CHUNK_ROWS = 2
+    event = EventFactory(enabled=True, routing_key="test.key")
+    with django_capture_on_commit_callbacks(execute=True):
+        dataset = DatasetFactory(query=event.query, data=[{"value": i} for i in range(5)])
+    assert capsys.readouterr().out.count("routing_key:test.key") == 3
+    assert [m["seq"] for m in data_messages(dataset)] == [0, 1, 2]
+    assert [json.loads(m["data"]) for m in data_messages(dataset)][-1] == [{"value": 4}]
+
+
+def test_data_messages_not_tabular():
+    dataset = DatasetFactory(query=QueryFactory(), data=[1, 2, 3])
+    with pytest.raises(TypeError):
+        list(data_messages(dataset))
+
+
+def test_publish_same_content_once(capsys):
+    event = EventFactory(enabled=True, routing_key="test.key")
+    dataset = DatasetFactory(query=event.query, data=[{"value": 1}], content_hash="abc")
+    assert publish_dataset_event(dataset.pk, "abc") == 1
+    assert publish_dataset_event(dataset.pk, "abc") == 0
+    # superseded content: the task of the newer content publishes it
+    assert publish_dataset_event(dataset.pk, "old") == 0
+
+
+def test_publish_retry_on_broker_failure():
+    event = EventFactory(enabled=True, routing_key="test.key")
+    dataset = DatasetFactory(query=event.query, data=[{"value": 1}])
+    engine = Mock(notify=Mock(return_value=False))
+    with mock.patch("hope_country_report.apps.stream.publisher.get_engine", Mock(return_value=engine)):
+        with pytest.raises(PublishError):
+            publish(event, dataset)
+        result = publish_dataset_event.apply((dataset.pk, ""))
+    assert result.failed()
+    assert engine.notify.call_count > 2
+
+
 class Unserializable:
     pass
 
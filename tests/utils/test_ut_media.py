@@ -0,0 +1,78 @@
+import pytest
+from django.core.files.base import ContentFile, File
+from django.core.files.storage import FileSystemStorage
+
+from hope_country_report.utils.media import parse_range, serve_file
+
+
+@pytest.mark.parametrize(
+    "header, expected",
+    [
+        ("bytes=0-9", (0, 9)),
+        ("bytes=90-", (90, 99)),
+        ("bytes=90-200", (90, 99)),
+        ("bytes=-10", (90, 99)),
+        ("bytes=-200", (0, 99)),
+        ("bytes=9-0", None),
+        ("bytes=0-1,5-6", None),
+        ("items=0-9", None),
+        ("bytes=-", None),
+    ],
+)
+def test_parse_range(header, expected):
+    assert parse_range(header, 100) == expected
+
+
+@pytest.mark.parametrize("header", ["bytes=100-", "bytes=-0"])
+def test_parse_range_not_satisfiable(header):
+    with pytest.raises(ValueError):
+        parse_range(header, 100)
+
+
+@pytest.fixture
+def stored_file(tmp_path):
+    storage = FileSystemStorage(location=tmp_path, base_url="/media/")
+    name = storage.save("doc.bin", ContentFile(b"0123456789" * 10))
+    stored = File(storage.open(name), name=name)
+    stored.storage = storage
+    return stored
+
+
+def test_serve_file_range(rf, stored_file):
+    res = serve_file(rf.get("/", headers={"Range": "bytes=-5"}), stored_file, "application/pdf", etag="abc")
+    assert res.status_code == 206
+    assert res["Content-Range"] == "bytes 95-99/100"
+    assert b"".join(res.streaming_content) == b"56789"
+
+
+def test_serve_file_range_if_range(rf, stored_file):
+    request = rf.get("/", headers={"Range": "bytes=0-4", "If-Range": '"old"'})
+    res = serve_file(request, stored_file, "application/pdf", etag="abc")
+    assert res.status_code == 200
+    assert res["Content-Length"] == "100"
+
+
+def test_serve_file_not_satisfiable(rf, stored_file):
+    res = serve_file(rf.get("/", headers={"Range": "bytes=500-"}), stored_file, "application/pdf")
+    assert res.status_code == 416
+    assert res["Content-Range"] == "bytes */100"
+
+
+def test_serve_file_not_modified(rf, stored_file):
+    res = serve_file(rf.get("/", headers={"If-None-Match": '"abc"'}), stored_file, "application/pdf", etag="abc")
+    assert res.status_code == 304
+    assert res["ETag"] == '"abc"'
+
+
+@pytest.mark.parametrize(
+    "offload, header, value",
+    [
+        ("x-accel-redirect", "X-Accel-Redirect", "/protected/doc.bin"),
+        ("x-sendfile", "X-Sendfile", "doc.bin"),
+        ("redirect", "Location", "/media/doc.bin"),
+    ],
+)
+def test_serve_file_offload(rf, settings, stored_file, offload, header, value):
+    settings.MEDIA_DOWNLOAD_OFFLOAD = offload
+    res = serve_file(rf.get("/"), stored_file, "application/pdf", filename="doc.pdf")
+    assert res[header].endswith(value)
@@ -1,7 +1,94 @@
-from hope_country_report.utils.perf import profile
+import pytest
+
+from hope_country_report.utils import metrics
+from hope_country_report.utils.perf import DBMetrics, fingerprint, profile, span, summarize_spans, trace
+
+
+@pytest.fixture()
+def clean_metrics():
+    metrics.reset()
+    yield
+    metrics.reset()
 
 
 def test_profile():
     with profile() as m:
         pass
     assert isinstance(m, dict)
+
+
+def test_profile_spans(clean_metrics):
+    with profile() as m:
+        with span("outer", a=1):
+            with span("inner"):
+                pass
+    assert [(s["name"], s["parent"]) for s in m["spans"]] == [("inner", "outer"), ("outer", None)]
+    assert m["spans"][1]["attributes"] == {"a": 1}
+
+
+def test_span_error(clean_metrics):
+    with trace() as spans, pytest.raises(ValueError), span("failing"):
+        raise ValueError
+    assert spans[0]["error"] == "ValueError"
+
+
+def test_nested_trace(clean_metrics):
+    with trace() as outer:
+        with trace() as inner:
+            assert inner is outer
+        with span("after"):
+            pass
+    assert [s["name"] for s in outer] == ["after"]
+
+
+def test_summarize_spans():
+    spans = [{"name": "a", "duration": 1}, {"name": "b", "duration": 5}, {"name": "a", "duration": 2}]
+    assert summarize_spans(spans) == [
+        {"name": "b", "count": 1, "total": 5, "max": 5},
+        {"name": "a", "count": 2, "total": 3, "max": 2},
+    ]
+
+
+def test_metrics(clean_metrics):
+    metrics.observe("query.exec", 0.2)
+    metrics.observe("query.exec", 2000)
+    output = metrics.render()
+    assert 'hcr_span_duration_seconds_bucket{span="query.exec",le="0.1"} 0' in output
+    assert 'hcr_span_duration_seconds_bucket{span="query.exec",le="0.5"} 1' in output
+    assert 'hcr_span_duration_seconds_bucket{span="query.exec",le="+Inf"} 2' in output
+    assert 'hcr_span_duration_seconds_count{span="query.exec"} 2' in output
+
+
+@pytest.mark.parametrize(
+    "sql, expected",
+    [
+        (
+            'SELECT "a"."id" FROM "a" WHERE "a"."id" = %s LIMIT 21',
+            'SELECT "a"."id" FROM "a" WHERE "a"."id" = ? LIMIT ?',
+        ),
+        ("SELECT * FROM t1 WHERE name = 'it''s'", "SELECT * FROM t1 WHERE name = ?"),
+        ("SELECT *\n  FROM t WHERE id IN (%s, %s, %s)", "SELECT * FROM t WHERE id IN (...)"),
+        ("INSERT INTO t (a, b) VALUES (%s, %s), (%s, %s)", "INSERT INTO t (a, b) VALUES (?, ?), ..."),
+    ],
+)
+def test_fingerprint(sql, expected):
+    assert fingerprint(sql) == expected
+
+
+def test_db_metrics(db, settings):
+    settings.POWER_QUERY_PROFILE_MAX_FINGERPRINTS = 2
+    settings.POWER_QUERY_PROFILE_N_PLUS_ONE = 3
+    metrics = DBMetrics("default")
+    for pk in range(3):
+        metrics.record("SELECT * FROM t WHERE id = %s", [pk], 0.1)
+    metrics.record("SELECT * FROM u", [], 0.2)
+    metrics.record("SELECT * FROM v", [], 0.1)
+    summary = metrics.summary()
+    assert summary["distinct"] == 2
+    assert summary["untracked"] == 1
+    first, second = summary["statements"]
+    assert first["count"] == 3
+    assert first["sample"] == "SELECT * FROM t WHERE id = 0"
+    assert summary["n_plus_one"] == [first["fingerprint"]]
+    assert not second["n_plus_one"]
+    assert summary["queries"] == ["SELECT * FROM t WHERE id = 0", "SELECT * FROM u"]
@@ -138,6 +138,7 @@ def test_document_list(django_app, report_document: "ReportDocument"):
     with user_grant_permissions(user, "power_query.view_reportdocument"):
         res = django_app.get(url, user=user)
     assert res.status_code == 200
+    assert reverse("office-doc", args=[config.country_office.slug, report_document.pk]) in res.text
 
 
 @pytest.mark.parametrize(
@@ -222,6 +223,85 @@ def test_document_download(django_app, report_document):
     assert res.status_code == 200, res.headers["Location"]
 
 
+def test_document_download_conditional(django_app, report_document):
+    config: "ReportConfiguration" = report_document.report
+    user: "User" = config.owner
+    doc = config.documents.first()
+    with user_grant_permissions(user, ["power_query.download_reportdocument"], config.country_office):
+        url = reverse("office-doc-download", args=[config.country_office.slug, doc.pk])
+        res = django_app.get(url, user=user)
+        assert res.headers["ETag"] == f'"{doc.etag}"'
+        assert res.headers["Accept-Ranges"] == "bytes"
+        assert int(res.headers["Content-Length"]) == len(res.body)
+
+        res = django_app.get(url, user=user, headers={"If-None-Match": res.headers["ETag"]}, status=304)
+        assert not res.body
+
+        res = django_app.get(url, user=user, headers={"Range": "bytes=0-9"}, status=206)
+        assert len(res.body) == 10
+        assert res.headers["Content-Range"].startswith("bytes 0-9/")
+
+
+def test_report_bundle(django_app, report_document):
+    import io
+    import zipfile
+
+    from hope_country_report.apps.power_query.celery_tasks import store_report_bundle
+
+    config: "ReportConfiguration" = report_document.report
+    user: "User" = config.owner
+    documents = list(config.documents.order_by("pk"))
+    url = reverse("office-config-bundle", args=[config.country_office.slug, config.pk])
+    with user_grant_permissions(user, ["power_query.download_reportdocument"], config.country_office):
+        with mock.patch("hope_country_report.web.views.report.store_report_bundle") as store:
+            res = django_app.get(url, user=user)
+        store.delay.assert_called_once_with(config.pk, [doc.pk for doc in documents], res.headers["ETag"].strip('"'))
+        with zipfile.ZipFile(io.BytesIO(res.body)) as archive:
+            assert archive.namelist() == [doc.filename for doc in documents]
+            with report_document.file.open("rb") as f:
+                assert archive.read(report_document.filename) == f.read()
+
+        django_app.get(url, user=user, headers={"If-None-Match": res.headers["ETag"]}, status=304)
+
+        assert store_report_bundle(*store.delay.call_args.args)
+        stored = django_app.get(url, user=user)
+        assert stored.body == res.body
+        assert stored.headers["Content-Length"] == str(len(res.body))
+
+        django_app.get(f"{url}?_=1700000000", user=user)
+
+        ReportDocument._all.filter(pk=report_document.pk).update(arguments={"district": "1"})
+        with mock.patch("hope_country_report.web.views.report.store_report_bundle"):
+            res = django_app.get(f"{url}?district=1&utm_source=mail", user=user)
+            django_app.get(f"{url}?district=missing", user=user, status=404)
+        with zipfile.ZipFile(io.BytesIO(res.body)) as archive:
+            assert archive.namelist() == [report_document.filename]
+
+
+def test_report_bundle_cleanup(settings, report_document, django_capture_on_commit_callbacks):
+    from django.core.files.base import ContentFile
+
+    from hope_country_report.apps.power_query import bundle
+
+    settings.POWER_QUERY_BUNDLE_KEEP = 1
+    settings.CELERY_TASK_ALWAYS_EAGER = True
+    config: "ReportConfiguration" = report_document.report
+    storage = ReportDocument._meta.get_field("file").storage
+    old = storage.save(f"bundles/r{config.pk}_old.zip", ContentFile(b"old"))
+    other = storage.save(f"bundles/r{config.pk}0_other.zip", ContentFile(b"other"))
+
+    documents = bundle.get_documents(config)
+    name = bundle.store(config, documents, bundle.get_etag(documents))
+    assert bundle.stored_names(config.pk) == [name]
+    assert not storage.exists(old)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        config.delete()
+    assert not storage.exists(name)
+    assert storage.exists(other)
+    storage.delete(other)
+
+
 def test_document_download_no_file(django_app, report_document):
     doc = Mock(spec=ReportDocument)()
     doc.file.size = 0
@@ -234,6 +314,18 @@ def test_document_download_no_file(django_app, report_document):
     assert res.status_code == 302
 
 
+def test_metrics(django_app, settings, admin_user, user):
+    settings.METRICS_TOKEN = "secret"
+    url = reverse("metrics")
+    django_app.get(url, status=403)
+    django_app.get(url, user=user, status=403)
+    django_app.get(url, headers={"Authorization": "Bearer wrong"}, status=403)
+    res = django_app.get(url, headers={"Authorization": "Bearer secret"})
+    assert res.content_type == "text/plain"
+    assert "hcr_span_duration_seconds" in res.text
+    django_app.get(url, user=admin_user)
+
+
 def test_user_profile(django_app, afghanistan, afg_user):
     url = reverse("office-index", args=[afghanistan.slug])
     res = django_app.get(url, user=afg_user)